@@ -1,23 +1,85 @@
 """The api endpoints that can be used to retrieve data"""
 
 import asyncio
+import functools
 import json
+from contextlib import asynccontextmanager
 from typing import List
 import dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 import os
-from pydantic import BaseModel
-import uvicorn
+import re
+import threading
+import time
+from typing import TYPE_CHECKING
+from pydantic import BaseModel, Field
 
+from helper_files.async_db_connector import AsyncDBConnector
+from helper_files.cache_backends import cache_backend_from_env
 from helper_files.db_connector import DBConnector
-from market_changes_data import MarketChangesProcessor
-from suggest_price import PriceSuggestion
-from textual_data import MarketNewsSummary
-from vpi_data import VesperDataProcessor
+from helper_files.file_paths import ProjectPaths
+from helper_files.job_queue import JobQueue, JobRejectedError
+from helper_files.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS, PROMETHEUS_CONTENT_TYPE, REGISTRY, render_metrics
+from helper_files.python_helper import get_project_logger
+from helper_files.query_cache import QueryCache
+from helper_files.sampling_profiler import (
+    PROFILE_HEADER,
+    PROFILE_ID_HEADER,
+    PROFILE_QUERY_PARAM,
+    profiler_from_env,
+)
+from helper_files.single_flight import single_flight_stats
+from helper_files.tracing import TRACE_ID_HEADER, span
 from fastapi.middleware.cors import CORSMiddleware
-from trading_butter import TradingBot
 
-app = FastAPI()
+if TYPE_CHECKING:
+    from latest_quote_index import LatestQuoteIndex
+    from market_changes_data import AsyncMarketChangesProcessor
+    from summary_precompute import SummaryPrecomputer
+    from textual_data import MarketNewsSummary
+    from vpi_data import AsyncVesperDataProcessor
+
+logger = get_project_logger(logger_name=__name__)
+
+# With LAZY_STARTUP=1, connections are only opened by the first request that needs them
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "0").lower() in ("1", "true")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Created here rather than at import, so importing the API writes nothing
+    ProjectPaths.make_directories()
+    if not LAZY_STARTUP:
+        # Warm up before serving: open the SSH tunnel and the first pooled connections, off the event loop
+        try:
+            await asyncio.to_thread(db_connection.connect)
+        except Exception as e:
+            logger.warning("Database warm-up failed, connecting on first use instead: %s", e)
+
+    # Create the processors before serving, so no request pays for importing their modules
+    get_vesper_processor()
+    get_market_changes_processor()
+    # Keep the latest quote index and the near-duplicate article index warm in the background
+    get_quote_index().start()
+    get_market_news().dedupe_index.start(db_connection)
+    get_summary_precomputer().start()
+    yield
+    get_quote_index().stop()
+    get_market_news().dedupe_index.stop()
+    get_summary_precomputer().stop()
+    summary_jobs.shutdown()
+    await get_market_news().aclose()
+    async_db_connection.close()
+    db_connection.close_connection()
+    db_connection.tunnel_manager.close()
+
+
+# Profiles requests armed with X-Profile, ?profile=1 or PROFILE_SAMPLE_RATE
+profiler = profiler_from_env()
+TRACE_ID_PATTERN = re.compile(r"[0-9A-Za-z-]{8,64}")
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["http://localhost:3000", "*"]
 
@@ -29,16 +91,167 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Record the latency and status of every request, by route template so path parameters do not add series.
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.labels(request.method, path).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(request.method, path, status).inc()
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """
+    Make every request the root span of a trace. A valid X-Trace-Id from the caller is continued, and the trace id
+    is returned in the same header to look the request up with tools/trace_waterfall.py.
+    """
+    trace_id = request.headers.get(TRACE_ID_HEADER)
+    if trace_id is not None and not TRACE_ID_PATTERN.fullmatch(trace_id):
+        trace_id = None
+    with span("http.request", root=True, trace_id=trace_id, method=request.method, path=request.url.path) as root:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        root.set(route=route.path if route is not None else None, status_code=response.status_code)
+    if getattr(root, "trace_id", None) is not None:
+        response.headers[TRACE_ID_HEADER] = root.trace_id
+    return response
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Sample the stacks of requests armed with the X-Profile header, the `profile` query flag or by
+    PROFILE_SAMPLE_RATE. Other requests go straight through. The profile id is returned in X-Profile-Id.
+    """
+    if not profiler.is_armed(request.headers.get(PROFILE_HEADER), request.query_params.get(PROFILE_QUERY_PARAM)):
+        return await call_next(request)
+    sampler = profiler.start()
+    if sampler is None:
+        return await call_next(request)
+
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        duration = time.perf_counter() - start
+        # Writes the collapsed stacks to disk, off the event loop
+        profile = await asyncio.to_thread(
+            profiler.finish, sampler, request.method, request.url.path, started_at, duration
+        )
+    response.headers[PROFILE_ID_HEADER] = profile.id
+    return response
+
+
 # Initialize the VesperDataProcessor with a DB connection
-db_connection = DBConnector(connection_name="env")
-vesper_processor = VesperDataProcessor(db_connection=db_connection)
+# Nothing is opened at import; see the lifespan warm-up
+db_connection = DBConnector(connection_name="env", query_cache=QueryCache(), lazy=True)
+async_db_connection = AsyncDBConnector(db_connection)
+REGISTRY.gauge_callback(
+    "db_pool_connections",
+    "Pooled database connections by state.",
+    lambda: {(state,): db_connection.pool_stats()[state] for state in ("in_use", "idle")},
+    ("state",),
+)
+
+# The processors are created, and their modules imported, on first use or by the lifespan: importing them (aiohttp
+# for the summaries above all) is most of what importing this module would otherwise cost
+_factory_lock = threading.RLock()
+
+
+def _created_once(factory):
+    created = functools.cache(factory)
+
+    @functools.wraps(factory)
+    def get():
+        with _factory_lock:
+            return created()
+
+    return get
+
+
+@_created_once
+def get_quote_index() -> "LatestQuoteIndex":
+    from latest_quote_index import LatestQuoteIndex
+
+    return LatestQuoteIndex(db_connection)
+
+
+@_created_once
+def get_vesper_processor() -> "AsyncVesperDataProcessor":
+    from vpi_data import AsyncVesperDataProcessor
+
+    return AsyncVesperDataProcessor(db_connection=async_db_connection, quote_index=get_quote_index())
+
+
+@_created_once
+def get_market_changes_processor() -> "AsyncMarketChangesProcessor":
+    from market_changes_data import AsyncMarketChangesProcessor
+
+    return AsyncMarketChangesProcessor(db_connection=async_db_connection)
+
+
 # vp_data = vesper_processor.get_full_information(product_id=2, data_source_id=52)
 # market_changes_processor = MarketChangesProcessor(db_connection=db_connection)
 
 # # Retrieve the most recent market changes info using the class
 # market_changes_info = market_changes_processor.get_full_market_changes_info(2831)
 
-market_news = MarketNewsSummary(db_connection, os.getenv("OPENAI_API_KEY"))
+# Generated summaries are shared by all workers through the result cache (SQLite unless MEMOIZE_CACHE_BACKEND says
+# otherwise)
+@_created_once
+def get_market_news() -> "MarketNewsSummary":
+    from textual_data import MarketNewsSummary
+
+    return MarketNewsSummary(
+        db_connection,
+        os.getenv("OPENAI_API_KEY"),
+        async_db_connection=async_db_connection,
+        result_cache=cache_backend_from_env(default="sqlite"),
+    )
+
+
+# Precomputes the summaries of recently active users off-peak, into the same result cache
+@_created_once
+def get_summary_precomputer() -> "SummaryPrecomputer":
+    from summary_precompute import SummaryPrecomputer
+
+    return SummaryPrecomputer(get_market_news())
+
+
+# Summary jobs run on their own worker threads, so slow LLM calls cannot take over the threads of the other endpoints
+summary_jobs = JobQueue(workers=4, max_queue_size=100, name="summary-job")
+
+MAX_VPI_BATCH_PAIRS = 200
+MAX_JOB_WAIT_SECONDS = 30
+
+
+class ProductSourcePair(BaseModel):
+    product_id: int
+    data_source_id: int
+
+
+class VpiBatchRequest(BaseModel):
+    pairs: List[ProductSourcePair] = Field(..., max_length=MAX_VPI_BATCH_PAIRS)
+
+
+class SummaryJobRequest(BaseModel):
+    user_id: int
+    number: int
+    days_threshold: int
+    # Lower runs first; priority 0 is never shed
+    priority: int = Field(5, ge=0, le=9)
 
 
 @app.get("/")
@@ -47,23 +260,109 @@ def read_root():
 
 
 @app.get("/generate-summary")
-def generate_summary(user_id: int, number: int, days_threshold: int):
-    # Initialize the MarketNewsSummary class
+async def generate_summary(user_id: int, number: int, days_threshold: int):
+    get_summary_precomputer().tracker.record(user_id, number, days_threshold)
 
     # Generate the HTML summary
-    html_summary = market_news.generate_summary(user_id, number, days_threshold)
+    html_summary = await get_market_news().agenerate_summary(user_id, number, days_threshold)
 
     # Return the summary
     return {"html_summary": html_summary}
 
 
+def _server_sent_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/generate-summary/stream")
+async def generate_summary_stream(user_id: int, number: int, days_threshold: int):
+    """
+    FastAPI endpoint that streams the summary as Server-Sent Events: an "item" event per summarized article as soon
+    as it is complete, then a "done" event with the number of items (or an "error" event).
+    """
+
+    async def events():
+        count = 0
+        try:
+            async for item in get_market_news().astream_summary(user_id, number, days_threshold):
+                count += 1
+                yield _server_sent_event("item", item)
+        except Exception as e:
+            yield _server_sent_event("error", {"error": str(e)})
+            return
+        yield _server_sent_event("done", {"count": count})
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/generate-summary/jobs", status_code=202)
+def submit_summary_job(request: SummaryJobRequest):
+    """
+    FastAPI endpoint that queues a summary and returns its job id right away. Poll the result at
+    /generate-summary/jobs/{job_id}. Responds 429 when low priority work is shed and 503 when the queue is full.
+    """
+    get_summary_precomputer().tracker.record(request.user_id, request.number, request.days_threshold)
+    try:
+        job = summary_jobs.submit(
+            get_market_news().generate_summary,
+            request.user_id,
+            request.number,
+            request.days_threshold,
+            priority=request.priority,
+            key=("summary", request.user_id, request.number, request.days_threshold),
+        )
+    except JobRejectedError as e:
+        return JSONResponse(
+            status_code=503 if e.overloaded else 429,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/generate-summary/jobs/{job_id}")
+async def get_summary_job(job_id: str, wait: float = 0):
+    """
+    FastAPI endpoint that returns a summary job's status, and its summary once done. With `wait`, it waits up to
+    that many seconds (at most 30) for the job to finish before answering.
+    """
+    job = summary_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown or expired job id."})
+
+    if wait > 0 and not job.done:
+        try:
+            # Shielded, so timing out does not cancel the job's future
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), min(wait, MAX_JOB_WAIT_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+        except Exception:
+            # The failure is reported in the job description
+            pass
+
+    description = job.describe()
+    if "result" in description:
+        description["html_summary"] = description.pop("result")
+    return description
+
+
+@app.get("/job-queue-status")
+def get_job_queue_status():
+    """
+    FastAPI endpoint reporting the depth, admission counters and timings of the summary job queue.
+    """
+    return summary_jobs.stats()
+
+
 @app.get("/get-butter-vpi-information")
-def get_full_information(product_id: int, data_source_id: int):
+async def get_full_information(product_id: int, data_source_id: int):
     """
     FastAPI endpoint that retrieves full information by calling the `VesperDataProcessor`.
     """
     # Use the class to get the full information
-    full_info = vesper_processor.get_full_information(product_id, data_source_id)
+    full_info = await get_vesper_processor().get_full_information(product_id, data_source_id)
 
     # If the returned DataFrame is empty, return an error message
     if full_info.empty:
@@ -73,15 +372,92 @@ def get_full_information(product_id: int, data_source_id: int):
     return full_info.to_dict(orient="records")
 
 
+@app.post("/get-butter-vpi-information/batch")
+async def get_full_information_batch(request: VpiBatchRequest):
+    """
+    FastAPI endpoint that retrieves the full information for many product/data source pairs in one call.
+    Results are keyed by "product_id:data_source_id".
+    """
+    pairs = [(pair.product_id, pair.data_source_id) for pair in request.pairs]
+    full_infos = await get_vesper_processor().get_full_information_batch(pairs)
+
+    return {
+        f"{product_id}:{data_source_id}": (
+            full_info.to_dict(orient="records")
+            if not full_info.empty
+            else {"error": "No data found for the given product_id and data_source_id."}
+        )
+        for (product_id, data_source_id), full_info in full_infos.items()
+    }
+
+
+@app.get("/vpi-index-status")
+def get_vpi_index_status():
+    """
+    FastAPI endpoint reporting the staleness and refresh metrics of the latest quote index.
+    """
+    return get_vesper_processor().index_metrics()
+
+
+@app.get("/precompute/status")
+def get_precompute_status():
+    """
+    FastAPI endpoint reporting the progress of the summary precomputation and the summary result cache hit rate.
+    """
+    return get_summary_precomputer().metrics()
+
+
+@app.get("/single-flight-status")
+def get_single_flight_status():
+    """
+    FastAPI endpoint reporting how many calls of each expensive function were coalesced onto an in-flight call.
+    """
+    return single_flight_stats()
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus scrape endpoint: query latency, rows and result size per query fingerprint, endpoint latency, pool
+    wait time and error counts.
+    """
+    return Response(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/profiles")
+def get_profiles():
+    """
+    FastAPI endpoint listing the slowest profiled requests, slowest first.
+    """
+    return {**profiler.stats(), "profiles": profiler.slowest()}
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """
+    FastAPI endpoint returning a profile as collapsed stacks, e.g. for flamegraph.pl or speedscope.
+    """
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown or evicted profile id."})
+    return PlainTextResponse(profile.collapsed())
+
+
+@app.get("/tunnel-status")
+def get_tunnel_status():
+    """
+    FastAPI endpoint reporting the state of the SSH tunnel to the database, its reconnects and recent up/down events.
+    """
+    return db_connection.tunnel_stats()
+
+
 @app.get("/get-market-changes")
-def get_market_changes(user_id: int):
+async def get_market_changes(user_id: int):
     """
     FastAPI endpoint to retrieve most recent market changes data for a user.
     """
-    market_changes_processor = MarketChangesProcessor(db_connection=db_connection)
-
     # Retrieve the most recent market changes info using the class
-    market_changes_info = market_changes_processor.get_full_market_changes_info(user_id)
+    market_changes_info = await get_market_changes_processor().get_full_market_changes_info(user_id)
 
     if not market_changes_info:
         return {"error": "No market changes found for the given user."}
@@ -94,6 +470,8 @@ def suggest_price():
     """
     FastAPI endpoint to retrieve most recent market changes data for a user.
     """
+    from suggest_price import PriceSuggestion
+
     price_suggester = PriceSuggestion(
         median_listing_price=7400,
         median_first_counter_bid=7350,
@@ -115,6 +493,8 @@ def get_bot_offer(
     """
     FastAPI endpoint to retrieve most recent market changes data for a user.
     """
+    from trading_butter import TradingBot
+
     bot = TradingBot(
         suggested_price=price,
         min_price=min_price,
@@ -127,4 +507,6 @@ def get_bot_offer(
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
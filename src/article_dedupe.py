@@ -0,0 +1,307 @@
+"""Near-duplicate detection of market reports and news articles with MinHash and locality-sensitive hashing."""
+
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Container, Optional
+
+import numpy as np
+import pandas as pd
+from helper_files.db_connector import DBConnector
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WORD_PATTERN = re.compile(r"\w+")
+
+ARTICLE_TABLES = ("market_analyses", "news")
+
+RECENT_ARTICLES_QUERY = "SELECT id, title, content FROM {table} ORDER BY id DESC LIMIT %s"
+NEW_ARTICLES_QUERY = "SELECT id, title, content FROM {table} WHERE id > %s ORDER BY id LIMIT %s"
+
+
+def article_text(article: dict) -> str:
+    return f"{article.get('title') or ''}\n{article.get('content') or ''}"
+
+
+def article_key(article: dict) -> str:
+    """
+    Content hash of an article, used to find its signature in the index.
+    """
+    return hashlib.sha1(article_text(article).encode("utf-8")).hexdigest()
+
+
+def shingle_hashes(text: str, shingle_size: int = 5) -> np.ndarray:
+    """
+    Hash the word shingles of a text to 32-bit integers.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i : i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64)
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with `num_perm` universal hash functions.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # Keeping a below 2^31 keeps a * x below 2^63 for 32-bit x, so the products cannot overflow.
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if hashes.size == 0:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of article MinHash signatures.
+
+    Signatures are split into `bands` bands; articles sharing any band are candidate duplicates, which are
+    confirmed when their estimated Jaccard similarity is at least `threshold`. With 128 permutations and 16 bands
+    of 8 rows, pairs above roughly 0.7 similarity are found with high probability.
+
+    The index can be kept up to date with new rows of the article tables in a background thread, so that the
+    articles a summary request asks for are usually already hashed and bucketed.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 16,
+        threshold: float = 0.7,
+        shingle_size: int = 5,
+        max_documents: int = 200_000,
+    ):
+        """
+        Initializes the NearDuplicateIndex.
+
+        Args:
+            num_perm: Number of MinHash permutations.
+            bands: Number of LSH bands. Must divide `num_perm`.
+            threshold: Minimum estimated Jaccard similarity of two near-duplicates.
+            shingle_size: Number of words per shingle.
+            max_documents: Keep the signatures of at most this many articles, dropping the oldest.
+        """
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm.")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.max_documents = max_documents
+
+        self._lock = threading.Lock()
+        self._signatures: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._buckets: list[dict[bytes, set[str]]] = [{} for _ in range(bands)]
+        self._high_water_marks = {table: None for table in ARTICLE_TABLES}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [
+            signature[band * self.rows_per_band : (band + 1) * self.rows_per_band].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def signature(self, article: dict) -> np.ndarray:
+        """
+        Return the MinHash signature of an article, from the index if it was seen before.
+        """
+        key = article_key(article)
+        with self._lock:
+            signature = self._signatures.get(key)
+        if signature is None:
+            signature = self.hasher.signature(shingle_hashes(article_text(article), self.shingle_size))
+        return signature
+
+    def add(self, article: dict) -> str:
+        """
+        Add an article to the index.
+
+        Returns:
+            The article's content key.
+        """
+        key = article_key(article)
+        with self._lock:
+            if key in self._signatures:
+                return key
+        # Hashed outside the lock so lookups do not wait on it, the check is repeated before inserting
+        signature = self.hasher.signature(shingle_hashes(article_text(article), self.shingle_size))
+        with self._lock:
+            if key in self._signatures:
+                return key
+            self._signatures[key] = signature
+            for band, band_key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(band_key, set()).add(key)
+            while len(self._signatures) > self.max_documents:
+                self._remove(next(iter(self._signatures)))
+        return key
+
+    def _remove(self, key: str):
+        signature = self._signatures.pop(key)
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def similarity(self, first: np.ndarray, second: np.ndarray) -> float:
+        """
+        Estimate the Jaccard similarity of two signatures.
+        """
+        return float(np.mean(first == second))
+
+    def query(self, article: dict, among: Optional[Container[str]] = None) -> list[str]:
+        """
+        Return the content keys of indexed near-duplicates of an article, optionally only those in `among`.
+        """
+        signature = self.signature(article)
+        candidates = set()
+        with self._lock:
+            for band, band_key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(band_key, ()))
+            if among is not None:
+                candidates = {key for key in candidates if key in among}
+            return [
+                key for key in candidates if self.similarity(signature, self._signatures[key]) >= self.threshold
+            ]
+
+    def cluster(self, articles: list[dict]) -> list[list[int]]:
+        """
+        Group articles into clusters of near-duplicates: the connected components of the pairs whose similarity
+        reaches the threshold, so the result does not depend on the order of `articles`.
+
+        The articles are added to the index and their candidates are looked up in its buckets, which the
+        background refresh keeps filled, instead of bucketing the articles of every request again.
+
+        Returns:
+            Lists of positions in `articles`; every article is in exactly one cluster.
+        """
+        positions_by_key: dict[str, list[int]] = {}
+        for position, article in enumerate(articles):
+            positions_by_key.setdefault(self.add(article), []).append(position)
+        parent = list(range(len(articles)))
+
+        def find(position):
+            while parent[position] != position:
+                parent[position] = parent[parent[position]]
+                position = parent[position]
+            return position
+
+        for position, article in enumerate(articles):
+            # Includes the article's own key, which joins exact copies
+            for key in self.query(article, among=positions_by_key):
+                for other in positions_by_key[key]:
+                    root, other_root = find(position), find(other)
+                    if root != other_root:
+                        parent[other_root] = root
+
+        clusters: dict[int, list[int]] = {}
+        for position in range(len(articles)):
+            clusters.setdefault(find(position), []).append(position)
+        return list(clusters.values())
+
+    def dedupe(self, articles: list[dict]) -> tuple[list[dict], int]:
+        """
+        Collapse each cluster of near-duplicates to one representative: the article with the best (lowest)
+        priority, and the longest content among equals.
+
+        Returns:
+            The representatives in their original order and the number of articles removed.
+        """
+        representatives = []
+        for cluster in self.cluster(articles):
+            representatives.append(
+                min(
+                    cluster,
+                    key=lambda position: (
+                        articles[position].get("priority", 0),
+                        -len(str(articles[position].get("content") or "")),
+                        position,
+                    ),
+                )
+            )
+        representatives.sort()
+        return [articles[position] for position in representatives], len(articles) - len(representatives)
+
+    def _add_rows(self, rows: pd.DataFrame):
+        for article in rows.to_dict(orient="records"):
+            self.add(article)
+
+    def refresh_from_db(self, db_connection: DBConnector, warm_start_rows: int = 2000, batch_size: int = 1000):
+        """
+        Index the articles added to market_analyses and news since the last refresh. The first refresh indexes
+        the most recent `warm_start_rows` rows of each table.
+        """
+        for table in ARTICLE_TABLES:
+            high_water_mark = self._high_water_marks[table]
+            if high_water_mark is None:
+                rows = db_connection.query_data(RECENT_ARTICLES_QUERY.format(table=table), params=(warm_start_rows,))
+                self._add_rows(rows.iloc[::-1])
+                self._high_water_marks[table] = int(rows["id"].max()) if not rows.empty else 0
+                continue
+
+            while True:
+                rows = db_connection.query_data(
+                    NEW_ARTICLES_QUERY.format(table=table), params=(high_water_mark, batch_size)
+                )
+                if rows.empty:
+                    break
+                self._add_rows(rows)
+                high_water_mark = int(rows["id"].max())
+                self._high_water_marks[table] = high_water_mark
+                if len(rows) < batch_size:
+                    break
+
+    def start(self, db_connection: DBConnector, refresh_interval: float = 300.0):
+        """
+        Keep the index up to date with new articles in a background thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                try:
+                    self.refresh_from_db(db_connection)
+                    logger.debug(
+                        f"Refreshed near-duplicate index ({len(self)} articles) in {time.perf_counter() - start:.2f}s"
+                    )
+                except Exception as e:
+                    logger.exception(f"Refreshing the near-duplicate index failed: {e}")
+                self._stop_event.wait(refresh_interval)
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=run, name="near-duplicate-index", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """
+        Stop the background refresh thread.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._signatures)
@@ -0,0 +1,154 @@
+"""
+Persistent, content-addressed cache of per-article LLM summaries.
+"""
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.python_helper import get_project_logger
+from file_paths import ProjectPaths
+
+file_paths = ProjectPaths()
+logger = get_project_logger(logger_name=__name__)
+
+# SQLite limits the number of bound parameters per statement.
+MAX_KEYS_PER_LOOKUP = 500
+
+
+class ArticleSummaryCache:
+    """
+    SQLite-backed cache of article summaries, shared by all processes on the host.
+
+    Entries are keyed on a hash of the article title and content together with the model parameters, so an article
+    is only sent to the LLM again when its text or the way it is summarized changes.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, max_entries: Optional[int] = 100_000):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: The SQLite file. Defaults to `article_summaries.sqlite` in the interim data folder.
+            max_entries: Keep at most this many summaries, dropping the least recently used. None keeps all.
+        """
+        self.db_path = Path(db_path or file_paths.INTERIM_DATA_DIR.joinpath("article_summaries.sqlite"))
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._sqlite: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, so creating the cache (e.g. when the API module is imported) writes nothing
+        if self._sqlite is None:
+            with self._connect_lock:
+                if self._sqlite is None:
+                    self._sqlite = self._open()
+        return self._sqlite
+
+    def _open(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        with connection:
+            # WAL lets the uvicorn workers read while one of them writes.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS article_summaries (
+                    key TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )"""
+            )
+        return connection
+
+    @staticmethod
+    def make_key(title: str, content: str, model_params: dict) -> str:
+        """
+        Build the content-addressed key of an article for the given model parameters.
+        """
+        material = json.dumps([title, content, model_params], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """
+        Look up summaries by key.
+
+        Returns:
+            The cached summaries by key. Missing keys are left out.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock, self._connection:
+            for start in range(0, len(unique_keys), MAX_KEYS_PER_LOOKUP):
+                chunk = unique_keys[start : start + MAX_KEYS_PER_LOOKUP]
+                placeholders = ", ".join(["?"] * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, summary FROM article_summaries WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((key, json.loads(summary)) for key, summary in rows)
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE article_summaries SET last_used_at = ? WHERE key = ?", [(now, key) for key in found]
+                )
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def set_many(self, summaries: dict[str, dict]):
+        """
+        Store summaries by key.
+        """
+        if not summaries:
+            return
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO article_summaries (key, summary, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(summary), now, now) for key, summary in summaries.items()],
+            )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    """DELETE FROM article_summaries WHERE key IN (
+                        SELECT key FROM article_summaries ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,),
+                )
+
+    def stats(self) -> dict:
+        """
+        Return the hit/miss counters of this process and the number of stored summaries.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM article_summaries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        """
+        Close the SQLite connection, if it was opened.
+        """
+        with self._lock, self._connect_lock:
+            if self._sqlite is not None:
+                self._sqlite.close()
+                self._sqlite = None
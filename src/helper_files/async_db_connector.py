@@ -0,0 +1,101 @@
+"""
+Asyncio counterpart of the DBConnector.
+"""
+import asyncio
+import contextvars
+import functools
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.db_connector import DBConnector
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+
+class AsyncDBConnector:
+    """
+    Awaitable access to a DBConnector's connection pool.
+
+    pymysql is a blocking driver, so each query runs on a dedicated executor with one thread per pooled
+    connection. Awaiting coroutines hold no thread at all, which keeps the event loop and Starlette's shared
+    threadpool free while hundreds of requests wait for the database.
+    """
+
+    def __init__(self, db_connection: DBConnector, max_workers: Optional[int] = None):
+        """
+        Initialize the AsyncDBConnector.
+
+        Args:
+            db_connection: The DBConnector that owns the tunnel and the connection pool.
+            max_workers: Number of executor threads. Defaults to the pool's max_size, since more threads would only
+                wait on a pool checkout.
+        """
+        self.db_connection = db_connection
+        self.max_workers = max_workers or db_connection.pool.max_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        The executor of the blocking calls, created on first use.
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="async-db")
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Await a blocking call that uses the DBConnector, e.g. a processor method, on the executor.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def query_data(self, query, params=None, cache_ttl: Optional[float] = None) -> pd.DataFrame:
+        """
+        Run a query to retrieve data from the database, optionally through the DBConnector's query cache.
+        """
+        return await self.run(self.db_connection.query_data, query, params, cache_ttl)
+
+    async def insert_data(self, query, params=None):
+        """
+        Run an insert query in the database.
+        """
+        await self.run(self.db_connection.insert_data, query, params)
+
+    async def execute_query(self, query, params=None):
+        """
+        Execute a query on a pooled database connection.
+        """
+        await self.run(self.db_connection.execute_query, query, params)
+
+    def pool_stats(self) -> dict:
+        """
+        Return the connection pool statistics of the underlying DBConnector.
+        """
+        return self.db_connection.pool_stats()
+
+    def close(self):
+        """
+        Shut down the executor, if it was created. The underlying DBConnector stays open.
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,311 @@
+"""
+High-throughput bulk loading of DataFrames into MySQL.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+import pandas as pd
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.python_helper import get_project_logger
+
+if TYPE_CHECKING:
+    from helper_files.db_connector import DBConnector
+
+logger = get_project_logger(logger_name=__name__)
+
+LOAD_METHODS = ("insert", "infile")
+
+
+class BulkLoadError(Exception):
+    """
+    Raised when a bulk load fails part-way. Carries the report of everything committed before the failure.
+    """
+
+    def __init__(self, message: str, report: "BulkLoadReport"):
+        super().__init__(message)
+        self.report = report
+
+
+@dataclass
+class BulkLoadReport:
+    """
+    Outcome of a bulk load.
+    """
+
+    table: str
+    method: str
+    total_rows: int
+    batch_size: int
+    rows_loaded: int = 0
+    seconds: float = 0.0
+    completed_batches: list[int] = field(default_factory=list)
+    failed_batches: list[int] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_loaded / self.seconds if self.seconds else 0.0
+
+    @property
+    def committed_rows(self) -> int:
+        """Number of rows of the DataFrame committed so far, including batches skipped on resume."""
+        return sum(min(self.batch_size, self.total_rows - start) for start in self.completed_batches)
+
+
+def quote_identifier(name: str) -> str:
+    """
+    Quote a MySQL identifier (table or column name) with backticks.
+    """
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def _escape_tsv_column(series: pd.Series) -> pd.Series:
+    nulls = series.isna()
+    if pd.api.types.is_bool_dtype(series):
+        series = series.astype("int8")
+    text = series.astype(str)
+    if not pd.api.types.is_numeric_dtype(series):
+        text = (
+            text.str.replace("\\", "\\\\", regex=False)
+            .str.replace("\t", "\\t", regex=False)
+            .str.replace("\n", "\\n", regex=False)
+            .str.replace("\r", "\\r", regex=False)
+        )
+    return text.mask(nulls, "\\N")
+
+
+def dataframe_to_tsv(df: pd.DataFrame) -> str:
+    """
+    Render a DataFrame in the tab-separated format MySQL's LOAD DATA reads by default (NULL written as \\N).
+    """
+    columns = [_escape_tsv_column(df[column]) for column in df.columns]
+    lines = columns[0]
+    for column in columns[1:]:
+        lines = lines + "\t" + column
+    return "\n".join(lines.tolist()) + "\n"
+
+
+class BulkLoader:
+    """
+    Load DataFrames into a table as multi-row INSERT batches or through LOAD DATA LOCAL INFILE.
+
+    Every batch is committed on its own, so a failed load can be resumed from a checkpoint file without re-inserting
+    what was already committed. Batches can be spread over several pooled connections.
+    """
+
+    def __init__(
+        self,
+        db_connection: "DBConnector",
+        batch_size: int = 1000,
+        method: str = "insert",
+        workers: int = 1,
+    ):
+        """
+        Initialize the BulkLoader.
+
+        Args:
+            db_connection: The DBConnector whose pool the batches are written through.
+            batch_size: Default number of rows per batch.
+            method: Default load method, "insert" or "infile".
+            workers: Default number of pooled connections to load with in parallel.
+        """
+        self.db_connection = db_connection
+        self.batch_size = batch_size
+        self.method = method
+        self.workers = workers
+
+    @staticmethod
+    def build_insert_statement(
+        table: str, columns: list[str], upsert: bool = False, update_columns: Optional[list[str]] = None
+    ) -> str:
+        """
+        Build the parameterized INSERT statement for a batch, optionally with ON DUPLICATE KEY UPDATE.
+        """
+        column_list = ", ".join(quote_identifier(column) for column in columns)
+        placeholders = ", ".join(["%s"] * len(columns))
+        statement = f"INSERT INTO {quote_identifier(table)} ({column_list}) VALUES ({placeholders})"
+        if upsert:
+            update_columns = update_columns or columns
+            assignments = ", ".join(
+                f"{quote_identifier(column)} = VALUES({quote_identifier(column)})" for column in update_columns
+            )
+            statement += f" ON DUPLICATE KEY UPDATE {assignments}"
+        return statement
+
+    @staticmethod
+    def build_load_data_statement(table: str, columns: list[str], file_path: str) -> str:
+        """
+        Build the LOAD DATA LOCAL INFILE statement for a batch written by `dataframe_to_tsv`.
+        """
+        column_list = ", ".join(quote_identifier(column) for column in columns)
+        escaped_path = file_path.replace("\\", "\\\\").replace("'", "\\'")
+        return (
+            f"LOAD DATA LOCAL INFILE '{escaped_path}' INTO TABLE {quote_identifier(table)} "
+            f"CHARACTER SET utf8mb4 ({column_list})"
+        )
+
+    def _insert_batch(self, connection, statement: str, batch: pd.DataFrame):
+        rows = list(batch.astype(object).where(pd.notna(batch), None).itertuples(index=False, name=None))
+        with connection.cursor() as cursor:
+            # pymysql rewrites executemany on INSERT ... VALUES into multi-row statements.
+            cursor.executemany(statement, rows)
+
+    def _infile_batch(self, connection, table: str, batch: pd.DataFrame):
+        # pymysql streams LOCAL INFILE from a file name, so the in-memory buffer is spooled to a temporary file.
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".tsv", delete=False) as buffer:
+            buffer.write(dataframe_to_tsv(batch))
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.build_load_data_statement(table, list(batch.columns), buffer.name))
+        finally:
+            os.remove(buffer.name)
+
+    def _load_batch(self, method: str, table: str, statement: str, batch: pd.DataFrame):
+        with self.db_connection.borrow_connection() as connection:
+            connection.begin()
+            try:
+                if method == "insert":
+                    self._insert_batch(connection, statement, batch)
+                else:
+                    self._infile_batch(connection, table, batch)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    @staticmethod
+    def _read_checkpoint(checkpoint_path: Optional[Path], report: BulkLoadReport) -> set[int]:
+        if checkpoint_path is None or not Path(checkpoint_path).exists():
+            return set()
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if (checkpoint.get("table"), checkpoint.get("total_rows"), checkpoint.get("batch_size")) != (
+            report.table,
+            report.total_rows,
+            report.batch_size,
+        ):
+            raise ValueError(f"Checkpoint {checkpoint_path} does not match this load (table, rows or batch size).")
+        return set(checkpoint.get("completed_batches", []))
+
+    @staticmethod
+    def _write_checkpoint(checkpoint_path: Optional[Path], report: BulkLoadReport):
+        if checkpoint_path is None:
+            return
+        checkpoint = {
+            "table": report.table,
+            "total_rows": report.total_rows,
+            "batch_size": report.batch_size,
+            "completed_batches": sorted(report.completed_batches),
+        }
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, checkpoint_path)
+
+    def load(
+        self,
+        df: pd.DataFrame,
+        table: str,
+        method: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        upsert: bool = False,
+        update_columns: Optional[list[str]] = None,
+        checkpoint_path: Optional[Path] = None,
+    ) -> BulkLoadReport:
+        """
+        Load a DataFrame into a table.
+
+        Args:
+            df: The rows to load. Column names must match the table columns.
+            table: The target table name.
+            method: "insert" for multi-row INSERT batches, "infile" for LOAD DATA LOCAL INFILE. The latter requires
+                `local_infile` on both the server and the DBConnector.
+            batch_size: Rows per batch (and per commit).
+            workers: Number of pooled connections to load batches on in parallel.
+            upsert: Update existing rows on duplicate keys (ON DUPLICATE KEY UPDATE). Only supported for "insert".
+            update_columns: Columns to overwrite on duplicate keys. Defaults to all columns.
+            checkpoint_path: JSON file recording committed batches. An existing checkpoint for the same load is
+                resumed from, and the file is removed once the load completes.
+
+        Returns:
+            A BulkLoadReport with the rows loaded and throughput.
+
+        Raises:
+            BulkLoadError: If a batch fails. Batches committed before the failure stay committed.
+        """
+        method = method or self.method
+        batch_size = batch_size or self.batch_size
+        workers = max(1, workers or self.workers)
+        if method not in LOAD_METHODS:
+            raise ValueError(f"Invalid load method: {method}. Valid options are {LOAD_METHODS}.")
+        if upsert and method != "insert":
+            raise ValueError("Upserts are only supported with method='insert'.")
+
+        report = BulkLoadReport(table=table, method=method, total_rows=len(df), batch_size=batch_size)
+        completed = self._read_checkpoint(checkpoint_path, report)
+        report.completed_batches.extend(sorted(completed))
+        pending = [start for start in range(0, len(df), batch_size) if start not in completed]
+        if completed:
+            logger.info(f"Resuming load into {table}: {len(completed)} batches already committed.")
+
+        statement = self.build_insert_statement(table, list(df.columns), upsert, update_columns)
+        lock = threading.Lock()
+        failed = threading.Event()
+        errors = []
+
+        def run_batch(start: int):
+            if failed.is_set():
+                return
+            batch = df.iloc[start : start + batch_size]
+            try:
+                self._load_batch(method, table, statement, batch)
+            except Exception as e:
+                failed.set()
+                with lock:
+                    report.failed_batches.append(start)
+                    errors.append(e)
+                logger.exception(f"Batch starting at row {start} failed while loading into {table}: {e}")
+                return
+            with lock:
+                report.completed_batches.append(start)
+                report.rows_loaded += len(batch)
+                self._write_checkpoint(checkpoint_path, report)
+
+        start_time = time.perf_counter()
+        if workers == 1:
+            for start in pending:
+                run_batch(start)
+                if failed.is_set():
+                    break
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-loader") as executor:
+                list(executor.map(run_batch, pending))
+        report.seconds = time.perf_counter() - start_time
+
+        logger.info(
+            f"Loaded {report.rows_loaded} rows into {table} via {method} in {report.seconds:.2f}s "
+            f"({report.rows_per_second:.0f} rows/s, {workers} worker(s))"
+        )
+        if errors:
+            raise BulkLoadError(
+                f"Bulk load into {table} failed after committing {report.committed_rows}/{report.total_rows} rows.",
+                report,
+            ) from errors[0]
+
+        if checkpoint_path is not None and Path(checkpoint_path).exists():
+            os.remove(checkpoint_path)
+        return report
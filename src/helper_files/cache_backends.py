@@ -0,0 +1,371 @@
+"""
+Pluggable result-cache backends for `memoized_method`: in-process memory, a SQLite file shared by the workers on a
+host, or a Redis-compatible server.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+from helper_files.python_helper import get_project_logger
+from file_paths import ProjectPaths
+
+file_paths = ProjectPaths()
+logger = get_project_logger(logger_name=__name__)
+
+CACHE_BACKENDS = ("memory", "sqlite", "redis")
+
+
+def expiry_times(ttl: Optional[float], stale_ttl: Optional[float], now: Optional[float] = None) -> tuple:
+    """
+    Return until when an entry is fresh and until when it may still be served stale. None means never.
+    """
+    if ttl is None:
+        return None, None
+    now = time.time() if now is None else now
+    return now + ttl, now + ttl + (stale_ttl or 0)
+
+
+class CacheBackend(ABC):
+    """
+    Interface of the result-cache backends. Values must be JSON serializable.
+
+    An entry is fresh for `ttl` seconds and may then be served stale for another `stale_ttl` seconds while it is
+    refreshed in the background. Refresh locks make sure only one worker refreshes an entry at a time.
+    """
+
+    def __init__(self):
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[tuple[Any, bool]]:
+        """
+        Look up an entry.
+
+        Returns:
+            (value, fresh), or None when there is no servable entry.
+        """
+        return self._count(self.peek(key))
+
+    @abstractmethod
+    def peek(self, key: str) -> Optional[tuple[Any, bool]]:
+        """
+        Look up an entry like `get`, without counting it as a hit or miss.
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, stale_ttl: Optional[float] = None):
+        """
+        Store an entry. A ttl of None keeps it until it is evicted.
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Remove an entry.
+        """
+
+    @abstractmethod
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+    @abstractmethod
+    def acquire_refresh_lock(self, key: str, timeout: float = 60.0) -> bool:
+        """
+        Try to become the one worker refreshing `key`. The lock expires after `timeout` seconds.
+        """
+
+    @abstractmethod
+    def release_refresh_lock(self, key: str):
+        """
+        Release the refresh lock of `key`.
+        """
+
+    def _count(self, found: Optional[tuple[Any, bool]]) -> Optional[tuple[Any, bool]]:
+        # Backends are shared by the request threads
+        with self._counter_lock:
+            if found is None:
+                self.misses += 1
+            elif found[1]:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return found
+
+    def stats(self) -> dict:
+        """
+        Return the hit, stale hit and miss counters of this process.
+        """
+        with self._counter_lock:
+            hits, stale_hits, misses = self.hits, self.stale_hits, self.misses
+        lookups = hits + stale_hits + misses
+        return {
+            "backend": type(self).__name__,
+            "hits": hits,
+            "stale_hits": stale_hits,
+            "misses": misses,
+            "hit_rate": round((hits + stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process LRU cache. Not shared between workers and lost on restart.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Keep at most this many entries, dropping the least recently used.
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._refresh_locks: dict[str, float] = {}
+
+    def peek(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, fresh_until, stale_until = entry
+            if stale_until is not None and now >= stale_until:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            # Hand out a copy so callers cannot change the cached value
+            return json.loads(value), fresh_until is None or now < fresh_until
+
+    def set(self, key, value, ttl=None, stale_ttl=None):
+        with self._lock:
+            self._entries[key] = (json.dumps(value), *expiry_times(ttl, stale_ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def acquire_refresh_lock(self, key, timeout=60.0):
+        now = time.time()
+        with self._lock:
+            if self._refresh_locks.get(key, 0) > now:
+                return False
+            self._refresh_locks[key] = now + timeout
+            return True
+
+    def release_refresh_lock(self, key):
+        with self._lock:
+            self._refresh_locks.pop(key, None)
+
+    def stats(self):
+        return {**super().stats(), "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache in a SQLite file, shared by all uvicorn workers on the host and kept across restarts.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, max_entries: int = 10_000):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: The SQLite file. Defaults to `memoized_results.sqlite` in the interim data folder.
+            max_entries: Keep at most this many entries, dropping the least recently used.
+        """
+        super().__init__()
+        self.db_path = Path(db_path or file_paths.INTERIM_DATA_DIR.joinpath("memoized_results.sqlite"))
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._sqlite: Optional[sqlite3.Connection] = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, so creating the backend (e.g. when the API module is imported) writes nothing
+        if self._sqlite is None:
+            with self._connect_lock:
+                if self._sqlite is None:
+                    self._sqlite = self._open()
+        return self._sqlite
+
+    def _open(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        with connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS memoized_results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    fresh_until REAL,
+                    stale_until REAL,
+                    last_used_at REAL NOT NULL
+                )"""
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS refresh_locks (key TEXT PRIMARY KEY, locked_until REAL NOT NULL)"
+            )
+        return connection
+
+    def peek(self, key):
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, fresh_until, stale_until FROM memoized_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[2] is not None and now >= row[2]):
+                return None
+            self._connection.execute("UPDATE memoized_results SET last_used_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1] is None or now < row[1]
+
+    def set(self, key, value, ttl=None, stale_ttl=None):
+        now = time.time()
+        fresh_until, stale_until = expiry_times(ttl, stale_ttl, now)
+        with self._lock, self._connection:
+            self._connection.execute(
+                """INSERT OR REPLACE INTO memoized_results (key, value, fresh_until, stale_until, last_used_at)
+                VALUES (?, ?, ?, ?, ?)""",
+                (key, json.dumps(value), fresh_until, stale_until, now),
+            )
+            self._connection.execute("DELETE FROM memoized_results WHERE stale_until <= ?", (now,))
+            self._connection.execute(
+                """DELETE FROM memoized_results WHERE key IN (
+                    SELECT key FROM memoized_results ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM memoized_results WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM memoized_results")
+
+    def acquire_refresh_lock(self, key, timeout=60.0):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM refresh_locks WHERE key = ? AND locked_until <= ?", (key, now))
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO refresh_locks (key, locked_until) VALUES (?, ?)", (key, now + timeout)
+            )
+            return cursor.rowcount == 1
+
+    def release_refresh_lock(self, key):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM refresh_locks WHERE key = ?", (key,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM memoized_results").fetchone()[0]
+        return {**super().stats(), "entries": entries, "max_entries": self.max_entries}
+
+    def close(self):
+        """
+        Close the SQLite connection, if it was opened.
+        """
+        with self._lock, self._connect_lock:
+            if self._sqlite is not None:
+                self._sqlite.close()
+                self._sqlite = None
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache in a Redis-compatible server, shared by every worker that can reach it.
+
+    Entries expire in Redis at the end of their stale period. Size-bounded eviction is left to the server: configure
+    `maxmemory` with the `allkeys-lru` policy.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "magicmirror:memoized:"):
+        """
+        Initialize the cache.
+
+        Args:
+            url: The Redis URL.
+            prefix: Prefix of all keys written by this cache.
+        """
+        if redis is None:
+            raise ImportError("The redis package is required for the Redis cache backend: pip install redis")
+        super().__init__()
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def peek(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["value"], entry["fresh_until"] is None or time.time() < entry["fresh_until"]
+
+    def set(self, key, value, ttl=None, stale_ttl=None):
+        now = time.time()
+        fresh_until, stale_until = expiry_times(ttl, stale_ttl, now)
+        self.client.set(
+            self.prefix + key,
+            json.dumps({"value": value, "fresh_until": fresh_until}),
+            ex=max(1, int(stale_until - now)) if stale_until is not None else None,
+        )
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def acquire_refresh_lock(self, key, timeout=60.0):
+        return bool(self.client.set(f"{self.prefix}lock:{key}", 1, nx=True, ex=max(1, int(timeout))))
+
+    def release_refresh_lock(self, key):
+        self.client.delete(f"{self.prefix}lock:{key}")
+
+
+def cache_backend_from_env(default: str = "memory") -> CacheBackend:
+    """
+    Create the backend named by the MEMOIZE_CACHE_BACKEND environment variable (memory, sqlite or redis). The Redis
+    backend connects to REDIS_URL.
+    """
+    name = os.getenv("MEMOIZE_CACHE_BACKEND", default).lower()
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "sqlite":
+        return SQLiteCacheBackend()
+    if name == "redis":
+        return RedisCacheBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown cache backend {name!r}, choose from {CACHE_BACKENDS}.")
@@ -0,0 +1,289 @@
+"""
+Bounded, thread-safe connection pool.
+"""
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.metrics import DB_POOL_WAIT_SECONDS
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+
+class PoolTimeoutError(TimeoutError):
+    """
+    Raised when no connection could be checked out of the pool in time.
+    """
+
+
+@dataclass
+class _PooledConnection:
+    connection: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used_at: float = field(default_factory=time.monotonic)
+
+
+class ConnectionPool:
+    """
+    Pool of reusable DB-API connections.
+
+    Connections are created lazily by `connection_factory` up to `max_size` and handed out LIFO, so the most
+    recently used (and therefore most likely alive) connection is reused first. Idle connections are pinged before
+    reuse and connections older than `recycle_seconds` are closed and replaced.
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        checkout_timeout: float = 30.0,
+        recycle_seconds: Optional[float] = 3600.0,
+        ping_interval: float = 30.0,
+        prefill: bool = True,
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            connection_factory: Callable returning a new, open connection.
+            min_size: Number of connections opened up front and kept idle.
+            max_size: Maximum number of connections open at the same time.
+            checkout_timeout: Default number of seconds to wait for a free connection.
+            recycle_seconds: Close connections older than this many seconds. None disables recycling.
+            ping_interval: Ping connections that have been idle for longer than this many seconds before reuse.
+            prefill: Open the `min_size` connections right away. Otherwise they are opened by `fill` or on demand.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        if not 0 <= min_size <= max_size:
+            raise ValueError("min_size must be between 0 and max_size.")
+
+        self.connection_factory = connection_factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.recycle_seconds = recycle_seconds
+        self.ping_interval = ping_interval
+
+        self._condition = threading.Condition(threading.Lock())
+        self._idle: deque[_PooledConnection] = deque()
+        self._in_use: dict[int, _PooledConnection] = {}
+        self._size = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        if prefill:
+            self.fill()
+
+    def fill(self):
+        """
+        Open connections until at least `min_size` connections exist.
+        """
+        while True:
+            with self._condition:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._create()
+            except Exception as e:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                logger.warning(f"Could not pre-fill connection pool: {e}")
+                return
+            with self._condition:
+                self._idle.append(pooled)
+                self._condition.notify()
+
+    def _create(self) -> _PooledConnection:
+        connection = self.connection_factory()
+        with self._condition:
+            self._created += 1
+        return _PooledConnection(connection)
+
+    def _is_expired(self, pooled: _PooledConnection, now: float) -> bool:
+        return self.recycle_seconds is not None and now - pooled.created_at > self.recycle_seconds
+
+    def _is_alive(self, pooled: _PooledConnection, now: float) -> bool:
+        if now - pooled.last_used_at <= self.ping_interval:
+            return True
+        try:
+            pooled.connection.ping(reconnect=False)
+            return True
+        except Exception as e:
+            logger.info(f"Dropping dead pooled connection: {e}")
+            return False
+
+    @staticmethod
+    def _close_quietly(pooled: _PooledConnection):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def checkout(self, timeout: Optional[float] = None):
+        """
+        Borrow a connection from the pool.
+
+        Args:
+            timeout: Seconds to wait for a free connection. Defaults to `checkout_timeout`.
+
+        Returns:
+            An open connection. It must be returned with `checkin`.
+
+        Raises:
+            PoolTimeoutError: If no connection became available within `timeout`.
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            pooled = None
+            create = False
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed.")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No connection available after {timeout}s (max_size={self.max_size})."
+                        )
+                    self._condition.wait(remaining)
+
+            if create:
+                try:
+                    pooled = self._create()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._is_expired(pooled, now):
+                    self._close_quietly(pooled)
+                    with self._condition:
+                        self._size -= 1
+                        self._recycled += 1
+                    continue
+                if not self._is_alive(pooled, now):
+                    self._close_quietly(pooled)
+                    with self._condition:
+                        self._size -= 1
+                        self._discarded += 1
+                    continue
+
+            waited = time.monotonic() - start
+            with self._condition:
+                self._in_use[id(pooled.connection)] = pooled
+                self._checkouts += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+            DB_POOL_WAIT_SECONDS.observe(waited)
+            return pooled.connection
+
+    def checkin(self, connection, discard: bool = False):
+        """
+        Return a borrowed connection to the pool.
+
+        Args:
+            connection: The connection obtained from `checkout`.
+            discard: Close the connection instead of reusing it, e.g. after an error left it in an unknown state.
+        """
+        with self._condition:
+            pooled = self._in_use.pop(id(connection), None)
+            if pooled is None:
+                logger.warning("Tried to check in a connection that does not belong to this pool.")
+                return
+            pooled.last_used_at = time.monotonic()
+            keep = not discard and not self._closed and getattr(connection, "open", True)
+            if keep:
+                self._idle.append(pooled)
+            else:
+                self._size -= 1
+                self._discarded += 1
+            self._condition.notify()
+
+        if not keep:
+            self._close_quietly(pooled)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Borrow a connection for the duration of a `with` block.
+
+        The connection is discarded instead of reused when the block raises.
+        """
+        connection = self.checkout(timeout)
+        try:
+            yield connection
+        except BaseException:
+            self.checkin(connection, discard=True)
+            raise
+        self.checkin(connection)
+
+    def close(self):
+        """
+        Close all idle connections and refuse new checkouts. Borrowed connections are closed on checkin.
+        """
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    def stats(self) -> dict:
+        """
+        Return a snapshot of the pool usage.
+        """
+        with self._condition:
+            return {
+                "size": self._size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "discarded": self._discarded,
+                "total_wait_seconds": round(self._total_wait, 6),
+                "avg_wait_seconds": round(self._total_wait / self._checkouts, 6) if self._checkouts else 0.0,
+                "max_wait_seconds": round(self._max_wait, 6),
+            }
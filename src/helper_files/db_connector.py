@@ -3,9 +3,7 @@ import sys
 from pathlib import Path
 import pandas as pd
 import pymysql
-import sshtunnel
 import yaml
-from sqlalchemy import create_engine
 from yaml.loader import SafeLoader
 from typing import Optional
 
@@ -19,8 +17,15 @@ from helper_files.python_helper import (
     trace,
     get_project_logger,
     parse_config,
+    parse_bool,
     config_mysql_ssh_args_dict,
 )
+from helper_files.connection_pool import ConnectionPool
+from helper_files.bulk_loader import BulkLoader, BulkLoadReport
+from helper_files.metrics import observe_query, query_fingerprint
+from helper_files.query_cache import QueryCache
+from helper_files.tracing import span
+from helper_files.ssh_tunnel_manager import SSHTunnelManager, TunnelTarget, get_tunnel_manager
 from file_paths import ProjectPaths
 
 file_paths = ProjectPaths()
@@ -47,14 +52,36 @@ class DBConnector:
         ssh_tunnel_port: Optional[int] = None,
         auto_load_credentials: bool = True,
         connection_name: str = "staging1",
+        pool_min_size: int = 1,
+        pool_max_size: int = 10,
+        pool_timeout: float = 30.0,
+        pool_recycle: Optional[float] = 3600.0,
+        local_infile: bool = False,
+        query_cache: Optional[QueryCache] = None,
+        lazy: bool = False,
+        tunnel_manager: Optional[SSHTunnelManager] = None,
     ):
         """
         Initialize the DBConnector and set up credentials.
+
+        Queries borrow connections from a bounded pool of at most `pool_max_size` connections. A checkout waits
+        `pool_timeout` seconds for a free connection, and connections are recycled after `pool_recycle` seconds.
+        Set `local_infile` to allow bulk loads through LOAD DATA LOCAL INFILE. Pass a `query_cache` to enable
+        caching of `query_data` results for queries that ask for it with `cache_ttl`. With `lazy`, the SSH tunnel
+        is only opened when the first connection is needed, or by `connect`.
+
+        Connectors share one SSH tunnel per SSH server through the process-wide tunnel manager (or `tunnel_manager`),
+        which keeps it alive and reconnects it when it drops. Without `ssh_tunnel`, connections go directly to
+        `mysql_host`.
         """
         DBConnector.initiated = True
         self.mysql_local_host = "127.0.0.1"
         self.charset = "utf8mb4"
-        self.connection = None
+        self.local_infile = local_infile
+        self.query_cache = query_cache
+        self.pool = None
+        self.tunnel = None
+        self.tunnel_manager = tunnel_manager or get_tunnel_manager()
 
         self.initialize_credentials(
             mysql_host,
@@ -72,7 +99,16 @@ class DBConnector:
 
         self.load_ssh_settings(file_paths.CONFIG_DIR)
         self.log_initialization()
-        self.open_tunnel()
+        if not lazy:
+            self.open_tunnel()
+        self.pool = ConnectionPool(
+            self.open_connection,
+            min_size=pool_min_size,
+            max_size=pool_max_size,
+            checkout_timeout=pool_timeout,
+            recycle_seconds=pool_recycle,
+            prefill=not lazy,
+        )
 
     def initialize_credentials(
         self,
@@ -119,10 +155,11 @@ class DBConnector:
                 mysql_port,
                 mysql_password,
                 ssh_tunnel,
-                ssh_tunnel_host,
-                ssh_tunnel_user,
-                ssh_tunnel_port,
             ]
+        ) and (
+            # The SSH settings are only needed when connecting through a tunnel
+            not parse_bool(ssh_tunnel)
+            or all(v is not None for v in [ssh_tunnel_host, ssh_tunnel_user, ssh_tunnel_port])
         ):
             if auto_load_credentials:
                 logger.warning(
@@ -167,7 +204,7 @@ class DBConnector:
             "ssh_tunnel": os.getenv("SSH_TUNNEL"),
             "ssh_tunnel_host": os.getenv("SSH_TUNNEL_HOST"),
             "ssh_tunnel_user": os.getenv("SSH_TUNNEL_USER"),
-            "ssh_tunnel_port": int(os.getenv("SSH_TUNNEL_PORT")),
+            "ssh_tunnel_port": int(os.getenv("SSH_TUNNEL_PORT")) if os.getenv("SSH_TUNNEL_PORT") else None,
         }
 
     def load_credentials_from_file(self, config_path, connection_name):
@@ -198,11 +235,10 @@ class DBConnector:
             "mysql_db",
             "mysql_port",
             "mysql_password",
-            "ssh_tunnel",
-            "ssh_tunnel_host",
-            "ssh_tunnel_user",
-            "ssh_tunnel_port",
         ]
+        # The SSH settings are only needed when connecting through a tunnel
+        if parse_bool(db_config.get("ssh_tunnel")):
+            required_keys += ["ssh_tunnel_host", "ssh_tunnel_user", "ssh_tunnel_port"]
         if not all(db_config.get(key) is not None for key in required_keys):
             raise ValueError("Not all credentials loaded")
 
@@ -226,7 +262,7 @@ class DBConnector:
         self.mysql_db = mysql_db
         self.mysql_port = mysql_port
         self.__mysql_password = mysql_password
-        self.ssh_tunnel = ssh_tunnel
+        self.ssh_tunnel = parse_bool(ssh_tunnel)
         self.ssh_tunnel_host = ssh_tunnel_host
         self.ssh_tunnel_user = ssh_tunnel_user
         self.ssh_tunnel_port = ssh_tunnel_port
@@ -288,44 +324,172 @@ class DBConnector:
             )
             return None
 
+    def tunnel_target(self) -> TunnelTarget:
+        """
+        Return the SSH server this connector tunnels through.
+        """
+        return TunnelTarget(
+            self.ssh_tunnel_host,
+            int(self.ssh_tunnel_port),
+            self.ssh_tunnel_user,
+            self.ssh_private_key_path,
+            self.ssh_private_key_pass,
+        )
+
     @trace
     def open_tunnel(self):
-        """Open a database connection if not already open or if it's closed."""
-        if self.connection is None or not self.connection.open:
-            self.tunnel = sshtunnel.SSHTunnelForwarder(
-                (self.ssh_tunnel_host, self.ssh_tunnel_port),
-                ssh_username=self.ssh_tunnel_user,
-                ssh_pkey=self.ssh_private_key_path,
-                remote_bind_address=(self.mysql_host, self.mysql_port),
-                ssh_private_key_password=self.ssh_private_key_pass,
-                allow_agent=False,
-            )
-            self.tunnel.start()
+        """Open the shared SSH tunnel to the database, or reconnect it if it is down."""
+        if not self.ssh_tunnel:
+            return
+        self.tunnel = self.tunnel_manager.tunnel(self.tunnel_target())
+        self.tunnel.local_port(self.mysql_host, self.mysql_port)
+
+    def database_address(self) -> tuple[str, int]:
+        """
+        Return the host and port to connect to, through the tunnel if one is used.
+        """
+        if not self.ssh_tunnel:
+            return self.mysql_host, int(self.mysql_port)
+        if self.tunnel is None:
+            self.open_tunnel()
+        return self.mysql_local_host, self.tunnel.local_port(self.mysql_host, self.mysql_port)
 
     def open_connection(self):
-        self.connection = pymysql.connect(
-            host=self.mysql_local_host,
+        """
+        Open a new connection through the tunnel. Used by the pool to create its connections.
+        """
+        host, port = self.database_address()
+        return pymysql.connect(
+            host=host,
             user=self.mysql_user,
             passwd=self.__mysql_password,
             db=self.mysql_db,
-            port=self.tunnel.local_bind_port,
+            port=port,
             charset=self.charset,
+            autocommit=True,
+            local_infile=self.local_infile,
         )
 
+    def connect(self):
+        """
+        Open the SSH tunnel and the pool's minimum number of connections now rather than on first use.
+        """
+        self.open_tunnel()
+        self.pool.fill()
+
+    def borrow_connection(self, timeout: Optional[float] = None):
+        """
+        Borrow a pooled connection for the duration of a `with` block.
+        """
+        return self.pool.connection(timeout)
+
+    def pool_stats(self) -> dict:
+        """
+        Return the connection pool statistics (in-use, idle, wait time).
+        """
+        return self.pool.stats()
+
+    def tunnel_stats(self) -> dict:
+        """
+        Return the state and reconnect counters of this connector's tunnel and the recent tunnel events.
+        """
+        if not self.ssh_tunnel or self.tunnel is None:
+            return {"ssh_tunnel": bool(self.ssh_tunnel), "state": "not used" if not self.ssh_tunnel else "not opened"}
+        return {"ssh_tunnel": True, **self.tunnel.stats(), "events": self.tunnel_manager.events(limit=20)}
+
+    def cache_stats(self) -> dict:
+        """
+        Return the query cache counters (hits, misses, evictions), or an empty dict if caching is disabled.
+        """
+        return self.query_cache.stats() if self.query_cache is not None else {}
+
+    def invalidate_cache(self, table: str) -> int:
+        """
+        Drop all cached results that read from `table`.
+        """
+        return self.query_cache.invalidate_table(table) if self.query_cache is not None else 0
+
     @trace
     def close_connection(self):
-        """Close the database connection."""
-        if self.connection and self.connection.open:
-            self.connection.close()
-            self.connection = None
+        """Close all pooled database connections."""
+        if self.pool is not None:
+            self.pool.close()
 
     @trace
-    def query_data(self, query, params=None):
+    def query_data(self, query, params=None, cache_ttl: Optional[float] = None):
         """
         Run a query to retrieve data from the database.
+
+        If the connector has a query cache and `cache_ttl` is given, the result is served from and stored in the
+        cache for `cache_ttl` seconds.
+        """
+        with span("db.query", fingerprint=query_fingerprint(query), operation="select") as query_span:
+            use_cache = self.query_cache is not None and cache_ttl is not None
+            if use_cache:
+                cached = self.query_cache.get(query, params)
+                if cached is not None:
+                    query_span.set(cached=True, rows=len(cached))
+                    return cached
+
+            # Timed once the connection is borrowed, pool waits are recorded by the pool
+            with self.borrow_connection() as connection, observe_query(query, "select") as observation:
+                result = pd.read_sql_query(query, connection, params=params)
+                observation.rows = len(result)
+                observation.result_bytes = int(result.memory_usage(index=True).sum())
+            query_span.set(cached=False, rows=observation.rows)
+
+            if use_cache:
+                self.query_cache.set(query, params, result, cache_ttl)
+            return result
+
+    def query_data_chunked(
+        self, query, params=None, chunk_size: int = 10000, as_dataframe: bool = True
+    ):
+        """
+        Stream the result of a query in chunks using a server-side (unbuffered) cursor.
+
+        Rows are only read from the socket when the consumer asks for the next chunk, so memory stays bounded by a
+        single chunk and a slow consumer throttles the server through TCP backpressure. A consumer that stalls for
+        longer than the server's `net_write_timeout` will have the stream aborted by MySQL.
+
+        Stopping early (breaking out of the loop, or calling `close()` on the generator) discards the connection
+        instead of draining the remaining rows, and the pool replaces it.
+
+        Args:
+            query: The SQL query.
+            params: Optional query parameters.
+            chunk_size: Number of rows per chunk.
+            as_dataframe: Yield DataFrames if True, otherwise lists of row tuples.
+
+        Yields:
+            Chunks of at most `chunk_size` rows.
         """
-        self.open_connection()
-        return pd.read_sql_query(query, self.connection, params)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1.")
+
+        connection = self.pool.checkout()
+        finished = False
+        try:
+            # Includes the time the consumer spends on each chunk, as rows are only read when it asks for them
+            with observe_query(query, "select_chunked") as observation:
+                observation.rows = 0
+                cursor = connection.cursor(pymysql.cursors.SSCursor)
+                cursor.execute(query, params)
+                columns = [column[0] for column in cursor.description or []]
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    observation.rows += len(rows)
+                    if as_dataframe:
+                        yield pd.DataFrame.from_records(rows, columns=columns)
+                    else:
+                        yield list(rows)
+                cursor.close()
+            finished = True
+        finally:
+            # An unbuffered result that was not read to the end leaves the connection unusable.
+            self.pool.checkin(connection, discard=not finished)
 
     @trace
     def insert_data(self, query, params=None):
@@ -337,41 +501,48 @@ class DBConnector:
     @trace
     def execute_query(self, query, params=None):
         """
-        Execute a query with the existing database connection.
+        Execute a query on a pooled database connection.
         """
-        self.open_connection()
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, params)
-            self.connection.commit()
+        try:
+            with span("db.query", fingerprint=query_fingerprint(query), operation="execute") as query_span:
+                with self.borrow_connection() as connection, observe_query(query, "execute") as observation:
+                    with connection.cursor() as cursor:
+                        observation.rows = cursor.execute(query, params)
+                    connection.commit()
+                query_span.set(rows=observation.rows)
+        finally:
+            if self.query_cache is not None:
+                self.query_cache.invalidate_query(query)
 
     @trace
     def insert_dataframe_in_batch(
-        self, df: pd.DataFrame, target_table_name: str, batch_size: int = 1000
-    ):
+        self,
+        df: pd.DataFrame,
+        target_table_name: str,
+        batch_size: int = 1000,
+        method: str = "insert",
+        workers: int = 1,
+        upsert: bool = False,
+        update_columns: Optional[list[str]] = None,
+        checkpoint_path: Optional[Path] = None,
+    ) -> BulkLoadReport:
         """
-        Insert a pandas DataFrame into a MySQL table in batches.
+        Insert a pandas DataFrame into a MySQL table in batches, committing each batch.
+
+        See `BulkLoader.load` for the options. Raises `BulkLoadError` if a batch fails.
         """
+        loader = BulkLoader(self, batch_size=batch_size, method=method, workers=workers)
         try:
-            self.open_connection()
-            if self.connection is None or not self.connection.open:
-                logger.error("Failed to establish database connection.")
-                return
-
-            engine = create_engine("mysql+pymysql://", creator=lambda: self.connection)
-            df.to_sql(
+            return loader.load(
+                df,
                 target_table_name,
-                con=engine,
-                if_exists="append",
-                index=False,
-                chunksize=batch_size,
-            )
-
-        except Exception as e:
-            logger.exception(
-                f"Skipped insert_dataframe_in_batch due to an exception: {e}"
+                upsert=upsert,
+                update_columns=update_columns,
+                checkpoint_path=checkpoint_path,
             )
-            if "engine" in locals():
-                engine.dispose()
+        finally:
+            # Batches committed before a failure still changed the table.
+            self.invalidate_cache(target_table_name)
 
 
 def example_run():
@@ -382,7 +553,8 @@ def example_run():
 
     # Use
     db_conn = DBConnector(mysql_password=os.getenv("MYSQL_PASSWORD_DEV"), **config_dict)
-    _ = db_conn.query_data("SELECT * FROM news")
+    for news_chunk in db_conn.query_data_chunked("SELECT * FROM news", chunk_size=5000):
+        logger.info(f"Read {len(news_chunk)} news rows")
 
 
 # example_run()
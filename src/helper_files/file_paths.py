@@ -1,25 +1,28 @@
 
+import logging
 import os
 from pathlib import Path
 
-import git
 import sys
 
-# from python_helper import get_project_logger
-#
-# logger = get_project_logger(logger_name=__name__)
+# Not the project logger: python_helper imports this module
+logger = logging.getLogger(__name__)
 
 
 def get_project_path() -> Path:
     """Get the path to the project directory. Function serves to harmonise referencing of files.
 
+    Looks for the enclosing git repository of the working directory by its `.git` entry, without starting git.
+
     Returns:
         Project path.
     """
-    git_repo = git.Repo(os.getcwd(), search_parent_directories=True)
-    git_root = git_repo.git.rev_parse("--show-toplevel")
-
-    return Path(git_root)
+    cwd = Path(os.getcwd()).resolve()
+    for directory in [cwd, *cwd.parents]:
+        # .git is a file in worktrees and submodules
+        if directory.joinpath(".git").exists():
+            return directory
+    raise FileNotFoundError(f"No git repository found above {cwd}")
 
 
 def add_project_to_path(project_path_obj=None):
@@ -31,7 +34,7 @@ def add_project_to_path(project_path_obj=None):
     try:
         sys.path.insert(0, str(project_path_obj.PROJECT_DIR))
     except Exception as e:
-        print(e)
+        logger.warning("Could not add %s to the path: %s", project_path_obj.PROJECT_DIR, e)
 
 
 class ProjectPaths:
@@ -54,15 +57,27 @@ class ProjectPaths:
     LOGS_DIR = PROJECT_DIR.joinpath("logs")
     SYS_LOGS_DIR = LOGS_DIR.joinpath("system")
 
-    # make directories
-    for directory in [
-        DATA_DIR,
-        RAW_DATA_DIR,
-        INTERIM_DATA_DIR,
-        PROCESSED_DATA_DIR,
-        PYTHON_UTILS_DIR,
-        CONFIG_DIR,
-        MODELS_DIR,
-        LOGS_DIR,
-    ]:
-        directory.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+    @staticmethod
+    def ensure_dir(directory: Path) -> Path:
+        """Create a directory on first use instead of at import.
+
+        Returns:
+            The directory.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    @classmethod
+    def make_directories(cls):
+        """Create all project directories, e.g. when setting up a new checkout."""
+        for directory in [
+            cls.DATA_DIR,
+            cls.RAW_DATA_DIR,
+            cls.INTERIM_DATA_DIR,
+            cls.PROCESSED_DATA_DIR,
+            cls.PYTHON_UTILS_DIR,
+            cls.CONFIG_DIR,
+            cls.MODELS_DIR,
+            cls.LOGS_DIR,
+        ]:
+            cls.ensure_dir(directory)
\ No newline at end of file
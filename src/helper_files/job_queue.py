@@ -0,0 +1,279 @@
+"""
+Bounded priority job queue with a dedicated worker pool and admission control.
+"""
+import itertools
+import queue
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Hashable, Optional
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class JobRejectedError(Exception):
+    """
+    Raised when admission control turns a job away.
+
+    Attributes:
+        retry_after: Suggested number of seconds to wait before submitting again.
+        overloaded: True if the queue is full, False if only low priority work is being shed.
+    """
+
+    def __init__(self, message: str, retry_after: int, overloaded: bool):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.overloaded = overloaded
+
+
+@dataclass
+class Job:
+    """
+    A unit of work and its progress. `future` resolves to the result.
+    """
+
+    id: str
+    priority: int
+    key: Optional[Hashable] = None
+    status: str = "queued"
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    future: Future = field(default_factory=Future, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def describe(self) -> dict:
+        """
+        Return the job's status and timings, plus its result once it is done.
+        """
+        description = {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "queued_seconds": round((self.started_at or time.time()) - self.submitted_at, 3),
+        }
+        if self.started_at is not None:
+            description["run_seconds"] = round((self.finished_at or time.time()) - self.started_at, 3)
+        if self.status == "done":
+            description["result"] = self.future.result()
+        elif self.status == "failed":
+            description["error"] = self.error
+        return description
+
+
+class JobQueue:
+    """
+    Runs submitted functions on a dedicated pool of worker threads, lowest priority number first.
+
+    Admission control keeps the queue from growing without bound: when `shed_threshold` jobs are waiting only jobs
+    with a priority of at most `protected_priority` are still accepted, and at `max_queue_size` every job is
+    rejected. Jobs with a `key` equal to that of an unfinished job are not queued twice; the existing job is
+    returned instead. Finished jobs are kept for `result_ttl` seconds to be polled.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue_size: int = 100,
+        shed_threshold: Optional[int] = None,
+        protected_priority: int = 0,
+        result_ttl: float = 600.0,
+        name: str = "job-queue",
+    ):
+        """
+        Initialize the queue. Its workers are started by the first submitted job.
+
+        Args:
+            workers: Number of worker threads.
+            max_queue_size: Maximum number of waiting jobs.
+            shed_threshold: Number of waiting jobs from which low priority jobs are rejected. Defaults to 75% of
+                `max_queue_size`.
+            protected_priority: Jobs with this priority or a lower number are not shed.
+            result_ttl: Seconds a finished job can still be polled.
+            name: Prefix of the worker thread names.
+        """
+        self.max_queue_size = max_queue_size
+        self.shed_threshold = shed_threshold if shed_threshold is not None else int(max_queue_size * 0.75)
+        self.protected_priority = protected_priority
+        self.result_ttl = result_ttl
+
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._jobs_by_key: dict[Hashable, Job] = {}
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.shed = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self._total_run_seconds = 0.0
+        self._total_queued_seconds = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"{name}-{index}", daemon=True) for index in range(workers)
+        ]
+        self._started = False
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _average_run_seconds(self) -> float:
+        finished = self.completed + self.failed
+        return self._total_run_seconds / finished if finished else 1.0
+
+    def _retry_after(self) -> int:
+        return max(1, int(self.depth * self._average_run_seconds() / len(self._workers)))
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, fn: Callable, *args, priority: int = 5, key: Optional[Hashable] = None, **kwargs) -> Job:
+        """
+        Queue `fn(*args, **kwargs)`.
+
+        Args:
+            priority: Lower numbers run first.
+            key: Identifies identical work, so it is queued only once.
+
+        Raises:
+            JobRejectedError: If admission control rejects the job.
+        """
+        with self._lock:
+            self._purge_expired()
+            if key is not None:
+                existing = self._jobs_by_key.get(key)
+                if existing is not None and not existing.done:
+                    self.deduplicated += 1
+                    return existing
+
+            depth = self.depth
+            if depth >= self.max_queue_size:
+                self.rejected += 1
+                raise JobRejectedError(f"The queue is full ({depth} jobs waiting).", self._retry_after(), True)
+            if depth >= self.shed_threshold and priority > self.protected_priority:
+                self.shed += 1
+                raise JobRejectedError(
+                    f"The queue is busy ({depth} jobs waiting), only priority {self.protected_priority} jobs are "
+                    f"accepted.",
+                    self._retry_after(),
+                    False,
+                )
+
+            job = Job(id=uuid.uuid4().hex, priority=priority, key=key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._jobs_by_key[key] = job
+            self.submitted += 1
+            self._queue.put((priority, next(self._sequence), job, fn, args, kwargs))
+            if not self._started:
+                for worker in self._workers:
+                    worker.start()
+                self._started = True
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Return a job by id, or None if it is unknown or expired.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            _, _, job, fn, args, kwargs = self._queue.get()
+            if fn is None:
+                return
+
+            with self._lock:
+                job.status = "running"
+                job.started_at = time.time()
+                self.running += 1
+            result, error = None, None
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                logger.warning(f"Job {job.id} failed: {e}")
+                error = e
+            except BaseException as e:
+                # E.g. SystemExit: fail the job so it does not stay running forever, then let it end this worker
+                logger.warning(f"Job {job.id} was interrupted: {e!r}")
+                self._finish(job, None, e)
+                raise
+            self._finish(job, result, error)
+
+    def _finish(self, job: Job, result: Any, error: Optional[BaseException]):
+        with self._lock:
+            job.finished_at = time.time()
+            self.running -= 1
+            self._total_run_seconds += job.finished_at - job.started_at
+            self._total_queued_seconds += job.started_at - job.submitted_at
+            if job.key is not None and self._jobs_by_key.get(job.key) is job:
+                del self._jobs_by_key[job.key]
+            # Status and future change together, so a poller never sees a done job without its result
+            if error is None:
+                job.status = "done"
+                self.completed += 1
+                job.future.set_result(result)
+            else:
+                job.status, job.error = "failed", str(error)
+                self.failed += 1
+                job.future.set_exception(error)
+
+    def stats(self) -> dict:
+        """
+        Return the queue depth, admission counters and average timings.
+        """
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "depth": self.depth,
+                "running": self.running,
+                "workers": len(self._workers),
+                "max_queue_size": self.max_queue_size,
+                "shed_threshold": self.shed_threshold,
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+                "shed": self.shed,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_queued_seconds": round(self._total_queued_seconds / finished, 3) if finished else 0.0,
+                "avg_run_seconds": round(self._total_run_seconds / finished, 3) if finished else 0.0,
+            }
+
+    def shutdown(self, timeout: Optional[float] = 5.0):
+        """
+        Stop the workers once the queued jobs have run, waiting at most `timeout` seconds per worker.
+        """
+        if not self._started:
+            return
+        for _ in self._workers:
+            # Sorts after every real job, and a None job stops the worker
+            self._queue.put((float("inf"), next(self._sequence), None, None, None, None))
+        for worker in self._workers:
+            worker.join(timeout)
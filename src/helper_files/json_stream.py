@@ -0,0 +1,78 @@
+"""
+Incremental parsing of a streamed JSON array.
+"""
+import json
+
+
+class JsonArrayStreamParser:
+    """
+    Parses the elements of a top-level JSON array of objects while the text is still arriving.
+
+    Text before the opening bracket, such as a Markdown code fence, is skipped. Each object is returned as soon as
+    its closing brace has been fed. Objects that are not valid JSON are skipped and counted in `errors`.
+    """
+
+    def __init__(self):
+        """
+        Initialize the parser.
+        """
+        self._buffer = []
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.errors = 0
+
+    def feed(self, text: str) -> list:
+        """
+        Feed the next piece of text.
+
+        Returns:
+            The objects completed by this piece, in order.
+        """
+        completed = []
+        for char in text:
+            if self._done:
+                break
+            if not self._in_array:
+                self._in_array = char == "["
+                continue
+
+            if self._depth == 0:
+                # Between elements: only an opening brace or the end of the array matter
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                elif char == "]":
+                    self._done = True
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        completed.append(json.loads("".join(self._buffer)))
+                    except json.JSONDecodeError:
+                        self.errors += 1
+                    self._buffer = []
+        return completed
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether the closing bracket of the array has been seen.
+        """
+        return self._done
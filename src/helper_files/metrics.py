@@ -0,0 +1,322 @@
+"""
+In-process metrics (counters, gauges and histograms) rendered in the Prometheus text exposition format.
+
+Recording a value is a dict lookup, a bisect and an increment under a lock; all formatting is left to `render`,
+so the cost is only paid when the metrics are scraped.
+"""
+import bisect
+import hashlib
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Optional
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTE_BUCKETS = (1_024, 16_384, 131_072, 1_048_576, 8_388_608, 67_108_864, 536_870_912)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    """
+    A monotonically increasing value.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down.
+    """
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets, plus their count and sum.
+    """
+
+    def __init__(self, buckets: tuple):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> tuple[list[int], int, float]:
+        """
+        Return the cumulative bucket counts (the last one being +Inf), the count and the sum.
+        """
+        with self._lock:
+            counts, count, total = list(self.bucket_counts), self.count, self.sum
+        cumulative, running = [], 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, count, total
+
+
+class MetricFamily:
+    """
+    A named metric with one series per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, label_names: tuple = (), buckets: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: dict[tuple, object] = {}
+
+    def labels(self, *values):
+        """
+        Return the series for the given label values, in the order of `label_names`.
+        """
+        key = tuple(str(value) for value in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects the labels {self.label_names}, got {values}.")
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    if self.kind == "histogram":
+                        series = Histogram(self.buckets)
+                    else:
+                        series = Gauge() if self.kind == "gauge" else Counter()
+                    self._series[key] = series
+        return series
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = list(self._series.items())
+        for values, metric in sorted(series):
+            if self.kind == "histogram":
+                cumulative, count, total = metric.snapshot()
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), cumulative):
+                    labels = _format_labels(self.label_names + ("le",), values + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.label_names, values)
+                lines.append(f"{self.name}_count{labels} {count}")
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            else:
+                lines.append(f"{self.name}{_format_labels(self.label_names, values)} {_format_value(metric.value)}")
+        return lines
+
+
+class GaugeCallback:
+    """
+    A gauge whose values are read from `callback` when the metrics are rendered.
+
+    `callback` returns either a number, or a dict of label values (a tuple in the order of `label_names`) to
+    numbers.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.label_names = tuple(label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the metric families of the process and renders them for Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: dict[str, object] = {}
+
+    def _register(self, family):
+        with self._lock:
+            existing = self._families.get(family.name)
+            if existing is not None:
+                return existing
+            self._families[family.name] = family
+            return family
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> MetricFamily:
+        return self._register(MetricFamily(name, documentation, "counter", label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()) -> MetricFamily:
+        return self._register(MetricFamily(name, documentation, "gauge", label_names))
+
+    def histogram(
+        self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS
+    ) -> MetricFamily:
+        return self._register(MetricFamily(name, documentation, "histogram", label_names, buckets))
+
+    def gauge_callback(
+        self, name: str, documentation: str, callback: Callable, label_names: tuple = ()
+    ) -> GaugeCallback:
+        """
+        Register a gauge that is evaluated on every scrape. Registering the same name again replaces the callback.
+        """
+        gauge = GaugeCallback(name, documentation, callback, label_names)
+        with self._lock:
+            self._families[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        """
+        Return all metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            try:
+                lines.extend(family.render())
+            except Exception as e:
+                lines.append(f"# {family.name} failed to render: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Database query latency by query fingerprint.", ("fingerprint", "operation")
+)
+DB_QUERY_ROWS = REGISTRY.histogram(
+    "db_query_rows", "Rows returned or affected per query.", ("fingerprint", "operation"), ROW_BUCKETS
+)
+DB_QUERY_BYTES = REGISTRY.histogram(
+    "db_query_result_bytes", "In-memory size of query results.", ("fingerprint", "operation"), BYTE_BUCKETS
+)
+DB_QUERY_ERRORS = REGISTRY.counter(
+    "db_query_errors_total", "Failed database queries.", ("fingerprint", "operation", "error")
+)
+DB_QUERY_FINGERPRINTS = REGISTRY.gauge(
+    "db_query_fingerprint_info", "Normalized query text of each query fingerprint.", ("fingerprint", "query")
+)
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_wait_seconds", "Time spent waiting to check out a pooled connection."
+)
+FUNCTION_SECONDS = REGISTRY.histogram("function_duration_seconds", "Latency of traced functions.", ("function",))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "API latency until the response headers are sent.", ("method", "route")
+)
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "API requests by status code.", ("method", "route", "status"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# Row-value lists such as `IN ((?, ?), (?, ?))`, once their tuples have been collapsed to `(?+)`
+_TUPLE_IN_LIST = re.compile(r"\(\s*\(\?\+\)(?:\s*,\s*\(\?\+\))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Reduce a query to its shape: literals and placeholders become `?`, IN lists `(?+)`, lists of tuples `((?+)+)` and
+    whitespace single spaces.
+    """
+    normalized = _STRING_LITERAL.sub("?", query)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _IN_LIST.sub("(?+)", normalized)
+    normalized = _TUPLE_IN_LIST.sub("((?+)+)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+@lru_cache(maxsize=4096)
+def query_fingerprint(query: str) -> str:
+    """
+    Return a short, stable id for the shape of a query, and record its normalized text once for reference.
+    """
+    normalized = normalize_query(query)
+    fingerprint = hashlib.sha1(normalized.encode()).hexdigest()[:12]
+    DB_QUERY_FINGERPRINTS.labels(fingerprint, normalized[:300]).set(1)
+    return fingerprint
+
+
+class QueryObservation:
+    """
+    Filled in by the instrumented code with the size of the result.
+    """
+
+    rows: Optional[int] = None
+    result_bytes: Optional[int] = None
+
+
+@contextmanager
+def observe_query(query: str, operation: str):
+    """
+    Time the query run inside the `with` block and record its latency, rows, result size and errors.
+    """
+    fingerprint = query_fingerprint(query)
+    observation = QueryObservation()
+    start = time.perf_counter()
+    try:
+        yield observation
+    except Exception as e:
+        DB_QUERY_ERRORS.labels(fingerprint, operation, type(e).__name__).inc()
+        raise
+    finally:
+        DB_QUERY_SECONDS.labels(fingerprint, operation).observe(time.perf_counter() - start)
+    if observation.rows is not None:
+        DB_QUERY_ROWS.labels(fingerprint, operation).observe(observation.rows)
+    if observation.result_bytes is not None:
+        DB_QUERY_BYTES.labels(fingerprint, operation).observe(observation.result_bytes)
+
+
+def render_metrics() -> str:
+    """
+    Return the metrics of the process in the Prometheus text format.
+    """
+    return REGISTRY.render()
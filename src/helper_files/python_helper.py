@@ -1,9 +1,14 @@
 """
 Python Helper.
 """
+import atexit
 import configparser
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
 import time
 from functools import wraps
 from pathlib import Path
@@ -21,14 +26,59 @@ except Exception as e:
     raise (e)
 
 from file_paths import ProjectPaths
+from helper_files.metrics import FUNCTION_SECONDS
 
 file_paths = ProjectPaths()
 
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_queue_handler_lock = threading.Lock()
+
+
+class _ListeningQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that starts the listener thread writing out its queue with the first record, so importing a module
+    that sets up a logger starts no thread.
+    """
+
+    def __init__(self, listener: logging.handlers.QueueListener):
+        super().__init__(listener.queue)
+        self.listener = listener
+        self._listening = False
+        self._listen_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord):
+        if not self._listening:
+            with self._listen_lock:
+                if not self._listening:
+                    self.listener.start()
+                    # Write out what is still queued when the process exits
+                    atexit.register(self.listener.stop)
+                    self._listening = True
+        super().enqueue(record)
+
+
+def _get_queue_handler() -> logging.handlers.QueueHandler:
+    """
+    Return the handler shared by all project loggers. It only puts records on a queue; a background listener
+    thread writes them to stderr, so logging never blocks the caller on I/O.
+    """
+    global _queue_handler
+    with _queue_handler_lock:
+        if _queue_handler is None:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s -- %(message)s"))
+            listener = logging.handlers.QueueListener(queue.SimpleQueue(), stream_handler, respect_handler_level=True)
+            _queue_handler = _ListeningQueueHandler(listener)
+    return _queue_handler
+
 
 def get_project_logger(logger_name: str) -> logging.Logger:
     """
     Set up a logger for the project.
 
+    Records go through a queue to a background writer. The level is taken from the LOG_LEVEL environment variable
+    if set (e.g. DEBUG), otherwise it is inherited from the root logger (WARNING by default).
+
     Args:
         logger_name: The name of the logger.
 
@@ -38,15 +88,34 @@ def get_project_logger(logger_name: str) -> logging.Logger:
     logger = logging.getLogger(logger_name)
 
     if not logger.hasHandlers():
-        handler = logging.StreamHandler()
-        log_format = "%(asctime)s %(levelname)s -- %(message)s"
-        formatter = logging.Formatter(log_format)
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(_get_queue_handler())
+        if os.getenv("LOG_LEVEL"):
+            logger.setLevel(os.getenv("LOG_LEVEL").upper())
 
     return logger
 
 
+class DataFramePreview:
+    """
+    Renders a DataFrame for a log message only when the message is emitted, capped in rows, columns and cell width.
+
+    Pass it as a lazy logging argument: `logger.debug("Prices:\n%s", DataFramePreview(df))`.
+    """
+
+    def __init__(self, df: pd.DataFrame, max_rows: int = 10, max_columns: int = 12, max_colwidth: int = 40):
+        self.df = df
+        self.max_rows = max_rows
+        self.max_columns = max_columns
+        self.max_colwidth = max_colwidth
+
+    def __str__(self) -> str:
+        if self.df is None:
+            return "None"
+        return self.df.to_string(
+            max_rows=self.max_rows, max_cols=self.max_columns, max_colwidth=self.max_colwidth, show_dimensions=True
+        )
+
+
 def log_init_params(cls: type, excluded_vars: Optional[list[str]] = None):
     """
     Log the class initialization parameters. Apply this function as a decorator to the class.
@@ -75,7 +144,7 @@ def log_init_params(cls: type, excluded_vars: Optional[list[str]] = None):
 
 def trace(func: callable) -> callable:
     """
-    Print the execution time for the decorated function.
+    Log the execution time for the decorated function and record it in the `function_duration_seconds` metric.
 
     Args:
         func (callable): The function to be decorated.
@@ -87,13 +156,15 @@ def trace(func: callable) -> callable:
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.time()
+        start = time.perf_counter()
         result = func(*args, **kwargs)
-        dataframe_size = ""
-        if isinstance(result, pd.DataFrame):
-            dataframe_size = f": Created a dataframe of shape {result.shape}"
-        end = time.time()
-        logger.debug(f"{func.__name__} ran in {round(end - start, 2)}s {dataframe_size}")
+        elapsed = time.perf_counter() - start
+        FUNCTION_SECONDS.labels(func.__qualname__).observe(elapsed)
+        if logger.isEnabledFor(logging.DEBUG):
+            dataframe_size = ""
+            if isinstance(result, pd.DataFrame):
+                dataframe_size = f": Created a dataframe of shape {result.shape}"
+            logger.debug(f"{func.__name__} ran in {round(elapsed, 2)}s {dataframe_size}")
         return result
 
     return wrapper
@@ -179,6 +250,21 @@ def find(lst: list[str], find_value: str) -> list[int]:
     return [i for i, x in enumerate(lst) if x == find_value]
 
 
+def parse_bool(value: Any) -> bool:
+    """
+    Interpret a setting that may be a bool or a string such as "true", "1" or "no" (e.g. from an env variable).
+
+    Args:
+        value (Any): The setting.
+
+    Returns:
+        bool: True for True, non-zero numbers and "true", "1", "yes" and "on" in any case.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "on")
+    return bool(value)
+
+
 def parse_config(filename: str) -> configparser.ConfigParser:
     """
     Parse a configuration file.
@@ -0,0 +1,192 @@
+"""
+In-memory query-result cache with TTLs, LRU eviction and table-level invalidation.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+TABLE_PATTERN = re.compile(
+    r"\b(?:FROM|JOIN|INTO|UPDATE|TABLE)\s+((?:`[^`]+`|\w+)(?:\.(?:`[^`]+`|\w+))?)",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Collapse whitespace so the same query formatted differently maps to the same cache key.
+    """
+    return " ".join(query.split())
+
+
+def extract_tables(query: str) -> set[str]:
+    """
+    Return the (lower-cased, schema-less) table names a query reads from or writes to.
+    """
+    tables = set()
+    for match in TABLE_PATTERN.finditer(query):
+        tables.add(match.group(1).split(".")[-1].strip("`").lower())
+    return tables
+
+
+@dataclass
+class _CacheEntry:
+    value: pd.DataFrame
+    expires_at: float
+    size: int
+    tables: frozenset
+
+
+class QueryCache:
+    """
+    Thread-safe cache of query results keyed on the normalized SQL and its parameters.
+
+    The cache is bounded by the memory used by the cached DataFrames and evicts the least recently used entries
+    first. Entries are removed when their TTL passes or when a write touches one of the tables they read from.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Upper bound on the memory used by the cached DataFrames.
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._keys_by_table: dict[str, set[str]] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, params=None) -> str:
+        """
+        Build the cache key for a query and its parameters.
+        """
+        return json.dumps([normalize_sql(query), params], default=str, sort_keys=True)
+
+    def _remove(self, key: str) -> Optional[_CacheEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table]
+        return entry
+
+    def get(self, query: str, params=None) -> Optional[pd.DataFrame]:
+        """
+        Return a copy of the cached result, or None on a miss.
+        """
+        key = self.make_key(query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry.value
+        return value.copy()
+
+    def set(self, query: str, params, value: pd.DataFrame, ttl: float):
+        """
+        Cache a query result for `ttl` seconds.
+        """
+        value = value.copy()
+        size = int(value.memory_usage(deep=True, index=True).sum())
+        if size > self.max_bytes:
+            logger.debug(f"Result of {size} bytes exceeds the cache size, not caching it.")
+            return
+
+        key = self.make_key(query, params)
+        tables = frozenset(extract_tables(query))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _CacheEntry(value, time.monotonic() + ttl, size, tables)
+            self._bytes += size
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate_table(self, table: str) -> int:
+        """
+        Drop all cached results that read from `table`.
+
+        Returns:
+            The number of entries removed.
+        """
+        table = table.split(".")[-1].strip("`").lower()
+        with self._lock:
+            keys = list(self._keys_by_table.get(table, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def invalidate_query(self, query: str) -> int:
+        """
+        Drop all cached results that read from a table the given (write) query touches.
+        """
+        return sum(self.invalidate_table(table) for table in extract_tables(query))
+
+    def clear(self):
+        """
+        Drop all cached results.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Return the cache counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
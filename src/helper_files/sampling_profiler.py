@@ -0,0 +1,269 @@
+"""
+On-demand sampling profiler for single requests, writing flamegraph-ready collapsed stacks.
+"""
+import heapq
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.python_helper import get_project_logger
+from file_paths import ProjectPaths
+
+logger = get_project_logger(logger_name=__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Leaf functions of threads that are waiting rather than working; their samples are left out
+IDLE_FUNCTIONS = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of all other threads every `interval` seconds from a background thread.
+
+    The sampled code is not instrumented, so its overhead is the sampler thread taking the GIL briefly once per
+    interval. Stacks are counted in the collapsed format: frames from the outermost in, separated by `;`, with
+    the thread name as root.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._frame_names: dict = {}
+
+    def _frame_name(self, code) -> tuple[str, str]:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = self._frame_names[code] = (os.path.basename(code.co_filename), code.co_qualname)
+        return name
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            if not frames or frames[0] in IDLE_FUNCTIONS:
+                continue
+            stack = ";".join(f"{function} ({filename})" for filename, function in reversed(frames))
+            self.stacks[f"{thread_names.get(thread_id, thread_id)};{stack}"] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+
+@dataclass
+class Profile:
+    """
+    The sampled stacks of one request.
+    """
+
+    id: str
+    method: str
+    path: str
+    started_at: float
+    duration: float
+    samples: int
+    interval: float
+    stacks: Counter = field(repr=False)
+    file: Optional[Path] = None
+
+    def collapsed(self) -> str:
+        """
+        Return the stacks in the collapsed format read by flamegraph.pl, speedscope and inferno.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def describe(self) -> dict:
+        return {
+            "profile_id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration, 4),
+            "samples": self.samples,
+            "interval_seconds": self.interval,
+            "file": str(self.file) if self.file is not None else None,
+        }
+
+
+class SamplingProfiler:
+    """
+    Profiles requests that ask for it with the X-Profile header or the `profile` query flag, plus a random
+    `sample_rate` fraction of all requests.
+
+    If a `token` is set, the header or flag must carry it. Unarmed requests only pay for the arming check. At most
+    `max_concurrent` requests are profiled at once; the sampler sees every thread, so overlapping requests show up in
+    each other's profiles. The `keep_slowest` slowest profiles are kept in memory and as `.collapsed` files in the
+    system logs folder; the files of profiles that drop out are removed.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        keep_slowest: int = 20,
+        max_concurrent: int = 2,
+        token: Optional[str] = None,
+        output_dir: Optional[Path] = None,
+    ):
+        """
+        Initialize the SamplingProfiler.
+
+        Args:
+            sample_rate: Fraction of requests profiled without asking.
+            interval: Seconds between stack samples.
+            keep_slowest: Number of profiles kept.
+            max_concurrent: Maximum number of requests profiled at the same time.
+            token: Secret the header or query flag must match. Any value arms the profiler if not set.
+            output_dir: Folder for the collapsed stack files. Defaults to the system logs folder.
+        """
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.keep_slowest = keep_slowest
+        self.max_concurrent = max_concurrent
+        self.token = token
+        self.output_dir = output_dir or ProjectPaths.SYS_LOGS_DIR
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._sequence = itertools.count()
+        # Min-heap on duration, so the fastest of the kept profiles is replaced first
+        self._slowest: list[tuple[float, int, Profile]] = []
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def is_armed(self, header_value: Optional[str], query_value: Optional[str]) -> bool:
+        """
+        Whether a request with these X-Profile header and `profile` query values should be profiled.
+        """
+        requested = header_value or query_value
+        if requested is not None:
+            if self.token is None:
+                return requested.lower() not in ("0", "false")
+            return hmac.compare_digest(requested.encode(), self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> Optional[StackSampler]:
+        """
+        Start sampling, or return None if `max_concurrent` requests are already being profiled.
+        """
+        with self._lock:
+            if self._active >= self.max_concurrent:
+                self.skipped_busy += 1
+                return None
+            self._active += 1
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler: StackSampler, method: str, path: str, started_at: float, duration: float) -> Profile:
+        """
+        Stop sampling and keep the profile if it is among the slowest.
+        """
+        stacks = sampler.stop()
+        profile = Profile(
+            uuid.uuid4().hex[:12], method, path, started_at, duration, sampler.samples, self.interval, stacks
+        )
+        evicted = None
+        with self._lock:
+            self._active -= 1
+            self.profiled += 1
+            entry = (duration, next(self._sequence), profile)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, entry)
+            else:
+                evicted = heapq.heappushpop(self._slowest, entry)[2]
+        if evicted is not profile:
+            self._write(profile)
+        if evicted is not None and evicted.file is not None:
+            evicted.file.unlink(missing_ok=True)
+        return profile
+
+    def _write(self, profile: Profile):
+        try:
+            ProjectPaths.ensure_dir(self.output_dir)
+            timestamp = datetime.fromtimestamp(profile.started_at).strftime("%Y%m%d-%H%M%S")
+            name = profile.path.strip("/").replace("/", "_") or "root"
+            profile.file = self.output_dir.joinpath(f"profile_{timestamp}_{name}_{profile.id}.collapsed")
+            profile.file.write_text(profile.collapsed())
+        except OSError as e:
+            logger.warning(f"Could not write profile {profile.id}: {e}")
+
+    def slowest(self) -> list[dict]:
+        """
+        Return the kept profiles, slowest first.
+        """
+        with self._lock:
+            profiles = [profile for _, _, profile in self._slowest]
+        return [profile.describe() for profile in sorted(profiles, key=lambda profile: profile.duration, reverse=True)]
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((profile for _, _, profile in self._slowest if profile.id == profile_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "interval_seconds": self.interval,
+                "active": self._active,
+                "profiled": self.profiled,
+                "skipped_busy": self.skipped_busy,
+                "kept": len(self._slowest),
+            }
+
+
+def profiler_from_env() -> SamplingProfiler:
+    """
+    Create the profiler from PROFILE_SAMPLE_RATE, PROFILE_INTERVAL, PROFILE_KEEP and PROFILE_TOKEN.
+    """
+    return SamplingProfiler(
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        interval=float(os.getenv("PROFILE_INTERVAL", "0.005")),
+        keep_slowest=int(os.getenv("PROFILE_KEEP", "20")),
+        token=os.getenv("PROFILE_TOKEN") or None,
+    )
@@ -0,0 +1,147 @@
+"""
+Single-flight request coalescing: concurrent identical calls share one in-flight computation.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Callable, Hashable, Optional
+
+# All groups by name, for reporting
+SINGLE_FLIGHT_GROUPS: dict[str, "SingleFlight"] = {}
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time. Callers that arrive while a computation for their key is in
+    flight wait for it and receive the same result object (or exception) instead of computing it again.
+
+    Synchronous callers are coalesced across threads, asynchronous callers within their event loop.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the group.
+
+        Args:
+            name: Name under which the group reports its stats.
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._tasks: dict[tuple, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """
+        Call `fn(*args, **kwargs)`, or wait for the identical call that is already running.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+        else:
+            call.event.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """
+        Await `fn(*args, **kwargs)`, or wait for the identical call that is already running.
+        """
+        task_key = (id(asyncio.get_running_loop()), key)
+        # Event loops in other threads share the tasks and counters
+        with self._lock:
+            self.calls += 1
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda _: self._forget_task(task_key))
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        # Shielded, so a waiter that is cancelled (e.g. a client disconnecting) does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _forget_task(self, task_key: tuple):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def stats(self) -> dict:
+        """
+        Return the number of calls, how many were computed and how many coalesced onto an in-flight computation.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalescing_ratio": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
+
+
+def single_flight(name: Optional[str] = None, share_across_instances: bool = False):
+    """
+    Decorate a function or method, sync or async, so concurrent calls with the same arguments share one
+    computation. The key is the function plus its arguments. For methods it includes the instance, since two
+    instances may be configured differently; with `share_across_instances` the calls of all instances are coalesced.
+    """
+    def decorator(func):
+        group_name = name or func.__qualname__
+        group = SINGLE_FLIGHT_GROUPS.setdefault(group_name, SingleFlight(group_name))
+        is_method = next(iter(inspect.signature(func).parameters), None) == "self"
+
+        def make_key(args, kwargs):
+            if is_method:
+                # The in-flight call holds a reference to the instance, so its id cannot be reused meanwhile
+                args = args[1:] if share_across_instances else (id(args[0]), *args[1:])
+            return functools._make_key(args, kwargs, typed=False)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapped_func(*args, **kwargs):
+                return await group.ado(make_key(args, kwargs), func, *args, **kwargs)
+            async_wrapped_func.single_flight = group
+            return async_wrapped_func
+
+        @functools.wraps(func)
+        def wrapped_func(*args, **kwargs):
+            return group.do(make_key(args, kwargs), func, *args, **kwargs)
+        wrapped_func.single_flight = group
+        return wrapped_func
+    return decorator
+
+
+def single_flight_stats() -> dict:
+    """
+    Return the stats of every single-flight group by name.
+    """
+    return {name: group.stats() for name, group in SINGLE_FLIGHT_GROUPS.items()}
@@ -0,0 +1,494 @@
+"""
+Process-wide SSH tunnels shared by all DBConnectors, with keepalives, health checks and reconnects with backoff.
+"""
+import random
+import select
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+LOCAL_HOST = "127.0.0.1"
+
+
+@dataclass(frozen=True)
+class TunnelTarget:
+    """
+    An SSH server and the credentials to log in with. Connectors with the same target share one tunnel.
+    """
+
+    ssh_host: str
+    ssh_port: int
+    ssh_user: str
+    ssh_private_key_path: Optional[str] = None
+    ssh_private_key_pass: Optional[str] = None
+
+    def __str__(self) -> str:
+        return f"{self.ssh_user}@{self.ssh_host}:{self.ssh_port}"
+
+
+@dataclass
+class TunnelEvent:
+    """
+    A change in the state of a tunnel.
+    """
+
+    at: float
+    target: str
+    event: str
+    detail: str = ""
+    reconnect_seconds: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "at": self.at,
+            "target": self.target,
+            "event": self.event,
+            "detail": self.detail,
+            "reconnect_seconds": self.reconnect_seconds,
+        }
+
+
+class SSHForwarder:
+    """
+    Forwarder over SSH with sshtunnel, forwarding several remote addresses over one SSH connection.
+
+    Forwarders are what a forwarder factory returns: objects with `start()`, `stop()`, `is_healthy()` and
+    `local_ports`, the local port of each remote address in order.
+    """
+
+    def __init__(
+        self,
+        target: TunnelTarget,
+        remote_binds: list[tuple[str, int]],
+        local_binds: list[tuple[str, int]],
+        keepalive_interval: float,
+    ):
+        # Imported on first use, paramiko takes a while to import
+        import sshtunnel
+
+        self._forwarder = sshtunnel.SSHTunnelForwarder(
+            (target.ssh_host, target.ssh_port),
+            ssh_username=target.ssh_user,
+            ssh_pkey=target.ssh_private_key_path,
+            ssh_private_key_password=target.ssh_private_key_pass,
+            remote_bind_addresses=remote_binds,
+            local_bind_addresses=local_binds,
+            set_keepalive=keepalive_interval,
+            allow_agent=False,
+        )
+
+    def start(self):
+        self._forwarder.start()
+
+    def stop(self):
+        self._forwarder.stop()
+
+    def is_healthy(self) -> bool:
+        if not self._forwarder.is_active:
+            return False
+        # Opens a channel per remote address, which fails if the SSH session is gone
+        self._forwarder.check_tunnels()
+        return all(self._forwarder.tunnel_is_up.values())
+
+    @property
+    def local_ports(self) -> list[int]:
+        return self._forwarder.local_bind_ports
+
+
+class TCPForwarder:
+    """
+    Plain TCP port forwarder with the same interface as `SSHForwarder`, without SSH.
+
+    A stand-in for an SSH server in tests and benchmarks: `stop()` it to simulate a dropped tunnel. Also usable to
+    reach a database directly through a fixed local port.
+    """
+
+    def __init__(self, remote_binds: list[tuple[str, int]], local_binds: list[tuple[str, int]]):
+        self.remote_binds = remote_binds
+        self.local_binds = local_binds
+        self._listeners: list[socket.socket] = []
+        self._sockets: set[socket.socket] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        for (local_host, local_port), remote in zip(self.local_binds, self.remote_binds):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((local_host, local_port))
+            listener.listen(64)
+            self._listeners.append(listener)
+            threading.Thread(target=self._accept, args=(listener, remote), daemon=True).start()
+
+    def _accept(self, listener: socket.socket, remote: tuple[str, int]):
+        while not self._stopped.is_set():
+            try:
+                client, _ = listener.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(remote, timeout=10)
+            except OSError:
+                client.close()
+                continue
+            with self._lock:
+                self._sockets.update((client, upstream))
+            threading.Thread(target=self._pump, args=(client, upstream), daemon=True).start()
+
+    def _pump(self, first: socket.socket, second: socket.socket):
+        peers = {first: second, second: first}
+        try:
+            while not self._stopped.is_set():
+                readable, _, _ = select.select(list(peers), [], [], 1.0)
+                for sock in readable:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    peers[sock].sendall(data)
+        except OSError:
+            pass
+        finally:
+            for sock in peers:
+                sock.close()
+            with self._lock:
+                self._sockets.difference_update(peers)
+
+    def stop(self):
+        self._stopped.set()
+        for listener in self._listeners:
+            # Shutting down wakes the accepting thread, which otherwise keeps the port bound
+            try:
+                listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            listener.close()
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                sock.close()
+            self._sockets.clear()
+
+    def is_healthy(self) -> bool:
+        return not self._stopped.is_set()
+
+    @property
+    def local_ports(self) -> list[int]:
+        return [listener.getsockname()[1] for listener in self._listeners]
+
+
+def ssh_forwarder_factory(
+    target: TunnelTarget, remote_binds: list, local_binds: list, keepalive_interval: float
+) -> SSHForwarder:
+    return SSHForwarder(target, remote_binds, local_binds, keepalive_interval)
+
+
+def tcp_forwarder_factory(
+    target: TunnelTarget, remote_binds: list, local_binds: list, keepalive_interval: float
+) -> TCPForwarder:
+    return TCPForwarder(remote_binds, local_binds)
+
+
+class ManagedTunnel:
+    """
+    One tunnel to an SSH target, multiplexing any number of remote addresses.
+
+    Each remote address keeps its local port across reconnects, so pooled connections can simply reconnect to the
+    same port. Adding a remote address restarts the forwarder with the extra address.
+    """
+
+    def __init__(self, target: TunnelTarget, manager: "SSHTunnelManager"):
+        self.target = target
+        self.manager = manager
+        self._lock = threading.RLock()
+        self._forwarder = None
+        self._remote_binds: list[tuple[str, int]] = []
+        self._local_ports: dict[tuple[str, int], int] = {}
+
+        self.state = "down"
+        self.up_since: Optional[float] = None
+        self.down_since: Optional[float] = None
+        self.connects = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_reconnect_seconds: Optional[float] = None
+        self.max_reconnect_seconds = 0.0
+
+    def _start_forwarder(self):
+        if self._forwarder is not None:
+            try:
+                self._forwarder.stop()
+            except Exception:
+                pass
+            self._forwarder = None
+
+        local_binds = [(LOCAL_HOST, self._local_ports.get(remote, 0)) for remote in self._remote_binds]
+        forwarder = self.manager.forwarder_factory(
+            self.target, list(self._remote_binds), local_binds, self.manager.keepalive_interval
+        )
+        try:
+            forwarder.start()
+        except Exception:
+            try:
+                forwarder.stop()
+            except Exception:
+                pass
+            raise
+        self._forwarder = forwarder
+        self._local_ports = dict(zip(self._remote_binds, forwarder.local_ports))
+
+    def _connect(self):
+        was_down_since = self.down_since
+        try:
+            self._start_forwarder()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.manager.emit(self, "connect_failed", str(e))
+            raise
+
+        self.connects += 1
+        self.state = "up"
+        self.up_since = time.time()
+        reconnect_seconds = None
+        if was_down_since is not None:
+            self.reconnects += 1
+            reconnect_seconds = self.up_since - was_down_since
+            self.last_reconnect_seconds = reconnect_seconds
+            self.max_reconnect_seconds = max(self.max_reconnect_seconds, reconnect_seconds)
+        self.down_since = None
+        binds = ", ".join(f"{host}:{port}->{self._local_ports[(host, port)]}" for host, port in self._remote_binds)
+        self.manager.emit(self, "up", binds, reconnect_seconds)
+
+    def _mark_down(self, reason: str):
+        if self.state == "up":
+            self.state = "down"
+            self.down_since = time.time()
+            self.manager.emit(self, "down", reason)
+
+    def local_port(self, remote_host: str, remote_port: int) -> int:
+        """
+        Return the local port forwarding to a remote address, (re)starting the tunnel if needed.
+        """
+        remote = (remote_host, int(remote_port))
+        with self._lock:
+            if remote not in self._remote_binds:
+                self._remote_binds.append(remote)
+                if self._forwarder is not None:
+                    self._mark_down(f"adding {remote_host}:{remote_port}")
+                    self._connect()
+            if self._forwarder is None or self.state != "up" or not self._forwarder.is_healthy():
+                self._mark_down("unhealthy on use")
+                self._connect()
+            return self._local_ports[remote]
+
+    def check(self, stop_event: threading.Event):
+        """
+        Health check. If the tunnel is down, reconnect with exponential backoff and jitter until it is up again or
+        `stop_event` is set.
+        """
+        with self._lock:
+            if self._forwarder is None:
+                return
+            try:
+                healthy = self._forwarder.is_healthy()
+            except Exception as e:
+                healthy = False
+                self.last_error = str(e)
+            if healthy:
+                return
+            self._mark_down(self.last_error or "health check failed")
+
+        delay = self.manager.backoff_base
+        while not stop_event.is_set():
+            with self._lock:
+                if self.state == "up":
+                    # Reconnected on use in the meantime
+                    return
+                try:
+                    self._connect()
+                    return
+                except Exception as e:
+                    logger.warning(f"Reconnecting SSH tunnel {self.target} failed, retrying in {delay:.1f}s: {e}")
+            stop_event.wait(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, self.manager.backoff_max)
+
+    def close(self):
+        with self._lock:
+            if self._forwarder is not None:
+                self._forwarder.stop()
+                self._forwarder = None
+            self._mark_down("closed")
+            self.down_since = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "binds": {f"{host}:{port}": local for (host, port), local in self._local_ports.items()},
+                "up_since": self.up_since,
+                "down_since": self.down_since,
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "last_reconnect_seconds": self.last_reconnect_seconds,
+                "max_reconnect_seconds": self.max_reconnect_seconds,
+            }
+
+
+class SSHTunnelManager:
+    """
+    Shares one tunnel per SSH target among all connectors in the process and keeps the tunnels healthy.
+
+    A background thread checks every tunnel each `health_check_interval` seconds and reconnects dropped ones with
+    exponential backoff, starting at `backoff_base` seconds and capped at `backoff_max`. Tunnels that are found
+    down when a connection is opened are reconnected right away. Up/down events are logged, kept in a bounded
+    history and passed to listeners.
+    """
+
+    def __init__(
+        self,
+        forwarder_factory: Callable = ssh_forwarder_factory,
+        keepalive_interval: float = 15.0,
+        health_check_interval: float = 10.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        max_events: int = 200,
+    ):
+        """
+        Initialize the SSHTunnelManager.
+
+        Args:
+            forwarder_factory: Called as `factory(target, remote_binds, local_binds, keepalive_interval)` to create
+                a forwarder. Defaults to SSH through sshtunnel; `tcp_forwarder_factory` needs no SSH server.
+            keepalive_interval: Seconds between SSH keepalive packets.
+            health_check_interval: Seconds between health checks.
+            backoff_base: First delay between reconnect attempts.
+            backoff_max: Maximum delay between reconnect attempts.
+            max_events: Number of tunnel events kept.
+        """
+        self.forwarder_factory = forwarder_factory
+        self.keepalive_interval = keepalive_interval
+        self.health_check_interval = health_check_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._tunnels: dict[TunnelTarget, ManagedTunnel] = {}
+        self._events: deque[TunnelEvent] = deque(maxlen=max_events)
+        self._listeners: list[Callable[[TunnelEvent], None]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def tunnel(self, target: TunnelTarget) -> ManagedTunnel:
+        """
+        Return the shared tunnel to `target`, without starting it.
+        """
+        with self._lock:
+            tunnel = self._tunnels.get(target)
+            if tunnel is None:
+                tunnel = self._tunnels[target] = ManagedTunnel(target, self)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name="ssh-tunnel-health", daemon=True)
+                self._thread.start()
+            return tunnel
+
+    def local_port(self, target: TunnelTarget, remote_host: str, remote_port: int) -> int:
+        """
+        Return the local port forwarding to `remote_host:remote_port` through the shared tunnel to `target`.
+        """
+        return self.tunnel(target).local_port(remote_host, remote_port)
+
+    def _run(self):
+        while not self._stop_event.wait(self.health_check_interval):
+            with self._lock:
+                tunnels = list(self._tunnels.values())
+            for tunnel in tunnels:
+                try:
+                    tunnel.check(self._stop_event)
+                except Exception as e:
+                    logger.exception(f"Health check of SSH tunnel {tunnel.target} failed: {e}")
+
+    def add_listener(self, listener: Callable[[TunnelEvent], None]):
+        """
+        Call `listener` with every tunnel event.
+        """
+        self._listeners.append(listener)
+
+    def emit(self, tunnel: ManagedTunnel, event: str, detail: str = "", reconnect_seconds: Optional[float] = None):
+        tunnel_event = TunnelEvent(time.time(), str(tunnel.target), event, detail, reconnect_seconds)
+        self._events.append(tunnel_event)
+        if event == "up":
+            latency = f" after {reconnect_seconds:.2f}s" if reconnect_seconds is not None else ""
+            logger.info(f"SSH tunnel {tunnel.target} up{latency}: {detail}")
+        else:
+            logger.warning(f"SSH tunnel {tunnel.target} {event}: {detail}")
+        for listener in self._listeners:
+            try:
+                listener(tunnel_event)
+            except Exception as e:
+                logger.warning(f"Tunnel event listener failed: {e}")
+
+    def events(self, limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the most recent tunnel events, oldest first.
+        """
+        events = list(self._events)
+        return [event.as_dict() for event in (events[-limit:] if limit else events)]
+
+    def stats(self) -> dict:
+        """
+        Return the state and reconnect counters of every tunnel by target.
+        """
+        with self._lock:
+            tunnels = list(self._tunnels.values())
+        return {str(tunnel.target): tunnel.stats() for tunnel in tunnels}
+
+    def close(self):
+        """
+        Stop the health checks and close all tunnels.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        with self._lock:
+            tunnels = list(self._tunnels.values())
+            self._tunnels.clear()
+        for tunnel in tunnels:
+            tunnel.close()
+
+
+_manager: Optional[SSHTunnelManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_tunnel_manager() -> SSHTunnelManager:
+    """
+    Return the process-wide tunnel manager.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SSHTunnelManager()
+        return _manager
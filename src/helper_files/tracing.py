@@ -0,0 +1,199 @@
+"""
+Request-scoped span tracing. Spans nest through a context variable, so they follow awaits, tasks and
+`asyncio.to_thread`, and are written as JSON lines to the logs folder by a background thread.
+"""
+import functools
+import inspect
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.python_helper import get_project_logger
+from file_paths import ProjectPaths
+
+file_paths = ProjectPaths()
+logger = get_project_logger(logger_name=__name__)
+
+SPAN_LOG_FILE = "spans.jsonl"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+@dataclass
+class Span:
+    """
+    A timed operation within a trace. `start` is a Unix timestamp and `duration` in seconds.
+    """
+
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    thread: str = field(default_factory=lambda: threading.current_thread().name)
+    attributes: dict = field(default_factory=dict)
+
+    def set(self, **attributes):
+        """
+        Add attributes, e.g. the number of rows once a query returned.
+        """
+        self.attributes.update(attributes)
+
+
+class _NoSpan:
+    """
+    Stands in for a span when nothing is recorded, so callers can set attributes unconditionally.
+    """
+
+    def set(self, **attributes):
+        pass
+
+
+NO_SPAN = _NoSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanWriter:
+    """
+    Appends finished spans to a JSON lines file from a background thread, so requests never wait for the disk.
+
+    The file is rotated to `<name>.1` when it grows beyond `max_bytes`. Spans are dropped rather than queued
+    without bound if the writer falls behind.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = 50 * 1024 * 1024, max_queued: int = 10_000):
+        """
+        Initialize the SpanWriter.
+
+        Args:
+            path: The span log. Defaults to `spans.jsonl` in the logs folder.
+            max_bytes: Size at which the span log is rotated.
+            max_queued: Maximum number of spans waiting to be written.
+        """
+        self.path = path or file_paths.LOGS_DIR.joinpath(SPAN_LOG_FILE)
+        self.max_bytes = max_bytes
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def write(self, span: Span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-writer", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        ProjectPaths.ensure_dir(self.path.parent)
+        while True:
+            spans = [self._queue.get()]
+            # Write whatever else is waiting in the same go
+            while not self._queue.empty() and len(spans) < 1000:
+                spans.append(self._queue.get_nowait())
+            try:
+                if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                    os.replace(self.path, self.path.with_suffix(self.path.suffix + ".1"))
+                with open(self.path, "a") as f:
+                    f.write("".join(json.dumps(asdict(span), default=str) + "\n" for span in spans))
+                self.written += len(spans)
+            except OSError as e:
+                self.dropped += len(spans)
+                logger.warning(f"Could not write {len(spans)} spans to {self.path}: {e}")
+            for _ in spans:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait until all queued spans are written.
+        """
+        self._queue.join()
+
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() in ("1", "true")
+span_writer = SpanWriter()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current_span.get()
+    return active.trace_id if active is not None else None
+
+
+@contextmanager
+def span(name: str, root: bool = False, trace_id: Optional[str] = None, **attributes):
+    """
+    Time the `with` block as a span, nested under the current span.
+
+    Outside a trace nothing is recorded, unless `root` is set: then a new trace is started, with `trace_id` or a
+    fresh id. Yields the span, whose attributes can still be set inside the block, or `NO_SPAN` when not recording.
+    """
+    parent = _current_span.get()
+    if not TRACING_ENABLED or (parent is None and not root):
+        yield NO_SPAN
+        return
+
+    if root or parent is None:
+        new_span = Span(name, trace_id or uuid.uuid4().hex, attributes=attributes)
+    else:
+        new_span = Span(name, parent.trace_id, parent_id=parent.span_id, attributes=attributes)
+    token = _current_span.set(new_span)
+    start = time.perf_counter()
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.status = "error"
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        new_span.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        span_writer.write(new_span)
+
+
+def traced(name: Optional[str] = None, **attributes):
+    """
+    Decorate a function or coroutine function so each call is a span named `name` (default: its qualified name).
+    Calls outside a trace are not recorded.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapped_func(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapped_func
+
+        @functools.wraps(func)
+        def wrapped_func(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapped_func
+    return decorator
@@ -0,0 +1,319 @@
+"""Process-local index of the latest Vesper quote per product/source and their duration 1 forecasts."""
+
+import threading
+import time
+from typing import Optional
+
+import pandas as pd
+from helper_files.db_connector import DBConnector
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+QUOTE_COLUMNS = "id, product_id, data_source_id, price, currency, data_series_id, date"
+FORECAST_COLUMNS = "id, origin_data_series_id, value, last_value_date, display_date"
+
+MAX_QUOTE_ID_QUERY = "SELECT COALESCE(MAX(id), 0) AS max_id FROM vesper_quotations"
+MAX_FORECAST_ID_QUERY = "SELECT COALESCE(MAX(id), 0) AS max_id FROM forecasts_quotations"
+
+INDEX_LATEST_QUOTES_QUERY = f"""
+SELECT {QUOTE_COLUMNS}
+FROM (
+    SELECT {QUOTE_COLUMNS},
+           ROW_NUMBER() OVER (PARTITION BY product_id, data_source_id ORDER BY date DESC, id DESC) AS row_rank
+    FROM vesper_quotations
+) ranked
+WHERE row_rank = 1
+"""
+
+# Forecasts for the latest quote date of each series, plus any that already point past it.
+INDEX_FORECASTS_QUERY = f"""
+WITH latest AS (
+    SELECT data_series_id, MAX(date) AS date
+    FROM vesper_quotations
+    GROUP BY data_series_id
+)
+SELECT fq.id, fq.origin_data_series_id, fq.value, fq.last_value_date, fq.display_date
+FROM forecasts_quotations fq
+JOIN latest ON latest.data_series_id = fq.origin_data_series_id AND fq.last_value_date >= latest.date
+WHERE fq.duration = 1
+"""
+
+NEW_QUOTES_QUERY = f"""
+SELECT {QUOTE_COLUMNS}
+FROM vesper_quotations
+WHERE id > %s
+ORDER BY id
+LIMIT %s
+"""
+
+NEW_FORECASTS_QUERY = f"""
+SELECT {FORECAST_COLUMNS}
+FROM forecasts_quotations
+WHERE id > %s AND duration = 1
+ORDER BY id
+LIMIT %s
+"""
+
+
+class LatestQuoteIndex:
+    """
+    Keeps the latest vesper_quotations row per (product_id, data_source_id) and the duration 1 forecasts per
+    (origin_data_series_id, last_value_date) in memory.
+
+    After a full load, a background thread polls for rows with an id above the high-water mark and applies only
+    those deltas. Rows that are updated or deleted in place are not picked up until the next full reload.
+    """
+
+    def __init__(
+        self,
+        db_connection: DBConnector,
+        refresh_interval: float = 30.0,
+        delta_batch_size: int = 10000,
+        full_reload_interval: Optional[float] = 6 * 3600,
+    ):
+        """
+        Initializes the LatestQuoteIndex.
+
+        Args:
+            db_connection: The DB connection to load the index from.
+            refresh_interval: Seconds between delta refreshes.
+            delta_batch_size: Maximum number of new rows read per delta query.
+            full_reload_interval: Seconds between full reloads, to pick up in-place updates. None disables them.
+        """
+        self.db_connection = db_connection
+        self.refresh_interval = refresh_interval
+        self.delta_batch_size = delta_batch_size
+        self.full_reload_interval = full_reload_interval
+
+        self._lock = threading.Lock()
+        self._quotes: dict[tuple[int, int], dict] = {}
+        self._forecasts: dict[tuple[int, str], list[dict]] = {}
+        self._quote_high_water_mark = 0
+        self._forecast_high_water_mark = 0
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.ready = False
+        self.last_refresh_at: Optional[float] = None
+        self.last_full_load_at: Optional[float] = None
+        self.last_refresh_duration = 0.0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.rows_applied = 0
+        # Lookups run on many request threads, a lock of their own keeps them from waiting on a refresh
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit: bool):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _quote_record(row) -> dict:
+        return {
+            "id": int(row["id"]),
+            "price": float(row["price"]),
+            "currency": str(row["currency"]),
+            "data_series_id": int(row["data_series_id"]),
+            "date": pd.Timestamp(row["date"]).strftime("%Y-%m-%d"),
+        }
+
+    @staticmethod
+    def _forecast_key(row) -> tuple[int, str]:
+        return int(row["origin_data_series_id"]), pd.Timestamp(row["last_value_date"]).strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _forecast_record(row) -> dict:
+        return {
+            "id": int(row["id"]),
+            "value": row["value"],
+            "last_value_date": row["last_value_date"],
+            "display_date": row["display_date"],
+        }
+
+    def _apply_quotes(self, quotes: dict, rows: pd.DataFrame) -> int:
+        applied = 0
+        for row in rows.to_dict(orient="records"):
+            key = (int(row["product_id"]), int(row["data_source_id"]))
+            record = self._quote_record(row)
+            current = quotes.get(key)
+            if current is None or (record["date"], record["id"]) > (current["date"], current["id"]):
+                quotes[key] = record
+                applied += 1
+        return applied
+
+    def _apply_forecasts(self, forecasts: dict, rows: pd.DataFrame) -> int:
+        for row in rows.to_dict(orient="records"):
+            record = self._forecast_record(row)
+            entries = forecasts.setdefault(self._forecast_key(row), [])
+            if all(entry["id"] != record["id"] for entry in entries):
+                entries.append(record)
+        return len(rows)
+
+    def _prune_forecasts(self, quotes: dict, forecasts: dict) -> dict:
+        latest_date_by_series = {}
+        for quote in quotes.values():
+            series = quote["data_series_id"]
+            latest_date_by_series[series] = max(quote["date"], latest_date_by_series.get(series, quote["date"]))
+        return {
+            key: entries
+            for key, entries in forecasts.items()
+            if key[0] in latest_date_by_series and key[1] >= latest_date_by_series[key[0]]
+        }
+
+    def _max_id(self, query: str) -> int:
+        return int(self.db_connection.query_data(query=query)["max_id"].iloc[0])
+
+    def load(self):
+        """
+        Build the index from scratch and reset the high-water marks.
+        """
+        start = time.perf_counter()
+        # Read the marks first: rows landing during the load are replayed as deltas, which is idempotent.
+        quote_mark = self._max_id(MAX_QUOTE_ID_QUERY)
+        forecast_mark = self._max_id(MAX_FORECAST_ID_QUERY)
+
+        quotes = {}
+        forecasts = {}
+        self._apply_quotes(quotes, self.db_connection.query_data(query=INDEX_LATEST_QUOTES_QUERY))
+        self._apply_forecasts(forecasts, self.db_connection.query_data(query=INDEX_FORECASTS_QUERY))
+
+        with self._lock:
+            self._quotes = quotes
+            self._forecasts = forecasts
+            self._quote_high_water_mark = quote_mark
+            self._forecast_high_water_mark = forecast_mark
+            self.ready = True
+            self.last_full_load_at = self.last_refresh_at = time.time()
+            self.last_refresh_duration = time.perf_counter() - start
+
+        logger.info(
+            f"Loaded latest quote index: {len(quotes)} quotes, {len(forecasts)} forecast keys "
+            f"in {self.last_refresh_duration:.2f}s"
+        )
+
+    def _read_deltas(self, query: str, high_water_mark: int) -> tuple[pd.DataFrame, int]:
+        chunks = []
+        while True:
+            rows = self.db_connection.query_data(query=query, params=(high_water_mark, self.delta_batch_size))
+            if rows.empty:
+                break
+            chunks.append(rows)
+            high_water_mark = int(rows["id"].max())
+            if len(rows) < self.delta_batch_size:
+                break
+        return (pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()), high_water_mark
+
+    def refresh(self) -> int:
+        """
+        Apply the rows added since the last refresh.
+
+        Returns:
+            The number of rows applied.
+        """
+        start = time.perf_counter()
+        new_quotes, quote_mark = self._read_deltas(NEW_QUOTES_QUERY, self._quote_high_water_mark)
+        new_forecasts, forecast_mark = self._read_deltas(NEW_FORECASTS_QUERY, self._forecast_high_water_mark)
+
+        applied = 0
+        with self._lock:
+            if not new_quotes.empty:
+                applied += self._apply_quotes(self._quotes, new_quotes)
+            if not new_forecasts.empty:
+                applied += self._apply_forecasts(self._forecasts, new_forecasts)
+            if applied:
+                self._forecasts = self._prune_forecasts(self._quotes, self._forecasts)
+            self._quote_high_water_mark = quote_mark
+            self._forecast_high_water_mark = forecast_mark
+            self.rows_applied += applied
+            self.refreshes += 1
+            self.last_refresh_at = time.time()
+            self.last_refresh_duration = time.perf_counter() - start
+        return applied
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                full_reload_due = (
+                    self.full_reload_interval is not None
+                    and self.last_full_load_at is not None
+                    and time.time() - self.last_full_load_at > self.full_reload_interval
+                )
+                if not self.ready or full_reload_due:
+                    self.load()
+                else:
+                    self.refresh()
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.exception(f"Refreshing the latest quote index failed: {e}")
+            self._stop_event.wait(self.refresh_interval)
+
+    def start(self):
+        """
+        Start keeping the index warm in a background thread. The first full load also happens there.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="latest-quote-index", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """
+        Stop the background refresh thread.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_latest_quote(self, product_id: int, data_source_id: int) -> Optional[dict]:
+        """
+        Return the latest quote in the format of `VesperDataProcessor.get_latest_vesper_data`, or None on a miss.
+        """
+        quote = self._quotes.get((product_id, data_source_id)) if self.ready else None
+        self._count(quote is not None)
+        if quote is None:
+            return None
+        return {key: value for key, value in quote.items() if key != "id"}
+
+    def get_forecasts(self, data_series_id: int, date: str) -> Optional[pd.DataFrame]:
+        """
+        Return the duration 1 forecasts for a series and last value date, or None if the index has none.
+        """
+        entries = self._forecasts.get((data_series_id, date)) if self.ready else None
+        self._count(bool(entries))
+        if not entries:
+            return None
+        return pd.DataFrame(
+            [{key: value for key, value in entry.items() if key != "id"} for entry in entries],
+            columns=["value", "last_value_date", "display_date"],
+        )
+
+    def metrics(self) -> dict:
+        """
+        Return the index size, staleness and refresh metrics.
+        """
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "quotes": len(self._quotes),
+                "forecast_keys": len(self._forecasts),
+                "quote_high_water_mark": self._quote_high_water_mark,
+                "forecast_high_water_mark": self._forecast_high_water_mark,
+                "staleness_seconds": round(time.time() - self.last_refresh_at, 3) if self.last_refresh_at else None,
+                "last_refresh_duration_seconds": round(self.last_refresh_duration, 6),
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "rows_applied": self.rows_applied,
+                "hits": hits,
+                "misses": misses,
+            }
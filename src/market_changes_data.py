@@ -1,10 +1,72 @@
 import pandas as pd
+from helper_files.async_db_connector import AsyncDBConnector
 from helper_files.db_connector import DBConnector
+from helper_files.python_helper import DataFramePreview, get_project_logger
+from helper_files.single_flight import single_flight
 import json
 
+logger = get_project_logger(logger_name=__name__)
+
+USER_TOP_DATA_SERIES_QUERY = "SELECT user_id, data_series_id FROM user_top_data_series"
+USER_TOP_DATA_SERIES_CACHE_TTL = 300
+
+PRICE_DETAILS_QUERY = """
+SELECT price_id, change_percentage, created_at
+FROM price_changes
+WHERE data_series_id IN ({placeholders})
+  AND created_at >= %s
+  AND created_at < %s
+"""
+
+VESPER_ENRICHMENT_QUERY = """
+SELECT vq.id AS price_id, products.name as product_name, vq.data_source_id, vq.date, vq.price, vq.currency
+FROM vesper_quotations vq
+LEFT JOIN products on products.id = vq.product_id
+WHERE vq.id IN ({placeholders})
+"""
+
+# Latest change per product for one user, ranked on the server instead of in pandas. Needs MySQL 8+ (window functions).
+LATEST_MARKET_CHANGES_QUERY = """
+SELECT product_name, price, change_percentage, date, currency
+FROM (
+    SELECT products.name AS product_name, vq.price, pc.change_percentage, vq.date, vq.currency,
+           ROW_NUMBER() OVER (PARTITION BY products.name ORDER BY pc.created_at DESC) AS row_rank
+    FROM (
+        SELECT DISTINCT data_series_id FROM user_top_data_series WHERE user_id = %s
+    ) uts
+    JOIN price_changes pc ON pc.data_series_id = uts.data_series_id
+    -- Inner joins: changes without a quote or product are left out, as in the pandas pipeline
+    JOIN vesper_quotations vq ON vq.id = pc.price_id
+    JOIN products ON products.id = vq.product_id
+    WHERE pc.created_at >= %s
+      AND pc.created_at < %s
+) ranked
+WHERE row_rank = 1
+ORDER BY product_name
+"""
+
+START_OF_LAST_MONTH = "2024-11-01"
+END_OF_THIS_MONTH = "2024-11-28"
+
+PRICE_DETAILS_COLUMNS = ["price_id", "change_percentage", "created_at", "product_id", "date", "price", "currency"]
+
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
 class MarketChangesProcessor:
-    def __init__(self, db_connection: DBConnector):
+    def __init__(self, db_connection: DBConnector, use_pushdown: bool = True):
+        """
+        Initializes the MarketChangesProcessor.
+
+        Args:
+            db_connection: The DB connection to query through.
+            use_pushdown: Resolve the latest change per product with a single windowed SQL query, falling back to
+                the three-query pandas pipeline if it fails.
+        """
         self.db_connection = db_connection
+        self.use_pushdown = use_pushdown
 
     def get_user_data_series(self, df, user_id: int):
         """
@@ -15,36 +77,84 @@ class MarketChangesProcessor:
             user_data = df[df["user_id"] == user_id]
             return user_data["data_series_id"].tolist()
         except KeyError as e:
-            print(f"Error: Missing expected column {e} in the DataFrame.")
+            logger.error("Missing expected column %s in the DataFrame.", e)
             return []
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
             return []
 
+    @staticmethod
+    def _price_details_query(data_series_ids):
+        query = PRICE_DETAILS_QUERY.format(placeholders=_placeholders(data_series_ids))
+        return query, (*data_series_ids, START_OF_LAST_MONTH, END_OF_THIS_MONTH)
+
+    @staticmethod
+    def _enrichment_query(price_details):
+        price_ids = price_details["price_id"].unique().tolist()
+        query = VESPER_ENRICHMENT_QUERY.format(placeholders=_placeholders(price_ids))
+        return query, tuple(price_ids)
+
+    @staticmethod
+    def _empty_enrichment(price_details):
+        return pd.DataFrame(
+            columns=price_details.columns.tolist() + ["product_id", "data_source_id", "date", "price", "currency"]
+        )
+
+    @staticmethod
+    def _build_market_changes_json(enriched_price_details):
+        # Filter the most recent record per product_id
+        recent_price_details = enriched_price_details.sort_values(by=["product_name", "created_at"], ascending=[True, False])
+        most_recent_price = recent_price_details.drop_duplicates(subset="product_name", keep="first")
+
+        # Convert the most recent price record for each product into a JSON object
+        return [
+            {
+                "product_id": row["product_name"],
+                "price": row["price"],
+                "change_percentage": row["change_percentage"],
+                "date": row["date"].strftime('%Y-%m-%d'),  # Format the date as a string
+                "currency": row["currency"]
+            }
+            for _, row in most_recent_price.iterrows()
+        ]
+
+    @staticmethod
+    def _market_changes_params(user_id: int):
+        return user_id, START_OF_LAST_MONTH, END_OF_THIS_MONTH
+
+    @staticmethod
+    def _build_pushdown_json(latest_changes):
+        latest_changes = latest_changes.rename(columns={"product_name": "product_id"})
+        latest_changes["date"] = pd.to_datetime(latest_changes["date"]).dt.strftime("%Y-%m-%d")
+        return latest_changes[["product_id", "price", "change_percentage", "date", "currency"]].to_dict(
+            orient="records"
+        )
+
+    def get_latest_market_changes_pushdown(self, user_id: int):
+        """
+        Retrieves the most recent market change per product for a user in one parameterized query.
+        Raises on database errors so the caller can fall back to the pandas pipeline.
+        """
+        latest_changes = self.db_connection.query_data(
+            query=LATEST_MARKET_CHANGES_QUERY, params=self._market_changes_params(user_id)
+        )
+        return self._build_pushdown_json(latest_changes)
+
     def get_price_details_for_data_series_last_month(self, data_series_ids):
         """
         Fetches price IDs and change percentages from the price_changes table
         for the given data series IDs, filtered by the last month.
         """
         if not data_series_ids:
-            print("No data series IDs provided.")
-            return pd.DataFrame(columns=["price_id", "change_percentage", "created_at", "product_id", "date", "price", "currency"])
+            logger.info("No data series IDs provided.")
+            return pd.DataFrame(columns=PRICE_DETAILS_COLUMNS)
 
         try:
-            start_of_last_month_str = "2024-11-01"
-            end_of_this_month_str = "2024-11-28"
-            ids_str = ", ".join(map(str, data_series_ids))
-            query = f"""
-            SELECT price_id, change_percentage, created_at
-            FROM price_changes
-            WHERE data_series_id IN ({ids_str})
-              AND created_at >= '{start_of_last_month_str}'
-              AND created_at < '{end_of_this_month_str}'
-            """
-            return self.db_connection.query_data(query=query)
+            query, params = self._price_details_query(data_series_ids)
+            return self.db_connection.query_data(query=query, params=params)
         except Exception as e:
-            print(f"Unexpected error while fetching price details: {e}")
-            return pd.DataFrame(columns=["price_id", "change_percentage", "created_at", "product_id", "date", "price", "currency"])
+            logger.error("Unexpected error while fetching price details: %s", e)
+            return pd.DataFrame(columns=PRICE_DETAILS_COLUMNS)
 
     def enrich_price_details_with_vpi(self, price_details):
         """
@@ -52,73 +162,89 @@ class MarketChangesProcessor:
         from the vesper_quotations table.
         """
         if price_details.empty:
-            print("Price details DataFrame is empty.")
-            return pd.DataFrame(
-                columns=price_details.columns.tolist() + ["product_id", "data_source_id", "date", "price", "currency"]
-            )
+            logger.info("Price details DataFrame is empty.")
+            return self._empty_enrichment(price_details)
 
         try:
-            price_ids = price_details["price_id"].unique().tolist()
-            ids_str = ", ".join(map(str, price_ids))
-
-            query = f"""
-            SELECT vq.id AS price_id, products.name as product_name, vq.data_source_id, vq.date, vq.price, vq.currency
-            FROM vesper_quotations vq
-            LEFT JOIN products on products.id = vq.product_id
-            WHERE vq.id IN ({ids_str})
-            """
-            vesper_data = self.db_connection.query_data(query=query)
+            query, params = self._enrichment_query(price_details)
+            vesper_data = self.db_connection.query_data(query=query, params=params)
 
             enriched_data = price_details.merge(vesper_data, on="price_id", how="left")
             return enriched_data
         except Exception as e:
-            print(f"Unexpected error while enriching price details: {e}")
+            logger.error("Unexpected error while enriching price details: %s", e)
             return price_details
 
+    @single_flight()
     def get_full_market_changes_info(self, user_id: int):
         """
         Retrieves the most recent market change information for a given user and returns it in JSON format.
         """
+        if self.use_pushdown:
+            try:
+                return self.get_latest_market_changes_pushdown(user_id)
+            except Exception as e:
+                logger.warning("Pushed-down market changes query failed, falling back to pandas: %s", e)
+        return self.get_full_market_changes_info_pandas(user_id)
+
+    def get_full_market_changes_info_pandas(self, user_id: int):
+        """
+        Retrieves the most recent market change information for a given user with three queries and pandas.
+        """
         try:
             # Query the user_top_data_series table to get the user's data series
-            query = "SELECT user_id, data_series_id FROM user_top_data_series"
-            df = self.db_connection.query_data(query=query)
+            df = self.db_connection.query_data(
+                query=USER_TOP_DATA_SERIES_QUERY, cache_ttl=USER_TOP_DATA_SERIES_CACHE_TTL
+            )
 
             # Get data series IDs for the given user_id
             data_series_ids = self.get_user_data_series(df, user_id)
-            print(f"Data series for user {user_id}: {data_series_ids}")
+            logger.debug("Data series for user %s: %s", user_id, data_series_ids)
 
             if not data_series_ids:
-                print(f"No data series found for user {user_id}.")
+                logger.info("No data series found for user %s.", user_id)
                 return []
 
             # Fetch price details for the last month
             price_details_df = self.get_price_details_for_data_series_last_month(data_series_ids)
-            print(f"Price details for user {user_id} in the last month:")
-            print(price_details_df)
+            logger.debug(
+                "Price details for user %s in the last month:\n%s", user_id, DataFramePreview(price_details_df)
+            )
 
             # Enrich the price details with additional data from vesper_quotations
             enriched_price_details = self.enrich_price_details_with_vpi(price_details_df)
-            print(f"Enriched price details for user {user_id}:")
-            print(enriched_price_details)
-
-            # Filter the most recent record per product_id
-            recent_price_details = enriched_price_details.sort_values(by=["product_name", "created_at"], ascending=[True, False])
-            most_recent_price = recent_price_details.drop_duplicates(subset="product_name", keep="first")
-
-            # Convert the most recent price record for each product into a JSON object
-            most_recent_json = [
-                {
-                    "product_id": row["product_name"],
-                    "price": row["price"],
-                    "change_percentage": row["change_percentage"],
-                    "date": row["date"].strftime('%Y-%m-%d'),  # Format the date as a string
-                    "currency": row["currency"]
-                }
-                for _, row in most_recent_price.iterrows()
-            ]
-            
-            return most_recent_json  # Return the JSON as a formatted string
+            logger.debug(
+                "Enriched price details for user %s:\n%s", user_id, DataFramePreview(enriched_price_details)
+            )
+
+            return self._build_market_changes_json(enriched_price_details)
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            return {[]}  # Return an empty JSON array in case of an error
+            logger.error("Unexpected error: %s", e)
+            return []  # Return an empty JSON array in case of an error
+
+
+class AsyncMarketChangesProcessor:
+    """
+    Awaitable front of the MarketChangesProcessor for async endpoints.
+
+    The processor runs on the AsyncDBConnector's executor, so its queries and pandas steps never block the event loop.
+    Concurrent calls for the same user are coalesced before they take an executor thread.
+    """
+
+    def __init__(self, db_connection: AsyncDBConnector, use_pushdown: bool = True):
+        """
+        Initializes the AsyncMarketChangesProcessor.
+
+        Args:
+            db_connection: The awaitable DB connection. The processor queries its DBConnector.
+            use_pushdown: See MarketChangesProcessor.
+        """
+        self.db_connection = db_connection
+        self.processor = MarketChangesProcessor(db_connection.db_connection, use_pushdown=use_pushdown)
+
+    @single_flight()
+    async def get_full_market_changes_info(self, user_id: int):
+        """
+        Retrieves the most recent market change information for a given user without blocking the event loop.
+        """
+        return await self.db_connection.run(self.processor.get_full_market_changes_info, user_id)
@@ -0,0 +1,187 @@
+"""Token-aware construction of the highlights summary prompt."""
+
+import functools
+from dataclasses import dataclass, field
+
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
+# Rough average for English text, used when tiktoken is not installed. Token counts are then estimates.
+CHARS_PER_TOKEN = 4
+
+HIGHLIGHTS_SYSTEM_PROMPT = """
+You are an assistant that summarizes market and news reports related to the dairy market.
+Summarize the articles the user sends into a JSON list. Each item in the JSON should contain the following fields:
+
+- "article_id": The Article ID given above the article.
+- "title": The title of the article.
+- "content": The content of the article.
+- "market_effect": An emoji that represents the potential market effect (upward 📈, downward 📉, or neutral 🟢).
+If the content suggests an increase in prices, use 📈; if it suggests a decrease, use 📉; otherwise, use 🟢.
+
+Do not return HTML or bullet points. The output should be a JSON array where each object represents an article in the format:
+
+[
+    {
+        "article_id": 0,
+        "title": "Title of the article",
+        "content": "Content of the article",
+        "market_effect": "📈"
+    },
+    ...
+]
+""".strip()
+
+# Chat formatting overhead per message, as documented for the OpenAI chat models.
+TOKENS_PER_MESSAGE = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    # Imported on first use, loading tiktoken slows down the API start
+    try:
+        import tiktoken
+    except ImportError:  # pragma: no cover - tiktoken is optional
+        # Cached, so this is logged once per model
+        logger.warning(
+            "tiktoken is not installed, token counts for %s are estimated at %s characters per token",
+            model,
+            CHARS_PER_TOKEN,
+        )
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def tokens_are_estimated(model: str = "gpt-4o-mini") -> bool:
+    """
+    Return whether token counts for `model` are character-based estimates, because tiktoken is not installed.
+    """
+    return _get_encoding(model) is None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Count the tokens of a text locally. Falls back to a character-based estimate without tiktoken.
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """
+    Cut a text down to at most `max_tokens` tokens.
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def lead_paragraphs(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> tuple[str, bool]:
+    """
+    Keep the leading paragraphs of a text that fit in `max_tokens` tokens.
+
+    Returns:
+        The shortened text and whether anything was cut.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text, False
+
+    paragraphs = [paragraph.strip() for paragraph in text.splitlines() if paragraph.strip()]
+    kept = []
+    used = 0
+    for paragraph in paragraphs:
+        paragraph_tokens = count_tokens(paragraph, model)
+        if used + paragraph_tokens > max_tokens:
+            break
+        kept.append(paragraph)
+        used += paragraph_tokens
+
+    if not kept:
+        # The lead paragraph alone is too long
+        return truncate_to_tokens(paragraphs[0] if paragraphs else text, max_tokens, model) + " …", True
+    return "\n".join(kept), True
+
+
+@dataclass
+class PromptBuild:
+    """
+    A built prompt and the bookkeeping of what went into it.
+    """
+
+    system_prompt: str
+    user_message: str
+    article_ids: list[int] = field(default_factory=list)
+    dropped_ids: list[int] = field(default_factory=list)
+    truncated_ids: list[int] = field(default_factory=list)
+    prompt_tokens: int = 0
+    # True when prompt_tokens is a character-based estimate
+    tokens_estimated: bool = False
+
+    @property
+    def messages(self) -> list[dict]:
+        return [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": self.user_message}]
+
+
+class HighlightsPromptBuilder:
+    """
+    Builds the highlights prompt within a token budget.
+
+    The instructions go in the system message and every article is sent once, in the user message. Long article
+    bodies are cut down to their lead paragraphs, and articles are added in priority order until the budget is used.
+    """
+
+    def __init__(self, token_budget: int = 6000, max_article_tokens: int = 600, model: str = "gpt-4o-mini"):
+        """
+        Initializes the HighlightsPromptBuilder.
+
+        Args:
+            token_budget: Maximum number of prompt tokens (system and user message together).
+            max_article_tokens: Maximum number of tokens of a single article's content.
+            model: The model the tokens are counted for.
+        """
+        self.token_budget = token_budget
+        self.max_article_tokens = max_article_tokens
+        self.model = model
+        self.system_prompt = HIGHLIGHTS_SYSTEM_PROMPT
+
+    def format_article(self, article_id: int, article: dict) -> tuple[str, bool]:
+        content, truncated = lead_paragraphs(str(article["content"]), self.max_article_tokens, self.model)
+        return f"Article ID: {article_id}\nTitle: {article['title']}\nContent: {content}", truncated
+
+    def build(self, articles: list[dict]) -> PromptBuild:
+        """
+        Build the prompt for a list of articles.
+
+        Articles are dictionaries with a "title", a "content" and optionally a "priority" (lower goes first; ties
+        keep list order). The Article IDs in the prompt are the positions in `articles`.
+        """
+        build = PromptBuild(
+            system_prompt=self.system_prompt, user_message="", tokens_estimated=tokens_are_estimated(self.model)
+        )
+        used = count_tokens(self.system_prompt, self.model) + 2 * TOKENS_PER_MESSAGE
+
+        order = sorted(range(len(articles)), key=lambda position: (articles[position].get("priority", 0), position))
+        sections = []
+        for article_id in order:
+            section, truncated = self.format_article(article_id, articles[article_id])
+            section_tokens = count_tokens(section + "\n\n", self.model)
+            if used + section_tokens > self.token_budget:
+                build.dropped_ids.append(article_id)
+                continue
+            sections.append(section)
+            used += section_tokens
+            build.article_ids.append(article_id)
+            if truncated:
+                build.truncated_ids.append(article_id)
+
+        build.user_message = "\n\n".join(sections)
+        build.prompt_tokens = used
+        return build
@@ -69,65 +69,64 @@ class PriceSuggestion:
 
 
 # Example usage:
-
-# Mock market data
-market_data = [
-    {
-        "Market Date": "Nov 27, 2024",
-        "Median Listing Price": 7400,
-        "Median First COUNTER_BID": 7350,
-        "Average Deal Price": 7420,
-        "Average Step Change for COUNTER_OFFERs": 2.5,
-        "Average Step Change for COUNTER_BIDs": 4.0,
-    },
-    {
-        "Market Date": "Nov 20, 2024",
-        "Median Listing Price": 7350,
-        "Median First COUNTER_BID": 7300,
-        "Average Deal Price": 7370,
-        "Average Step Change for COUNTER_OFFERs": 2.2,
-        "Average Step Change for COUNTER_BIDs": 3.8,
-    },
-    {
-        "Market Date": "Nov 13, 2024",
-        "Median Listing Price": 7340,
-        "Median First COUNTER_BID": 7270,
-        "Average Deal Price": 7360,
-        "Average Step Change for COUNTER_OFFERs": 2.3,
-        "Average Step Change for COUNTER_BIDs": 3.5,
-    },
-    {
-        "Market Date": "Nov 6, 2024",
-        "Median Listing Price": 7370,
-        "Median First COUNTER_BID": 7310,
-        "Average Deal Price": 7390,
-        "Average Step Change for COUNTER_OFFERs": 2.7,
-        "Average Step Change for COUNTER_BIDs": 4.3,
-    },
-    {
-        "Market Date": "Oct 30, 2024",
-        "Median Listing Price": 7300,
-        "Median First COUNTER_BID": 7230,
-        "Average Deal Price": 7350,
-        "Average Step Change for COUNTER_OFFERs": 2.4,
-        "Average Step Change for COUNTER_BIDs": 3.9,
-    },
-]
-
-# Static market values
-butter_price = 7600
-price_change_percentage_last_month = 2.0
-butter_forecast_value = 7498.04
-
-
-price_suggester = PriceSuggestion(
-    median_listing_price=7400,
-    median_first_counter_bid=7350,
-    average_deal_price=7420,
-    avg_step_change_counter_offers=2.5,
-    avg_step_change_counter_bids=4,
-    butter_price=7600,
-    butter_forecast_value=7498.04,
-)
-suggested_price = price_suggester.suggest_selling_price()
-print(f"Suggested selling price: {suggested_price}")
+if __name__ == "__main__":
+    # Mock market data
+    market_data = [
+        {
+            "Market Date": "Nov 27, 2024",
+            "Median Listing Price": 7400,
+            "Median First COUNTER_BID": 7350,
+            "Average Deal Price": 7420,
+            "Average Step Change for COUNTER_OFFERs": 2.5,
+            "Average Step Change for COUNTER_BIDs": 4.0,
+        },
+        {
+            "Market Date": "Nov 20, 2024",
+            "Median Listing Price": 7350,
+            "Median First COUNTER_BID": 7300,
+            "Average Deal Price": 7370,
+            "Average Step Change for COUNTER_OFFERs": 2.2,
+            "Average Step Change for COUNTER_BIDs": 3.8,
+        },
+        {
+            "Market Date": "Nov 13, 2024",
+            "Median Listing Price": 7340,
+            "Median First COUNTER_BID": 7270,
+            "Average Deal Price": 7360,
+            "Average Step Change for COUNTER_OFFERs": 2.3,
+            "Average Step Change for COUNTER_BIDs": 3.5,
+        },
+        {
+            "Market Date": "Nov 6, 2024",
+            "Median Listing Price": 7370,
+            "Median First COUNTER_BID": 7310,
+            "Average Deal Price": 7390,
+            "Average Step Change for COUNTER_OFFERs": 2.7,
+            "Average Step Change for COUNTER_BIDs": 4.3,
+        },
+        {
+            "Market Date": "Oct 30, 2024",
+            "Median Listing Price": 7300,
+            "Median First COUNTER_BID": 7230,
+            "Average Deal Price": 7350,
+            "Average Step Change for COUNTER_OFFERs": 2.4,
+            "Average Step Change for COUNTER_BIDs": 3.9,
+        },
+    ]
+
+    # Static market values
+    butter_price = 7600
+    price_change_percentage_last_month = 2.0
+    butter_forecast_value = 7498.04
+
+    price_suggester = PriceSuggestion(
+        median_listing_price=7400,
+        median_first_counter_bid=7350,
+        average_deal_price=7420,
+        avg_step_change_counter_offers=2.5,
+        avg_step_change_counter_bids=4,
+        butter_price=7600,
+        butter_forecast_value=7498.04,
+    )
+    suggested_price = price_suggester.suggest_selling_price()
+    print(f"Suggested selling price: {suggested_price}")
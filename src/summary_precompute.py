@@ -0,0 +1,359 @@
+"""Off-peak precomputation of the highlights summaries of recently active users."""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Optional
+
+from helper_files.cache_backends import CacheBackend
+from helper_files.python_helper import get_project_logger
+from textual_data import MarketNewsSummary
+
+logger = get_project_logger(logger_name=__name__)
+
+
+class ActivityTracker:
+    """
+    Remembers which users asked for a summary recently, and with which (number, days_threshold) combinations.
+
+    With a shared cache backend, `sync` merges the activity recorded by every worker into one entry of the backend,
+    so it is kept across restarts and the worker that precomputes sees the users of all workers.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 7 * 24 * 3600,
+        max_users: int = 100_000,
+        backend: Optional[CacheBackend] = None,
+        key: str = "summary_precompute:activity",
+    ):
+        """
+        Initializes the ActivityTracker.
+
+        Args:
+            window_seconds: Users count as active for this long after their last request.
+            max_users: Keep at most this many users, forgetting the least recently active.
+            backend: Cache backend to share the activity through. Kept in this process only if not given.
+            key: Key of the activity in the backend.
+        """
+        self.window_seconds = window_seconds
+        self.max_users = max_users
+        self.backend = backend
+        self.key = key
+        self._lock = threading.Lock()
+        self._last_seen: dict[int, float] = {}
+        self._combinations: dict[int, Counter] = {}
+        # Requests recorded since the last sync: user id -> (last seen, combinations)
+        self._pending: dict[int, tuple[float, Counter]] = {}
+
+    def record(self, user_id: int, number: int, days_threshold: int):
+        """
+        Record a summary request.
+        """
+        now = time.time()
+        with self._lock:
+            # Re-insert so the dict stays ordered from least to most recently active
+            self._last_seen.pop(user_id, None)
+            self._last_seen[user_id] = now
+            self._combinations.setdefault(user_id, Counter())[(number, days_threshold)] += 1
+            if self.backend is not None:
+                _, combinations = self._pending.get(user_id, (now, Counter()))
+                combinations[(number, days_threshold)] += 1
+                self._pending[user_id] = (now, combinations)
+            while len(self._last_seen) > self.max_users:
+                forgotten = next(iter(self._last_seen))
+                del self._last_seen[forgotten]
+                self._combinations.pop(forgotten, None)
+                self._pending.pop(forgotten, None)
+
+    def sync(self) -> bool:
+        """
+        Merge the requests recorded since the last sync into the activity in the backend, and take over the merged
+        activity of all workers.
+
+        Returns:
+            False if there is no backend or another worker is syncing, the pending requests are then kept for the
+            next sync.
+        """
+        if self.backend is None or not self.backend.acquire_refresh_lock(self.key, timeout=60):
+            return False
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            found = self.backend.peek(self.key)
+            # JSON object keys are strings: {user id: [last seen, {"number,days_threshold": count}]}
+            stored = found[0] if found is not None else {}
+            for user_id, (last_seen, combinations) in pending.items():
+                entry = stored.setdefault(str(user_id), [0.0, {}])
+                entry[0] = max(entry[0], last_seen)
+                for (number, days_threshold), count in combinations.items():
+                    combination = f"{number},{days_threshold}"
+                    entry[1][combination] = entry[1].get(combination, 0) + count
+
+            cutoff = time.time() - self.window_seconds
+            active = [(user_id, entry) for user_id, entry in stored.items() if entry[0] >= cutoff]
+            users = sorted(active, key=lambda item: item[1][0])[-self.max_users:]
+            self.backend.set(self.key, dict(users), ttl=self.window_seconds)
+        except Exception:
+            # Put the requests back, so they are merged by the next sync
+            with self._lock:
+                for user_id, (last_seen, combinations) in pending.items():
+                    seen, counts = self._pending.get(user_id, (last_seen, Counter()))
+                    self._pending[user_id] = (max(seen, last_seen), combinations + counts)
+            raise
+        finally:
+            self.backend.release_refresh_lock(self.key)
+
+        last_seen = {int(user_id): entry[0] for user_id, entry in users}
+        combinations = {
+            int(user_id): Counter(
+                {tuple(map(int, combination.split(","))): count for combination, count in entry[1].items()}
+            )
+            for user_id, entry in users
+        }
+        with self._lock:
+            # Requests recorded during the sync are still pending, keep them in view as the most recent ones
+            for user_id, (seen, counts) in self._pending.items():
+                last_seen.pop(user_id, None)
+                last_seen[user_id] = seen
+                combinations.setdefault(user_id, Counter()).update(counts)
+            self._last_seen, self._combinations = last_seen, combinations
+        return True
+
+    def active_users(self, per_user: int = 2) -> list[tuple[int, list[tuple[int, int]]]]:
+        """
+        Return the active users, most recent first, with their `per_user` most requested combinations.
+        """
+        cutoff = time.time() - self.window_seconds
+        with self._lock:
+            return [
+                (user_id, [combination for combination, _ in self._combinations[user_id].most_common(per_user)])
+                for user_id, last_seen in reversed(self._last_seen.items())
+                if last_seen >= cutoff
+            ]
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+
+class RateLimiter:
+    """
+    Token bucket that lets through at most `rate_per_minute` calls per minute, with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Block until a call may go through.
+
+        Returns:
+            False if `stop_event` was set while waiting.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate_per_second
+                self.waited_seconds += wait
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+
+class SummaryPrecomputer:
+    """
+    Precomputes the summaries of recently active users into the result cache during off-peak hours.
+
+    Every `interval` seconds within the off-peak window, a run plans one job per active user and usual combination,
+    skips those with a fresh cached result, and generates the rest on a bounded worker pool. Jobs are rate limited,
+    as each one makes at least one OpenAI completion. Precomputed results stay fresh for `result_ttl` seconds, so the
+    summaries made overnight still count as fresh when users come in.
+
+    Every API worker runs a precomputer. They share the activity through the result cache, and the run of an off-peak
+    window is claimed in it, so only one worker runs it and the rate limit holds for all workers together. The memory
+    backend is not shared between workers: run a single worker with it.
+    """
+
+    def __init__(
+        self,
+        market_news: MarketNewsSummary,
+        tracker: Optional[ActivityTracker] = None,
+        workers: int = 2,
+        requests_per_minute: float = 20,
+        off_peak_hours: tuple[int, int] = (1, 6),
+        interval: float = 15 * 60,
+        combinations_per_user: int = 2,
+        result_ttl: float = 8 * 3600,
+    ):
+        """
+        Initializes the SummaryPrecomputer.
+
+        Args:
+            market_news: Generates the summaries. Must have a result cache.
+            tracker: Source of the active users. Created on the result cache if not given.
+            workers: Maximum number of summaries generated at once.
+            requests_per_minute: Maximum number of summaries started per minute.
+            off_peak_hours: Local hours [start, end) in which runs start. The window may wrap around midnight.
+            interval: Seconds between run checks.
+            combinations_per_user: Number of a user's most requested (number, days_threshold) combinations to
+                precompute.
+            result_ttl: Seconds precomputed summaries stay fresh.
+        """
+        self.market_news = market_news
+        self.tracker = tracker or ActivityTracker(backend=market_news.result_cache)
+        self.workers = workers
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.off_peak_hours = off_peak_hours
+        self.interval = interval
+        self.combinations_per_user = combinations_per_user
+        self.result_ttl = result_ttl
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.running = False
+        self.runs = 0
+        self.last_run_started_at: Optional[float] = None
+        self.last_run_duration = 0.0
+        self.planned = 0
+        self.generated = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def is_off_peak(self, now: Optional[datetime] = None) -> bool:
+        start, end = self.off_peak_hours
+        hour = (now or datetime.now()).hour
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def _claim_run(self, day: date) -> bool:
+        # Expires after a day, the key is per day anyway
+        return self.market_news.result_cache is None or self.market_news.result_cache.acquire_refresh_lock(
+            f"summary_precompute:run:{day.isoformat()}", timeout=24 * 3600
+        )
+
+    def _job(self, user_id: int, number: int, days_threshold: int) -> bool:
+        # Check before waiting for the rate limiter, most users are often still fresh from the previous run
+        if self.market_news.has_fresh_summary(user_id, number, days_threshold):
+            return False
+        if not self.rate_limiter.acquire(self._stop_event):
+            return False
+        return self.market_news.precompute_summary(user_id, number, days_threshold, ttl=self.result_ttl)
+
+    def run_once(self) -> dict:
+        """
+        Precompute the summaries of all active users now, regardless of the time of day.
+
+        Returns:
+            The counts of this run.
+        """
+        jobs = [
+            (user_id, number, days_threshold)
+            for user_id, combinations in self.tracker.active_users(self.combinations_per_user)
+            for number, days_threshold in combinations
+        ]
+        counts = {"planned": len(jobs), "generated": 0, "skipped": 0, "failed": 0}
+        with self._lock:
+            self.running = True
+            self.runs += 1
+            self.last_run_started_at = time.time()
+            self.planned, self.generated, self.skipped, self.failed = len(jobs), 0, 0, 0
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summary-precompute") as executor:
+            futures = {executor.submit(self._job, *job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    outcome = "generated" if future.result() else "skipped"
+                except Exception as e:
+                    outcome = "failed"
+                    logger.warning(f"Precomputing the summary {futures[future]} failed: {e}")
+                counts[outcome] += 1
+                with self._lock:
+                    setattr(self, outcome, getattr(self, outcome) + 1)
+
+        with self._lock:
+            self.running = False
+            self.last_run_duration = time.perf_counter() - start
+        logger.info(f"Summary precomputation run: {counts} in {self.last_run_duration:.1f}s")
+        return counts
+
+    def _run(self):
+        last_run_day = None
+        while not self._stop_event.is_set():
+            try:
+                self.tracker.sync()
+            except Exception as e:
+                logger.warning(f"Syncing the summary activity failed: {e}")
+            now = datetime.now()
+            # One run per off-peak window, by whichever worker claims it first
+            if self.is_off_peak(now) and last_run_day != now.date():
+                try:
+                    if self._claim_run(now.date()):
+                        self.run_once()
+                    else:
+                        logger.info("Summary precomputation run of today is claimed by another worker")
+                    last_run_day = now.date()
+                except Exception as e:
+                    logger.exception(f"Summary precomputation run failed: {e}")
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+        Start the scheduler in a background thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="summary-precompute", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """
+        Stop the scheduler. Jobs that are already generating are finished first, jobs still waiting are skipped.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Keep the requests recorded since the last sync across the restart
+        try:
+            self.tracker.sync()
+        except Exception as e:
+            logger.warning(f"Syncing the summary activity failed: {e}")
+
+    def metrics(self) -> dict:
+        """
+        Return the progress of the current or last run and the result cache hit rate.
+        """
+        with self._lock:
+            done = self.generated + self.skipped + self.failed
+            return {
+                "running": self.running,
+                "off_peak": self.is_off_peak(),
+                "active_users": len(self.tracker),
+                "runs": self.runs,
+                "last_run_started_at": self.last_run_started_at,
+                "last_run_duration_seconds": round(self.last_run_duration, 3),
+                "planned": self.planned,
+                "generated": self.generated,
+                "skipped_fresh": self.skipped,
+                "failed": self.failed,
+                "progress": round(done / self.planned, 4) if self.planned else None,
+                "rate_limit_wait_seconds": round(self.rate_limiter.waited_seconds, 3),
+                "result_cache": self.market_news.result_cache.stats(),
+            }
@@ -1,21 +1,136 @@
+import asyncio
+import contextvars
 import functools
+import inspect
 import os
 import base64
+import hashlib
 import json
-import uvicorn
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+import aiohttp
 import dotenv
-import requests
 import pandas as pd
-from openai import OpenAI
+from article_dedupe import NearDuplicateIndex
+from prompt_builder import HighlightsPromptBuilder, PromptBuild, tokens_are_estimated
+from helper_files.article_summary_cache import ArticleSummaryCache
+from helper_files.async_db_connector import AsyncDBConnector
+from helper_files.cache_backends import CacheBackend
 from helper_files.db_connector import DBConnector
 from helper_files.file_paths import ProjectPaths
-import functools
+from helper_files.json_stream import JsonArrayStreamParser
+from helper_files.python_helper import get_project_logger
+from helper_files.single_flight import single_flight
+from helper_files.tracing import span, traced
 import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = get_project_logger(logger_name=__name__)
+
+MARKET_REPORT_RECOMMEND_URL = "https://news-recommendation.vespertool.com/v1/market_report_recommend"
+NEWS_RECOMMEND_URL = "https://news-recommendation.vespertool.com/v1/news_recommend"
+
+MARKET_REPORT_CONTENT_QUERY = "SELECT id, title, content FROM market_analyses WHERE id IN ({placeholders})"
+NEWS_CONTENT_QUERY = "SELECT id, title, content FROM news WHERE id IN ({placeholders})"
+
+SUMMARY_MODEL_PARAMS = {"model": "gpt-4o-mini", "temperature": 1, "max_tokens": 2000, "top_p": 1}
+# Part of the article summary cache key: bump it when the prompt changes so cached summaries are regenerated.
+SUMMARY_PROMPT_VERSION = 2
+# Generated summaries are served fresh for 15 minutes, then stale for up to an hour while they are regenerated.
+SUMMARY_RESULT_TTL = 15 * 60
+SUMMARY_RESULT_STALE_TTL = 60 * 60
+SUMMARY_RESULT_CACHE_NAME = "highlights_summary"
+# The raw LLM output is only logged at DEBUG, and cut off after this many characters
+MAX_LOGGED_OUTPUT_CHARS = 2000
+
+
+def _result_cache_key(name: str, args: tuple, kwargs: dict) -> str:
+    material = json.dumps([name, list(args), sorted(kwargs.items())], default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
 
-def memoized_method(*lru_args, **lru_kwargs):
+def memoized_method(*lru_args, ttl=None, stale_ttl=None, cache_name=None, **lru_kwargs):
+    """
+    Cache the results of a method per instance, or in the instance's `result_cache` backend when it has one.
+
+    With a backend, results are keyed on `cache_name` (the method's qualified name by default) and the arguments,
+    so every worker sharing the backend can serve them. They are fresh for `ttl` seconds and then served stale for
+    up to `stale_ttl` more seconds while one worker refreshes them in the background.
+    """
     def decorator(func):
+        name = cache_name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            # lru_cache would cache the coroutine object, which can only be awaited once, so cache results instead.
+            maxsize = lru_kwargs.get("maxsize", lru_args[0] if lru_args else 128)
+
+            async def refresh(self, backend, key, args, kwargs):
+                try:
+                    result = await func(self, *args, **kwargs)
+                    await asyncio.to_thread(backend.set, key, result, ttl, stale_ttl)
+                except Exception as e:
+                    logger.warning("Background refresh of %s failed: %s", name, e)
+                finally:
+                    await asyncio.to_thread(backend.release_refresh_lock, key)
+
+            @functools.wraps(func)
+            async def async_wrapped_func(self, *args, **kwargs):
+                backend = getattr(self, "result_cache", None)
+                if backend is not None:
+                    key = _result_cache_key(name, args, kwargs)
+                    found = await asyncio.to_thread(backend.get, key)
+                    if found is not None:
+                        result, fresh = found
+                        if not fresh and await asyncio.to_thread(backend.acquire_refresh_lock, key):
+                            # Keep a reference, the event loop only holds weak references to tasks
+                            tasks = self.__dict__.setdefault("_refresh_tasks", set())
+                            task = asyncio.create_task(refresh(self, backend, key, args, kwargs))
+                            tasks.add(task)
+                            task.add_done_callback(tasks.discard)
+                        return result
+                    result = await func(self, *args, **kwargs)
+                    await asyncio.to_thread(backend.set, key, result, ttl, stale_ttl)
+                    return result
+
+                cache = self.__dict__.setdefault(f"_{func.__name__}_cache", OrderedDict())
+                key = functools._make_key(args, kwargs, typed=False)
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+                result = await func(self, *args, **kwargs)
+                cache[key] = result
+                if maxsize is not None and len(cache) > maxsize:
+                    cache.popitem(last=False)
+                return result
+            return async_wrapped_func
+
+        def refresh_in_thread(self, backend, key, args, kwargs):
+            try:
+                backend.set(key, func(self, *args, **kwargs), ttl, stale_ttl)
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", name, e)
+            finally:
+                backend.release_refresh_lock(key)
+
         @functools.wraps(func)
         def wrapped_func(self, *args, **kwargs):
+            backend = getattr(self, "result_cache", None)
+            if backend is not None:
+                key = _result_cache_key(name, args, kwargs)
+                found = backend.get(key)
+                if found is not None:
+                    result, fresh = found
+                    if not fresh and backend.acquire_refresh_lock(key):
+                        threading.Thread(
+                            target=refresh_in_thread, args=(self, backend, key, args, kwargs), daemon=True
+                        ).start()
+                    return result
+                result = func(self, *args, **kwargs)
+                backend.set(key, result, ttl, stale_ttl)
+                return result
+
             # We're storing the wrapped method inside the instance. If we had
             # a strong reference to self the instance would never die.
             self_weak = weakref.ref(self)
@@ -30,127 +145,516 @@ def memoized_method(*lru_args, **lru_kwargs):
 dotenv.load_dotenv()
 
 class MarketNewsSummary:
-    def __init__(self, db_connection, api_key: str):
+    def __init__(
+        self,
+        db_connection: DBConnector,
+        api_key: str,
+        async_db_connection: Optional[AsyncDBConnector] = None,
+        recommendation_timeout: float = 10.0,
+        summary_cache: Optional[ArticleSummaryCache] = None,
+        prompt_builder: Optional[HighlightsPromptBuilder] = None,
+        dedupe_index: Optional[NearDuplicateIndex] = None,
+        map_reduce_chunk_size: Optional[int] = 8,
+        max_concurrent_llm_calls: int = 4,
+        openai_base_url: Optional[str] = None,
+        result_cache: Optional[CacheBackend] = None,
+    ):
+        """
+        Initializes the MarketNewsSummary.
 
+        Args:
+            db_connection: The DB connection to read articles through.
+            api_key: The OpenAI API key.
+            async_db_connection: Awaitable wrapper of `db_connection`. Created if not given.
+            recommendation_timeout: Seconds before a recommendation call is abandoned.
+            summary_cache: Persistent cache of per-article summaries. Defaults to the SQLite cache in the interim
+                data folder.
+            prompt_builder: Builds the LLM prompt within a token budget. Defaults to a 6000 token budget.
+            dedupe_index: Collapses near-duplicate articles before they are summarized.
+            map_reduce_chunk_size: Summarize more articles than this in chunks of this size, with concurrent LLM
+                calls whose answers are merged in order. None always uses a single call.
+            max_concurrent_llm_calls: Maximum number of chunk summaries in flight at once.
+            openai_base_url: Alternative OpenAI-compatible endpoint, e.g. `tools/stub_openai_server.py`. Defaults
+                to the OPENAI_BASE_URL environment variable or the OpenAI API.
+            result_cache: Backend for the generated summaries, e.g. a SQLite or Redis backend shared by all
+                workers. Without one, summaries are cached in memory per instance without expiry.
+        """
         self.api_key = os.getenv("API_KEY")
-        self.client = OpenAI(api_key=api_key)
+        self.openai_api_key = api_key
+        self.openai_base_url = openai_base_url
         self.username = ""
         self.db = db_connection
+        self.async_db = async_db_connection or AsyncDBConnector(db_connection)
+        self.recommendation_timeout = recommendation_timeout
         self.project_paths = ProjectPaths()
+        self.summary_cache = summary_cache or ArticleSummaryCache()
+        self.prompt_builder = prompt_builder or HighlightsPromptBuilder(model=SUMMARY_MODEL_PARAMS["model"])
+        self.dedupe_index = dedupe_index or NearDuplicateIndex()
+        self.duplicates_removed = 0
+        self.map_reduce_chunk_size = map_reduce_chunk_size
+        self.max_concurrent_llm_calls = max_concurrent_llm_calls
+        self._usage_lock = threading.Lock()
+        self.result_cache = result_cache
+        self.llm_calls = 0
+        self.llm_tokens = 0
+        self.prompt_tokens = 0
+        self.last_prompt_tokens = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
 
-    def _gather_market_report_ids(self):
-        url = "https://news-recommendation.vespertool.com/v1/market_report_recommend"
-        payload = {"user_id": self.user_id, "number": self.number, "days_threshold": self.days_threshold}
-        credentials = f"{self.username}:{self.api_key}"
-        encoded_credentials = base64.b64encode(credentials.encode("utf-8")).decode("utf-8")
-        headers = {"Content-Type": "application/json", "Authorization": f"Basic {encoded_credentials}"}
+    @functools.cached_property
+    def client(self):
+        """
+        The OpenAI client, created on first use so importing and starting the API stays fast.
+        """
+        from openai import OpenAI
 
-        try:
-            response = requests.post(url, data=json.dumps(payload), headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("recommended_articles")
-            else:
-                print(f"Failed to get recommendations. Status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error making request: {e}")
-        return []
-
-    def _gather_market_report_content_from_ids(self, ids):
-        query = f"SELECT title, content FROM market_analyses WHERE id IN ({', '.join(map(str, ids))})"
-        return self.db.query_data(query)
-
-    def _gather_news_ids(self):
-        url = "https://news-recommendation.vespertool.com/v1/news_recommend"
-        payload = {"user_id": self.user_id, "number": self.number, "days_threshold": self.days_threshold}
+        return OpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url)
+
+    @functools.cached_property
+    def async_client(self):
+        """
+        The asyncio OpenAI client, created on first use.
+        """
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the long-lived, keep-alive session for the recommendation service, bound to the running loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=100, limit_per_host=20, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
+
+    async def aclose(self):
+        """
+        Close the recommendation session.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _recommendation_headers(self) -> dict:
         credentials = f"{self.username}:{self.api_key}"
         encoded_credentials = base64.b64encode(credentials.encode("utf-8")).decode("utf-8")
-        headers = {"Content-Type": "application/json", "Authorization": f"Basic {encoded_credentials}"}
+        return {"Content-Type": "application/json", "Authorization": f"Basic {encoded_credentials}"}
 
+    async def _fetch_recommended_ids(self, session, url, user_id, number, days_threshold):
+        payload = {"user_id": user_id, "number": number, "days_threshold": days_threshold}
+        timeout = aiohttp.ClientTimeout(total=self.recommendation_timeout)
+
+        with span("recommender.post", url=url) as request_span:
+            try:
+                async with session.post(
+                    url, data=json.dumps(payload), headers=self._recommendation_headers(), timeout=timeout
+                ) as response:
+                    request_span.set(status_code=response.status)
+                    if response.status == 200:
+                        data = await response.json()
+                        ids = data.get("recommended_articles") or []
+                        request_span.set(ids=len(ids))
+                        return ids
+                    logger.warning("Failed to get recommendations. Status code: %s", response.status)
+            except asyncio.TimeoutError:
+                request_span.set(timed_out=True)
+                logger.warning(
+                    "Recommendation request to %s timed out after %ss", url, self.recommendation_timeout
+                )
+            except aiohttp.ClientError as e:
+                request_span.set(client_error=str(e))
+                logger.warning("Error making request: %s", e)
+            return []
+
+    async def _gather_content_from_ids(self, query_template, ids):
+        if not ids:
+            return pd.DataFrame(columns=["title", "content", "priority"])
+        query = query_template.format(placeholders=", ".join(["%s"] * len(ids)))
+        content = await self.async_db.query_data(query, params=tuple(ids))
+
+        # IN () returns rows in table order, restore the recommendation rank as the prompt priority
+        rank = {article_id: position for position, article_id in enumerate(ids)}
+        content["priority"] = content["id"].map(rank)
+        return content.sort_values("priority").drop(columns="id").reset_index(drop=True)
+
+    @traced("summary.gather_market_reports")
+    async def _gather_market_reports(self, session, user_id, number, days_threshold):
+        ids = await self._fetch_recommended_ids(session, MARKET_REPORT_RECOMMEND_URL, user_id, number, days_threshold)
+        return await self._gather_content_from_ids(MARKET_REPORT_CONTENT_QUERY, ids)
+
+    @traced("summary.gather_news")
+    async def _gather_news(self, session, user_id, number, days_threshold):
+        ids = await self._fetch_recommended_ids(session, NEWS_RECOMMEND_URL, user_id, number, days_threshold)
+        return await self._gather_content_from_ids(NEWS_CONTENT_QUERY, ids)
+
+    @traced("summary.gather_articles")
+    async def _gather_articles(self, user_id, number, days_threshold, session=None):
+        """
+        Fetch the market report and news branches concurrently. Each branch queries its article content as soon
+        as its recommended IDs arrive, so the total latency is that of the slowest branch.
+        """
+        session = session or self._get_session()
+        return await asyncio.gather(
+            self._gather_market_reports(session, user_id, number, days_threshold),
+            self._gather_news(session, user_id, number, days_threshold),
+        )
+
+    async def _gather_articles_with_new_session(self, user_id, number, days_threshold):
+        async with aiohttp.ClientSession() as session:
+            return await self._gather_articles(user_id, number, days_threshold, session=session)
+
+    def _summarize_articles(self, articles: list[dict]) -> list:
+        """
+        Summarizes articles with the LLM. Returns one summary dictionary per article, or None for articles the
+        model left out. Articles that do not fit in the prompt's token budget are summarized in follow-up calls.
+        """
+        prompt = self.prompt_builder.build(articles)
+        with self._usage_lock:
+            self.last_prompt_tokens = prompt.prompt_tokens
+            self.prompt_tokens += prompt.prompt_tokens
+        logger.debug(
+            "Prompt: %s tokens%s for %s articles (%s truncated, %s dropped over budget)",
+            prompt.prompt_tokens,
+            " (estimated)" if prompt.tokens_estimated else "",
+            len(prompt.article_ids),
+            len(prompt.truncated_ids),
+            len(prompt.dropped_ids),
+        )
+        if not prompt.article_ids:
+            logger.warning("None of %s articles fit in the prompt's token budget", len(articles))
+            return [None] * len(articles)
+
+        summaries = self._summarize_prompt(prompt, len(articles))
+        if prompt.dropped_ids:
+            # Summarize what did not fit in a follow-up batch, rather than leaving it out of the summary
+            follow_up = self._summarize([articles[position] for position in prompt.dropped_ids])
+            for position, summary in zip(prompt.dropped_ids, follow_up):
+                summaries[position] = summary
+        return summaries
+
+    def _summarize_prompt(self, prompt: PromptBuild, number_of_articles: int) -> list:
+        """
+        Send a built prompt to the LLM and match its summaries back to the articles.
+        """
+        # Call OpenAI's API to generate the summary in the correct format
+        with span(
+            "llm.completion",
+            model=SUMMARY_MODEL_PARAMS["model"],
+            articles=len(prompt.article_ids),
+            prompt_tokens=prompt.prompt_tokens,
+            prompt_tokens_estimated=prompt.tokens_estimated,
+        ) as completion_span:
+            response = self.client.chat.completions.create(messages=prompt.messages, **SUMMARY_MODEL_PARAMS)
+            completion_span.set(
+                finish_reason=response.choices[0].finish_reason,
+                total_tokens=response.usage.total_tokens if response.usage is not None else None,
+            )
+        with self._usage_lock:
+            self.llm_calls += 1
+            if response.usage is not None:
+                self.llm_tokens += response.usage.total_tokens
+
+        content = response.choices[0].message.content.strip()
+        logger.debug("LLM output (%s chars): %.*s", len(content), MAX_LOGGED_OUTPUT_CHARS, content)
+        if response.choices[0].finish_reason == "length":
+            logger.warning(
+                "Summary of %s articles was cut off at %s tokens",
+                len(prompt.article_ids),
+                SUMMARY_MODEL_PARAMS["max_tokens"],
+            )
+
+        # Parse the response as JSON and match the summaries back to the articles
         try:
-            response = requests.post(url, data=json.dumps(payload), headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("recommended_articles")
-            else:
-                print(f"Failed to get recommendations. Status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error making request: {e}")
-        return []
-
-    def _gather_news_content_from_ids(self, ids):
-        query = f"SELECT title, content FROM news WHERE id IN ({', '.join(map(str, ids))})"
-        return self.db.query_data(query)
+            summary_json = json.loads(content)
+        except json.JSONDecodeError as e:
+            logger.error("Error parsing JSON response: %s", e)
+            return [None] * number_of_articles
+        return self._match_summaries(summary_json, number_of_articles)
 
+    def _summarize_articles_map_reduce(self, articles: list[dict]) -> list:
+        """
+        Summarizes articles in chunks of `map_reduce_chunk_size` with concurrent LLM calls, so every answer stays
+        well within the completion token limit and the latency is that of the slowest chunk. The partial answers
+        are merged back in article order.
+        """
+        # Chunk in priority order, so the best ranked articles are summarized together in the first chunks
+        order = sorted(range(len(articles)), key=lambda position: (articles[position].get("priority", 0), position))
+        chunks = [
+            order[start : start + self.map_reduce_chunk_size]
+            for start in range(0, len(order), self.map_reduce_chunk_size)
+        ]
+
+        with span("llm.map_reduce", chunks=len(chunks)):
+            # Each chunk runs in a copy of this context, so its spans nest under the map-reduce span
+            contexts = [contextvars.copy_context() for _ in chunks]
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrent_llm_calls, len(chunks))) as executor:
+                chunk_summaries = list(
+                    executor.map(
+                        lambda context, chunk: context.run(
+                            self._summarize_articles, [articles[position] for position in chunk]
+                        ),
+                        contexts,
+                        chunks,
+                    )
+                )
+
+        merged = [None] * len(articles)
+        for chunk, summaries in zip(chunks, chunk_summaries):
+            for position, summary in zip(chunk, summaries):
+                merged[position] = summary
+        return merged
+
+    def _summarize(self, articles: list[dict]) -> list:
+        if self.map_reduce_chunk_size is not None and len(articles) > self.map_reduce_chunk_size:
+            return self._summarize_articles_map_reduce(articles)
+        return self._summarize_articles(articles)
+
+    @staticmethod
+    def _match_summaries(summary_json, number_of_articles: int) -> list:
+        matched = [None] * number_of_articles
+        if not isinstance(summary_json, list):
+            return matched
+
+        for position, item in enumerate(summary_json):
+            if not isinstance(item, dict):
+                continue
+            article_id = item.pop("article_id", None)
+            try:
+                article_id = int(article_id)
+            except (TypeError, ValueError):
+                # Without an ID only a complete, in-order answer can be matched by position
+                article_id = position if len(summary_json) == number_of_articles else None
+            if article_id is not None and 0 <= article_id < number_of_articles and matched[article_id] is None:
+                matched[article_id] = item
+        return matched
+
+    @traced("summary.prepare_articles")
+    def _prepare_articles(self, market_reports_df: pd.DataFrame, news_articles_df: pd.DataFrame) -> tuple:
+        """
+        Combine and dedupe the candidate articles and look up their cached summaries.
+
+        Returns:
+            The articles by summary cache key, the cached summaries by key and the number of near-duplicates removed.
+        """
+        combined_df = pd.concat([market_reports_df, news_articles_df], ignore_index=True)
+        if "priority" not in combined_df:
+            combined_df["priority"] = 0
+        articles = combined_df[["title", "content", "priority"]].to_dict(orient="records")
+
+        # Reports and news often cover the same event; only the best ranked copy is summarized
+        articles, removed = self.dedupe_index.dedupe(articles)
+        self.duplicates_removed += removed
+
+        cache_params = {**SUMMARY_MODEL_PARAMS, "prompt_version": SUMMARY_PROMPT_VERSION}
+        article_by_key = {
+            self.summary_cache.make_key(article["title"], article["content"], cache_params): article
+            for article in articles
+        }
+        return article_by_key, self.summary_cache.get_many(list(article_by_key)), removed
+
+    @traced("summary.generate_highlights")
     def _generate_highlights_summary(self, market_reports_df: pd.DataFrame, news_articles_df: pd.DataFrame) -> list:
         """
         Generates a summary in JSON format where each item is a dictionary containing title, content, 
         and a possible market effect indicator (emoji).
+
+        Summaries are cached per article, so only articles that were never summarized before are sent to the LLM.
         """
-        combined_df = pd.concat([market_reports_df, news_articles_df], ignore_index=True)
+        article_by_key, summaries, removed = self._prepare_articles(market_reports_df, news_articles_df)
 
-        # Prepare the content to be passed to ChatGPT
-        combined_text = "\n\n".join([f"Title: {row['title']}\nContent: {row['content']}" for _, row in combined_df.iterrows()])
-        
-        prompt = f"""
-        You are an assistant that summarizes market and news reports related to the dairy market. 
-        Summarize the following articles into a JSON list. Each item in the JSON should contain the following fields:
-        
-        - "title": The title of the article.
-        - "content": The content of the article.
-        - "market_effect": An emoji that represents the potential market effect (upward 📈, downward 📉, or neutral 🟢). 
-        If the content suggests an increase in prices, use 📈; if it suggests a decrease, use 📉; otherwise, use 🟢.
-
-        Do not return HTML or bullet points. The output should be a JSON array where each object represents an article in the format:
-        
-        [
-            {{
-                "title": "Title of the article",
-                "content": "Content of the article",
-                "market_effect": "📈"
-            }},
-            ...
-        ]
-        
-        Here is the content of the articles:
-        {combined_text}
+        missing_keys = [key for key in article_by_key if key not in summaries]
+        if missing_keys:
+            new_summaries = self._summarize([article_by_key[key] for key in missing_keys])
+            new_summaries = {key: summary for key, summary in zip(missing_keys, new_summaries) if summary is not None}
+            self.summary_cache.set_many(new_summaries)
+            summaries.update(new_summaries)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Summary cache: %s/%s articles cached (%s near-duplicates removed), overall hit rate %.0f%%, "
+                "%s LLM calls so far",
+                len(article_by_key) - len(missing_keys),
+                len(article_by_key),
+                removed,
+                self.summary_cache.stats()["hit_rate"] * 100,
+                self.llm_calls,
+            )
+        return [summaries[key] for key in article_by_key if key in summaries]
+
+    async def _astream_summarize_articles(self, articles: list[dict]) -> AsyncIterator[tuple[int, dict]]:
+        """
+        Streaming version of `_summarize_articles`. Yields (position in `articles`, summary) pairs as soon as the
+        model has completed each object of its JSON array. Articles that do not fit in the prompt's token budget
+        are streamed from follow-up calls afterwards.
         """
+        prompt = self.prompt_builder.build(articles)
+        with self._usage_lock:
+            self.last_prompt_tokens = prompt.prompt_tokens
+            self.prompt_tokens += prompt.prompt_tokens
+        if not prompt.article_ids:
+            logger.warning("None of %s articles fit in the prompt's token budget", len(articles))
+            return
 
-        # Call OpenAI's API to generate the summary in the correct format
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": prompt}, {"role": "user", "content": combined_text}],
-            temperature=1,
-            max_tokens=2000,
-            top_p=1
+        # Only the time to the first chunk: a span must not stay open across the yields below
+        with span("llm.stream_open", model=SUMMARY_MODEL_PARAMS["model"], articles=len(prompt.article_ids)):
+            stream = await self.async_client.chat.completions.create(
+                messages=prompt.messages, stream=True, stream_options={"include_usage": True}, **SUMMARY_MODEL_PARAMS
+            )
+        with self._usage_lock:
+            self.llm_calls += 1
+        parser = JsonArrayStreamParser()
+        seen = set()
+        async for chunk in stream:
+            if chunk.usage is not None:
+                with self._usage_lock:
+                    self.llm_tokens += chunk.usage.total_tokens
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for item in parser.feed(chunk.choices[0].delta.content):
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    article_id = int(item.pop("article_id", None))
+                except (TypeError, ValueError):
+                    continue
+                if 0 <= article_id < len(articles) and article_id not in seen:
+                    seen.add(article_id)
+                    yield article_id, item
+
+        if parser.errors or not parser.done:
+            logger.warning(
+                "Streamed summary was incomplete: %s unparsable objects, array closed: %s", parser.errors, parser.done
+            )
+
+        if prompt.dropped_ids:
+            async for position, item in self._astream_summarize_articles(
+                [articles[position] for position in prompt.dropped_ids]
+            ):
+                yield prompt.dropped_ids[position], item
+
+    async def astream_summary(self, user_id, number, days_threshold) -> AsyncIterator[dict]:
+        """
+        Generate the highlights summary item by item. Cached summaries are yielded first, then the remaining
+        articles as the model writes them. New summaries are stored in the article summary cache at the end.
+        """
+        market_reports_df, news_articles_df = await self._gather_articles(user_id, number, days_threshold)
+        article_by_key, summaries, _ = await asyncio.to_thread(
+            self._prepare_articles, market_reports_df, news_articles_df
         )
-        
-        print(response.choices[0].message.content.strip())
-        
-        # Parse the response as JSON and return
+
+        for key in article_by_key:
+            if key in summaries:
+                yield summaries[key]
+
+        missing_keys = [key for key in article_by_key if key not in summaries]
+        if not missing_keys:
+            return
+
+        new_summaries = {}
         try:
-            summary_json = json.loads(response.choices[0].message.content.strip())
-            return summary_json
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
-            return []
+            async for position, summary in self._astream_summarize_articles(
+                [article_by_key[key] for key in missing_keys]
+            ):
+                new_summaries[missing_keys[position]] = summary
+                yield summary
+        finally:
+            # Also keep what was completed when the client disconnects halfway
+            await asyncio.to_thread(self.summary_cache.set_many, new_summaries)
+
+    def summary_cache_stats(self) -> dict:
+        """
+        Return the article summary cache hit rate, the near-duplicates removed and the LLM calls and tokens (total
+        and prompt) spent by this instance. Prompt tokens are counted locally, and are estimates without tiktoken.
+        """
+        return {
+            **self.summary_cache.stats(),
+            "duplicates_removed": self.duplicates_removed,
+            "result_cache": self.result_cache.stats() if self.result_cache is not None else None,
+            "llm_calls": self.llm_calls,
+            "llm_tokens": self.llm_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "prompt_tokens_estimated": tokens_are_estimated(self.prompt_builder.model),
+        }
+
+    @staticmethod
+    def summary_result_key(user_id: int, number: int, days_threshold: int) -> str:
+        """
+        Return the result cache key of a summary. Same arguments as the endpoint passes them, so the key matches
+        the memoized methods'.
+        """
+        return _result_cache_key(SUMMARY_RESULT_CACHE_NAME, (user_id, number, days_threshold), {})
+
+    def has_fresh_summary(self, user_id: int, number: int, days_threshold: int) -> bool:
+        """
+        Whether the result cache holds a fresh summary, without counting the lookup as a hit or miss.
+        """
+        found = self.result_cache.peek(self.summary_result_key(user_id, number, days_threshold))
+        return found is not None and found[1]
+
+    def precompute_summary(
+        self, user_id: int, number: int, days_threshold: int, ttl: Optional[float] = None, force: bool = False
+    ) -> bool:
+        """
+        Generate a summary into the result cache ahead of the request, so `generate_summary` and
+        `agenerate_summary` are served from the cache.
+
+        Args:
+            ttl: Seconds the result stays fresh. Defaults to the TTL of the memoized summary.
+            force: Regenerate even if a fresh result is cached.
+
+        Returns:
+            Whether a summary was generated. False if a fresh one was cached or another worker is generating it.
+        """
+        if self.result_cache is None:
+            raise ValueError("Precomputing summaries requires a result cache.")
+
+        if not force and self.has_fresh_summary(user_id, number, days_threshold):
+            return False
+        key = self.summary_result_key(user_id, number, days_threshold)
+        if not self.result_cache.acquire_refresh_lock(key):
+            return False
+        try:
+            market_reports_df, news_articles_df = asyncio.run(
+                self._gather_articles_with_new_session(user_id, number, days_threshold)
+            )
+            summary = self._generate_highlights_summary(market_reports_df, news_articles_df)
+            self.result_cache.set(key, summary, ttl or SUMMARY_RESULT_TTL, SUMMARY_RESULT_STALE_TTL)
+        finally:
+            self.result_cache.release_refresh_lock(key)
+        return True
+
+    @memoized_method(ttl=SUMMARY_RESULT_TTL, stale_ttl=SUMMARY_RESULT_STALE_TTL, cache_name=SUMMARY_RESULT_CACHE_NAME)
+    @single_flight()
+    async def agenerate_summary(self, user_id, number, days_threshold):
+        """
+        Generate the highlights summary without blocking the event loop.
+        """
+        market_reports_df, news_articles_df = await self._gather_articles(user_id, number, days_threshold)
 
-    @memoized_method()
+        # The OpenAI client is blocking, so the completion runs in a worker thread
+        return await asyncio.to_thread(self._generate_highlights_summary, market_reports_df, news_articles_df)
+
+    @memoized_method(ttl=SUMMARY_RESULT_TTL, stale_ttl=SUMMARY_RESULT_STALE_TTL, cache_name=SUMMARY_RESULT_CACHE_NAME)
+    @single_flight()
     def generate_summary(self, user_id, number, days_threshold):
-        
-        self.user_id = user_id
-        self.number = number
-        self.days_threshold = days_threshold
-        
+        """
+        Blocking version of `agenerate_summary` for scripts. Must not be called from a running event loop.
+        """
         # Gather market reports and news
-        market_report_ids = self._gather_market_report_ids()
-        market_reports_df = self._gather_market_report_content_from_ids(market_report_ids)
-        news_ids = self._gather_news_ids()
-        news_articles_df = self._gather_news_content_from_ids(news_ids)
+        market_reports_df, news_articles_df = asyncio.run(
+            self._gather_articles_with_new_session(user_id, number, days_threshold)
+        )
 
         # Generate and return the JSON summary
         return self._generate_highlights_summary(market_reports_df, news_articles_df)
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,132 @@
+"""
+Benchmark near-duplicate removal ahead of the highlights summary.
+
+Reports how many articles and prompt tokens are removed, and how long deduplication takes with signatures computed
+on the fly (cold) and taken from a warm index (warm). Run against the most recent articles of both tables:
+
+    python tools/bench_article_dedupe.py --connection-name env --articles-per-table 300
+
+or, without a database, against synthetic articles of which a share are reworded copies:
+
+    python tools/bench_article_dedupe.py --synthetic 600 --duplicate-share 0.3
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from article_dedupe import RECENT_ARTICLES_QUERY, ARTICLE_TABLES, NearDuplicateIndex
+from prompt_builder import count_tokens, HighlightsPromptBuilder, tokens_are_estimated
+
+
+def load_articles(connection_name: str, articles_per_table: int) -> list[dict]:
+    """
+    Read the most recent articles of market_analyses and news.
+    """
+    from helper_files.db_connector import DBConnector
+
+    db = DBConnector(connection_name=connection_name)
+    try:
+        frames = [
+            db.query_data(RECENT_ARTICLES_QUERY.format(table=table), params=(articles_per_table,))
+            for table in ARTICLE_TABLES
+        ]
+    finally:
+        db.close_connection()
+    articles = pd.concat(frames, ignore_index=True)[["title", "content"]]
+    articles["priority"] = np.arange(len(articles))
+    return articles.to_dict(orient="records")
+
+
+def synthetic_articles(n_articles: int, duplicate_share: float, seed: int = 42) -> list[dict]:
+    """
+    Generate articles of which `duplicate_share` are copies of another article with a few words changed.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    n_originals = max(1, int(n_articles * (1 - duplicate_share)))
+
+    articles = []
+    for i in range(n_originals):
+        words = list(rng.choice(vocabulary, rng.integers(150, 400)))
+        articles.append({"title": f"Dairy market update {i}", "content": " ".join(words)})
+    for i in range(n_articles - n_originals):
+        original = articles[rng.integers(0, n_originals)]
+        words = original["content"].split()
+        for position in rng.integers(0, len(words), max(1, len(words) // 50)):
+            words[position] = rng.choice(vocabulary)
+        articles.append({"title": original["title"], "content": " ".join(words)})
+
+    order = rng.permutation(len(articles))
+    return [{**articles[position], "priority": rank} for rank, position in enumerate(order)]
+
+
+def prompt_tokens(articles: list[dict], builder: HighlightsPromptBuilder) -> int:
+    """
+    Count the tokens the articles take up in the user message, after lead-paragraph truncation.
+    """
+    return sum(
+        count_tokens(builder.format_article(article_id, article)[0] + "\n\n", builder.model)
+        for article_id, article in enumerate(articles)
+    )
+
+
+def time_dedupe(index: NearDuplicateIndex, articles: list[dict], repeat: int) -> tuple[list[float], list[dict]]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        representatives, _ = index.dedupe(articles)
+        timings.append(time.perf_counter() - start)
+    return timings, representatives
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connection-name", default="env")
+    parser.add_argument("--articles-per-table", type=int, default=300)
+    parser.add_argument("--synthetic", type=int, default=0, help="Use this many synthetic articles instead of the DB.")
+    parser.add_argument("--duplicate-share", type=float, default=0.3)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        articles = synthetic_articles(args.synthetic, args.duplicate_share)
+    else:
+        articles = load_articles(args.connection_name, args.articles_per_table)
+
+    builder = HighlightsPromptBuilder()
+    cold_timings, representatives = time_dedupe(NearDuplicateIndex(threshold=args.threshold), articles, args.repeat)
+
+    warm_index = NearDuplicateIndex(threshold=args.threshold)
+    start = time.perf_counter()
+    for article in articles:
+        warm_index.add(article)
+    indexing_seconds = time.perf_counter() - start
+    warm_timings, _ = time_dedupe(warm_index, articles, args.repeat)
+
+    tokens_before = prompt_tokens(articles, builder)
+    tokens_after = prompt_tokens(representatives, builder)
+    print(f"articles: {len(articles)} -> {len(representatives)} ({len(articles) - len(representatives)} removed)")
+    estimated = " (estimated, tiktoken is not installed)" if tokens_are_estimated(builder.model) else ""
+    print(
+        f"prompt tokens{estimated}: {tokens_before} -> {tokens_after} "
+        f"({tokens_before - tokens_after} saved, {1 - tokens_after / max(tokens_before, 1):.1%})"
+    )
+    print(f"dedupe cold (median of {args.repeat}): {statistics.median(cold_timings) * 1000:.1f} ms")
+    print(f"dedupe warm (median of {args.repeat}): {statistics.median(warm_timings) * 1000:.1f} ms")
+    print(f"indexing: {indexing_seconds * 1000:.1f} ms ({indexing_seconds / len(articles) * 1e6:.0f} us/article)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark the logging cost per market changes request: the former print calls against level-gated logging through
+a blocking handler and through the project's queue handler.
+
+Runs MarketChangesProcessor.get_full_market_changes_info_pandas against an in-memory stand-in for the database, so
+only the processing and the logging are measured. Output goes to a line-buffered pipe drained by a reader thread,
+like a container log driver:
+
+    python tools/bench_logging.py --rows 500 --requests 300
+
+Modes:
+    print        The former behaviour: every message printed, DataFrames rendered in full.
+    sync-debug   Logging at DEBUG through a blocking StreamHandler, DataFrames capped.
+    queue-debug  Logging at DEBUG through the queue handler and a background writer.
+    queue-info   Logging at INFO through the queue handler: the DEBUG records are never formatted.
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+import market_changes_data
+from helper_files.python_helper import DataFramePreview
+from market_changes_data import MarketChangesProcessor
+
+MODES = ("print", "sync-debug", "queue-debug", "queue-info")
+
+
+class InMemoryDB:
+    """
+    Answers the three queries of the pandas pipeline with generated data.
+    """
+
+    def __init__(self, rows: int, products: int = 40):
+        rng = np.random.default_rng(0)
+        price_ids = np.arange(rows)
+        self.user_data_series = pd.DataFrame({"user_id": [1] * 20, "data_series_id": range(20)})
+        self.price_details = pd.DataFrame(
+            {
+                "price_id": price_ids,
+                "change_percentage": rng.normal(0, 2, rows).round(2),
+                "created_at": pd.Timestamp("2024-11-01") + pd.to_timedelta(rng.integers(0, 27 * 24, rows), unit="h"),
+            }
+        )
+        self.vesper = pd.DataFrame(
+            {
+                "price_id": price_ids,
+                "product_name": [f"Product {index % products}" for index in range(rows)],
+                "data_source_id": 52,
+                "date": pd.Timestamp("2024-11-01") + pd.to_timedelta(rng.integers(0, 27, rows), unit="D"),
+                "price": rng.uniform(3000, 8000, rows).round(2),
+                "currency": "EUR",
+            }
+        )
+
+    def query_data(self, query, params=None, cache_ttl=None):
+        if "user_top_data_series" in query:
+            return self.user_data_series
+        if "FROM price_changes" in query:
+            return self.price_details
+        return self.vesper
+
+
+class PrintLogger:
+    """
+    Reproduces the former print calls: every message is printed, with DataFrames rendered in full.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _print(self, message, *args):
+        args = tuple(arg.df if isinstance(arg, DataFramePreview) else arg for arg in args)
+        print(message % args if args else message, file=self.stream)
+
+    debug = info = warning = error = _print
+
+
+def open_pipe_sink():
+    """
+    Return a line-buffered text stream into a pipe that a background thread drains.
+    """
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        with os.fdopen(read_fd, "rb") as reader:
+            while reader.read1(65536):
+                pass
+
+    threading.Thread(target=drain, daemon=True).start()
+    return os.fdopen(write_fd, "w", buffering=1)
+
+
+def configure(mode: str, sink):
+    """
+    Point the market changes logger at `sink` as `mode` prescribes. Returns a function that undoes it.
+    """
+    original_logger = market_changes_data.logger
+    if mode == "print":
+        market_changes_data.logger = PrintLogger(sink)
+        return lambda: setattr(market_changes_data, "logger", original_logger)
+
+    logger = logging.getLogger(f"bench_logging.{mode}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO if mode == "queue-info" else logging.DEBUG)
+    stream_handler = logging.StreamHandler(sink)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s -- %(message)s"))
+    listener = None
+    if mode == "sync-debug":
+        logger.addHandler(stream_handler)
+    else:
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        listener.start()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    market_changes_data.logger = logger
+
+    def restore():
+        if listener is not None:
+            listener.stop()
+        logger.handlers.clear()
+        market_changes_data.logger = original_logger
+
+    return restore
+
+
+def run(mode: str, processor: MarketChangesProcessor, requests: int, warmup: int) -> list[float]:
+    sink = open_pipe_sink()
+    restore = configure(mode, sink)
+    try:
+        for _ in range(warmup):
+            processor.get_full_market_changes_info_pandas(1)
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            processor.get_full_market_changes_info_pandas(1)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        restore()
+        sink.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500, help="Price changes per user.")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    processor = MarketChangesProcessor(InMemoryDB(args.rows), use_pushdown=False)
+    results = {mode: run(mode, processor, args.requests, args.warmup) for mode in args.modes}
+
+    baseline = statistics.mean(results["print"]) if "print" in results else None
+    print(f"{args.requests} requests, {args.rows} price changes per user\n")
+    print(f"{'mode':<12} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'saved ms':>9}")
+    for mode, latencies in results.items():
+        mean = statistics.mean(latencies)
+        p99 = sorted(latencies)[int(len(latencies) * 0.99) - 1]
+        saved = f"{(baseline - mean) * 1000:9.2f}" if baseline is not None else f"{'':>9}"
+        print(f"{mode:<12} {mean * 1000:9.2f} {statistics.median(latencies) * 1000:9.2f} {p99 * 1000:9.2f} {saved}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark the pushed-down market changes query against the three-query pandas pipeline.
+
+Run against a scratch database, e.g.:
+
+    python tools/bench_market_changes.py --connection-name env --seed-series 10000 --allow-writes
+
+`--seed-series` creates minimal versions of the four tables (if missing) and loads synthetic data for a
+synthetic user, so never point it at production.
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.db_connector import DBConnector
+from market_changes_data import MarketChangesProcessor
+
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS user_top_data_series (
+        user_id INT NOT NULL, data_series_id INT NOT NULL, KEY (user_id))""",
+    """CREATE TABLE IF NOT EXISTS price_changes (
+        price_id INT NOT NULL, data_series_id INT NOT NULL, change_percentage DOUBLE, created_at DATETIME,
+        KEY (data_series_id, created_at))""",
+    """CREATE TABLE IF NOT EXISTS vesper_quotations (
+        id INT PRIMARY KEY, product_id INT, data_source_id INT, data_series_id INT, date DATE, price DOUBLE,
+        currency VARCHAR(8))""",
+    """CREATE TABLE IF NOT EXISTS products (id INT PRIMARY KEY, name VARCHAR(255))""",
+]
+
+
+def seed(db: DBConnector, user_id: int, n_series: int, changes_per_series: int, n_products: int, id_offset: int):
+    """
+    Load synthetic series, price changes, quotations and products for `user_id`.
+    """
+    for statement in SCHEMA_STATEMENTS:
+        db.execute_query(statement)
+
+    rng = np.random.default_rng(42)
+    series_ids = np.arange(id_offset, id_offset + n_series)
+    n_changes = n_series * changes_per_series
+    price_ids = np.arange(id_offset, id_offset + n_changes)
+    product_ids = id_offset + rng.integers(0, n_products, n_changes)
+    dates = pd.Timestamp("2024-11-01") + pd.to_timedelta(rng.integers(0, 27 * 24 * 3600, n_changes), unit="s")
+
+    db.insert_dataframe_in_batch(
+        pd.DataFrame({"user_id": user_id, "data_series_id": series_ids}), "user_top_data_series", batch_size=5000
+    )
+    db.insert_dataframe_in_batch(
+        pd.DataFrame({"id": id_offset + np.arange(n_products), "name": [f"product-{i}" for i in range(n_products)]}),
+        "products",
+        upsert=True,
+    )
+    db.insert_dataframe_in_batch(
+        pd.DataFrame(
+            {
+                "id": price_ids,
+                "product_id": product_ids,
+                "data_source_id": 1,
+                "data_series_id": np.repeat(series_ids, changes_per_series),
+                "date": dates.date,
+                "price": rng.uniform(1000, 9000, n_changes).round(2),
+                "currency": "EUR",
+            }
+        ),
+        "vesper_quotations",
+        batch_size=5000,
+        upsert=True,
+    )
+    db.insert_dataframe_in_batch(
+        pd.DataFrame(
+            {
+                "price_id": price_ids,
+                "data_series_id": np.repeat(series_ids, changes_per_series),
+                "change_percentage": rng.normal(0, 2, n_changes).round(3),
+                "created_at": dates,
+            }
+        ),
+        "price_changes",
+        batch_size=5000,
+    )
+
+
+def time_call(func, user_id: int, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(user_id)
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def summarize(name: str, timings: list[float]) -> str:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return (
+        f"{name:<10} min {ordered[0] * 1000:8.1f} ms | median {statistics.median(ordered) * 1000:8.1f} ms "
+        f"| p95 {p95 * 1000:8.1f} ms"
+    )
+
+
+def normalize(result: list[dict]) -> list[tuple]:
+    return sorted((str(row["product_id"]), float(row["price"]), float(row["change_percentage"])) for row in result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connection-name", default="env")
+    parser.add_argument("--user-id", type=int, default=999999)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed-series", type=int, default=0, help="Seed this many synthetic series first.")
+    parser.add_argument("--changes-per-series", type=int, default=3)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--id-offset", type=int, default=900_000_000)
+    parser.add_argument("--allow-writes", action="store_true", help="Required for --seed-series.")
+    args = parser.parse_args()
+
+    db = DBConnector(connection_name=args.connection_name)
+    if args.seed_series:
+        if not args.allow_writes:
+            parser.error("--seed-series writes to the database, pass --allow-writes to confirm.")
+        seed(db, args.user_id, args.seed_series, args.changes_per_series, args.products, args.id_offset)
+
+    processor = MarketChangesProcessor(db)
+    pushdown_timings, pushdown_result = time_call(processor.get_latest_market_changes_pushdown, args.user_id, args.repeat)
+    pandas_timings, pandas_result = time_call(processor.get_full_market_changes_info_pandas, args.user_id, args.repeat)
+
+    print(f"user {args.user_id}: {len(pushdown_result)} products, {args.repeat} runs each")
+    print(summarize("pushdown", pushdown_timings))
+    print(summarize("pandas", pandas_timings))
+    print(f"speed-up (median): {statistics.median(pandas_timings) / statistics.median(pushdown_timings):.1f}x")
+    print(f"results identical: {normalize(pushdown_result) == normalize(pandas_result)}")
+
+    db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark the import time of the API (or any module in src) and report where it goes, per module.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and reports the fastest wall time and the
+modules with the highest cumulative and self import times of that run:
+
+    python tools/bench_startup.py --module api_endpoints --repeat 5 --top 20
+
+Missing database settings are filled with placeholders, which is enough for an import as long as nothing
+connects at import time.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+PLACEHOLDER_ENV = {
+    "MYSQL_HOST": "localhost",
+    "MYSQL_USER": "startup-bench",
+    "MYSQL_DB": "startup-bench",
+    "MYSQL_PORT": "3306",
+    "MYSQL_PASSWORD": "startup-bench",
+    "SSH_TUNNEL": "true",
+    "SSH_TUNNEL_HOST": "localhost",
+    "SSH_TUNNEL_USER": "startup-bench",
+    "SSH_TUNNEL_PORT": "22",
+    "OPENAI_API_KEY": "startup-bench",
+}
+
+
+def run_import(module: str) -> tuple[float, list[tuple[int, int, int, str]]]:
+    """
+    Import `module` in a fresh interpreter.
+
+    Returns:
+        The wall time in seconds and (self us, cumulative us, depth, module) per imported module.
+    """
+    env = {**PLACEHOLDER_ENV, **os.environ, "LAZY_STARTUP": "1"}
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_time = time.perf_counter() - start
+    if completed.returncode != 0:
+        output = "\n".join(line for line in completed.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"Importing {module} failed:\n{output[-2000:]}")
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return wall_time, modules
+
+
+def print_table(title: str, rows: list[tuple[int, int, int, str]], top: int):
+    print(f"\n{title}")
+    print(f"{'self ms':>9} {'cumul. ms':>10}  module")
+    for self_us, cumulative_us, depth, name in rows[:top]:
+        print(f"{self_us / 1000:9.1f} {cumulative_us / 1000:10.1f}  {'  ' * min(depth, 4)}{name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api_endpoints")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [run_import(args.module) for _ in range(args.repeat)]
+    wall_time, modules = min(runs, key=lambda run: run[0])
+    total_us = max((cumulative_us for _, cumulative_us, _, name in modules if name == args.module), default=0)
+
+    print(
+        f"import {args.module}: {wall_time * 1000:.0f} ms wall (best of {args.repeat}), "
+        f"{total_us / 1000:.0f} ms importing"
+    )
+    top_level = sorted((row for row in modules if row[2] <= 1), key=lambda row: row[1], reverse=True)
+    print_table("Top-level imports by cumulative time", top_level, args.top)
+    print_table("Modules by self time", sorted(modules, key=lambda row: row[0], reverse=True), args.top)
+
+
+if __name__ == "__main__":
+    main()
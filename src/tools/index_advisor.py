@@ -0,0 +1,653 @@
+"""
+Check whether indexes back the queries the processors issue, and suggest composite indexes where they do not.
+
+Collects the `*_QUERY` templates of vpi_data.py, market_changes_data.py and textual_data.py, runs EXPLAIN on each
+through DBConnector with sample parameters, and flags full table scans, full index scans, filesorts and temporary
+tables. For the tables a flagged query reads, it suggests a composite index: the columns compared for equality
+(including IN lists and join keys), then the sort columns, then the first range column.
+
+    python tools/index_advisor.py --offline                      # suggestions from the SQL alone, no database
+    python tools/index_advisor.py --connection-name env --output indexes.sql
+    python tools/index_advisor.py --connection-name env --apply --allow-writes
+
+`--apply` times every query, creates the missing indexes, then explains and times the queries again. The created
+indexes are dropped at the end unless `--keep-indexes` is given. To try it against a local MySQL-compatible stand-in
+(e.g. MySQL 8 or MariaDB in Docker), set the MYSQL_* variables with SSH_TUNNEL=false and seed minimal tables
+without secondary indexes:
+
+    python tools/index_advisor.py --connection-name env --seed-rows 200000 --apply --allow-writes
+
+Sample parameters are 1 for ids and November 2024 for dates; override them per column with e.g.
+`--param product_id=52`.
+"""
+import argparse
+import ast
+import re
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.db_connector import DBConnector
+
+PROCESSOR_MODULES = ("vpi_data.py", "market_changes_data.py", "textual_data.py")
+
+# The period the market changes processor queries
+SAMPLE_PERIOD = ("2024-11-01", "2024-11-28")
+DATE_COLUMNS = {"date", "display_date", "last_value_date", "created_at"}
+IN_LIST_SIZE = 3
+# Without a database, every table is assumed to have its primary key on `id`
+ASSUMED_PRIMARY_KEY = ["id"]
+MAX_INDEX_NAME_LENGTH = 64
+
+SQL_KEYWORDS = {"on", "where", "left", "right", "inner", "cross", "join", "group", "order", "limit", "using", "as"}
+TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+JOIN_CONDITION = re.compile(
+    r"\bJOIN\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?\s+ON\s+(.*?)"
+    r"(?=\b(?:LEFT|RIGHT|INNER|CROSS|JOIN|WHERE|GROUP|ORDER|LIMIT)\b|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+COMPARISON = re.compile(r"([\w.]+)\s*(>=|<=|<>|!=|=|<|>)\s*(%s|'[^']*'|-?\d+(?:\.\d+)?|[\w.]+)")
+TUPLE_IN = re.compile(r"\(([\w.]+(?:\s*,\s*[\w.]+)+)\)\s+IN\s*\(", re.IGNORECASE)
+COLUMN_IN = re.compile(r"([\w.]+)\s+IN\s*\(", re.IGNORECASE)
+WINDOW = re.compile(r"\bOVER\s*\((.*?)\)", re.IGNORECASE | re.DOTALL)
+ORDER_BY = re.compile(r"\bORDER\s+BY\s+(.+?)(?=\bLIMIT\b|$)", re.IGNORECASE | re.DOTALL)
+PARTITION_BY = re.compile(r"\bPARTITION\s+BY\s+(.+?)(?=\bORDER\b|$)", re.IGNORECASE | re.DOTALL)
+CTE_NAME = re.compile(r"\b(\w+)\s+AS\s+\(\s*SELECT\b", re.IGNORECASE)
+PARAMETER = re.compile(r"\{placeholders\}|%s")
+
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS vesper_quotations (
+        id INT PRIMARY KEY, product_id INT, data_source_id INT, data_series_id INT, date DATE, price DOUBLE,
+        currency VARCHAR(8))""",
+    """CREATE TABLE IF NOT EXISTS forecasts_quotations (
+        id INT PRIMARY KEY, origin_data_series_id INT, value DOUBLE, last_value_date DATE, display_date DATE,
+        duration INT)""",
+    """CREATE TABLE IF NOT EXISTS price_changes (
+        price_id INT NOT NULL, data_series_id INT NOT NULL, change_percentage DOUBLE, created_at DATETIME)""",
+    """CREATE TABLE IF NOT EXISTS user_top_data_series (user_id INT NOT NULL, data_series_id INT NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS products (id INT PRIMARY KEY, name VARCHAR(255))""",
+    """CREATE TABLE IF NOT EXISTS market_analyses (id INT PRIMARY KEY, title VARCHAR(255), content TEXT)""",
+    """CREATE TABLE IF NOT EXISTS news (id INT PRIMARY KEY, title VARCHAR(255), content TEXT)""",
+]
+
+
+@dataclass
+class QueryTemplate:
+    """
+    A `*_QUERY` constant of a processor module.
+    """
+
+    module: str
+    name: str
+    line: int
+    sql: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.module}.{self.name}"
+
+    def render(self, overrides: dict) -> tuple[str, tuple]:
+        """
+        Return the query with `{placeholders}` filled in as the processors do, and sample parameters for it.
+        """
+        parts = []
+        params = []
+        position = 0
+        for match in PARAMETER.finditer(self.sql):
+            preceding = self.sql[: match.start()]
+            parts.append(self.sql[position: match.start()])
+            position = match.end()
+            if match.group() == "%s":
+                comparison = re.search(r"([\w.]+)\s*(>=|<=|=|<|>)\s*$", preceding)
+                column, operator = comparison.groups() if comparison else (None, "=")
+                parts.append("%s")
+                params.append(sample_value(column, operator, overrides))
+                continue
+
+            in_list = re.search(r"(?:\(([\w.,\s]+)\)|([\w.]+))\s+IN\s*\(\s*$", preceding, re.IGNORECASE)
+            if in_list is None:
+                columns = [None]
+            else:
+                columns = [column.strip() for column in (in_list.group(1) or in_list.group(2)).split(",")]
+            group = "%s" if len(columns) == 1 else "(" + ", ".join(["%s"] * len(columns)) + ")"
+            parts.append(", ".join([group] * IN_LIST_SIZE))
+            for offset in range(IN_LIST_SIZE):
+                params.extend(sample_value(column, "=", overrides, offset) for column in columns)
+        parts.append(self.sql[position:])
+        return "".join(parts), tuple(params)
+
+
+@dataclass
+class AccessPattern:
+    """
+    How one SELECT block reads a table: the columns it compares for equality, sorts on and filters on a range of.
+    """
+
+    table: str
+    equality: list[str] = field(default_factory=list)
+    sort: list[str] = field(default_factory=list)
+    range: list[str] = field(default_factory=list)
+
+    def index_columns(self) -> list[str]:
+        """
+        Equality columns first, then sort columns, then the first range column: an index can only be used for the
+        columns after a range condition as a filter, not to seek or to sort.
+        """
+        columns = list(self.equality)
+        for column in self.sort + self.range[:1]:
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+
+@dataclass(frozen=True)
+class IndexSuggestion:
+    table: str
+    columns: tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        return f"idx_{self.table}_{'_'.join(self.columns)}"[:MAX_INDEX_NAME_LENGTH]
+
+    def create_ddl(self) -> str:
+        # Built online, so the table stays writable while the index is created
+        columns = ", ".join(f"`{column}`" for column in self.columns)
+        return f"ALTER TABLE `{self.table}` ADD INDEX `{self.name}` ({columns}), ALGORITHM=INPLACE, LOCK=NONE"
+
+    def drop_ddl(self) -> str:
+        return f"ALTER TABLE `{self.table}` DROP INDEX `{self.name}`"
+
+    def is_covered_by(self, indexes: list[list[str]]) -> bool:
+        return any(tuple(index[: len(self.columns)]) == self.columns for index in indexes)
+
+    def __str__(self) -> str:
+        return f"{self.table} ({', '.join(self.columns)})"
+
+
+@dataclass
+class QueryReport:
+    template: QueryTemplate
+    plan: Optional[pd.DataFrame] = None
+    problems: list[str] = field(default_factory=list)
+    suggestions: list[IndexSuggestion] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def collect_query_templates(src_dir: Path, modules=PROCESSOR_MODULES) -> list[QueryTemplate]:
+    """
+    Read the module-level `*_QUERY` string constants from the source of `modules`, without importing them.
+    """
+    templates = []
+    for module in modules:
+        tree = ast.parse(src_dir.joinpath(module).read_text())
+        for node in tree.body:
+            if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Constant):
+                continue
+            if not isinstance(node.value.value, str):
+                continue
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id.endswith("_QUERY"):
+                    templates.append(QueryTemplate(Path(module).stem, target.id, node.lineno, node.value.value))
+    return templates
+
+
+def sample_value(column: Optional[str], operator: str, overrides: dict, offset: int = 0):
+    """
+    Pick a parameter value for a comparison of `column`. Range ends get the end of the sample period.
+    """
+    name = column.split(".")[-1] if column else None
+    if name in overrides:
+        value = overrides[name]
+        return value + offset if isinstance(value, int) else value
+    if name in DATE_COLUMNS or (name or "").endswith(("_date", "_at")):
+        return SAMPLE_PERIOD[1] if operator in ("<", "<=") else SAMPLE_PERIOD[0]
+    return 1 + offset
+
+
+def split_select_blocks(sql: str) -> list[str]:
+    """
+    Split a statement into the text of each SELECT block, with nested subqueries replaced by `(subquery)`.
+    """
+    blocks = []
+    # One entry per open parenthesis: a buffer for a subquery, None for any other parenthesis
+    stack: list[Optional[list[str]]] = [[]]
+    for position, char in enumerate(sql):
+        current = next(buffer for buffer in reversed(stack) if buffer is not None)
+        if char == "(":
+            if re.match(r"\s*(SELECT|WITH)\b", sql[position + 1:], re.IGNORECASE):
+                stack.append([])
+            else:
+                current.append(char)
+                stack.append(None)
+        elif char == ")" and len(stack) > 1:
+            closed = stack.pop()
+            parent = next(buffer for buffer in reversed(stack) if buffer is not None)
+            if closed is None:
+                parent.append(char)
+            else:
+                blocks.append("".join(closed))
+                parent.append("(subquery)")
+        else:
+            current.append(char)
+    blocks.append("".join(stack[0]))
+    return blocks
+
+
+def _split_columns(column_list: str) -> list[str]:
+    columns = []
+    for column in column_list.split(","):
+        column = re.sub(r"\s+(ASC|DESC)\s*$", "", column.strip(), flags=re.IGNORECASE)
+        if column:
+            columns.append(column)
+    return columns
+
+
+def _add(columns: list[str], column: str):
+    if column not in columns:
+        columns.append(column)
+
+
+def access_patterns(sql: str) -> list[AccessPattern]:
+    """
+    Work out how each SELECT block of `sql` reads its tables. Unqualified columns are only attributed in blocks
+    that read a single table.
+    """
+    cte_names = {name.lower() for name in CTE_NAME.findall(sql)}
+    patterns = []
+    for block in split_select_blocks(sql):
+        aliases = {}
+        for table, alias in TABLE_REF.findall(block):
+            if table.lower() in SQL_KEYWORDS or table.lower() in cte_names:
+                continue
+            aliases[table] = table
+            if alias and alias.lower() not in SQL_KEYWORDS:
+                aliases[alias] = table
+        tables = list(dict.fromkeys(aliases.values()))
+        if not tables:
+            continue
+        by_table = {table: AccessPattern(table) for table in tables}
+
+        def resolve(reference: str) -> Optional[tuple[str, str]]:
+            if not re.fullmatch(r"[A-Za-z_]\w*(\.\w+)?", reference):
+                return None
+            if "." in reference:
+                alias, column = reference.split(".", 1)
+                return (aliases[alias], column) if alias in aliases else None
+            if len(tables) == 1 and reference.lower() not in SQL_KEYWORDS:
+                return tables[0], reference
+            return None
+
+        # Join conditions only help the joined table: it is looked up by the columns of the other side
+        for table, alias, condition in JOIN_CONDITION.findall(block):
+            own_aliases = {table, alias} if alias and alias.lower() not in SQL_KEYWORDS else {table}
+            for left, operator, right in COMPARISON.findall(condition):
+                for reference in (left, right):
+                    if "." in reference and reference.split(".", 1)[0] in own_aliases and table in by_table:
+                        column = reference.split(".", 1)[1]
+                        _add(by_table[table].equality if operator == "=" else by_table[table].range, column)
+        block = JOIN_CONDITION.sub(" ", block)
+
+        windows = WINDOW.findall(block)
+        block = WINDOW.sub(" ", block)
+        sort_lists = []
+        for window in windows:
+            partition = PARTITION_BY.search(window)
+            order = ORDER_BY.search(window)
+            sort_lists.append(
+                (_split_columns(partition.group(1)) if partition else [])
+                + (_split_columns(order.group(1)) if order else [])
+            )
+        order = ORDER_BY.search(block)
+        if order:
+            sort_lists.append(_split_columns(order.group(1)))
+            block = block[: order.start()]
+
+        for column_list in TUPLE_IN.findall(block):
+            for reference in _split_columns(column_list):
+                if resolved := resolve(reference):
+                    _add(by_table[resolved[0]].equality, resolved[1])
+        for reference in COLUMN_IN.findall(block):
+            if resolved := resolve(reference):
+                _add(by_table[resolved[0]].equality, resolved[1])
+        for left, operator, right in COMPARISON.findall(block):
+            resolved = resolve(left)
+            if resolved is None or operator in ("<>", "!="):
+                continue
+            if operator == "=" and resolve(right) is not None:
+                # A column compared to another column outside a join condition says nothing about either index
+                continue
+            _add(by_table[resolved[0]].equality if operator == "=" else by_table[resolved[0]].range, resolved[1])
+
+        # A sort only avoids the filesort if all its columns come from one table
+        for sort_list in sort_lists:
+            resolved = [resolve(reference) for reference in sort_list]
+            if resolved and all(resolved) and len({table for table, _ in resolved}) == 1:
+                for table, column in resolved:
+                    _add(by_table[table].sort, column)
+
+        patterns.extend(by_table.values())
+    return patterns
+
+
+def suggest_indexes(sql: str) -> list[IndexSuggestion]:
+    suggestions = []
+    for pattern in access_patterns(sql):
+        columns = pattern.index_columns()
+        if columns:
+            suggestion = IndexSuggestion(pattern.table, tuple(columns))
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+    return suggestions
+
+
+def plan_problems(plan: pd.DataFrame) -> tuple[list[str], set[str]]:
+    """
+    Return the problems in an EXPLAIN result and the tables they concern.
+    """
+    problems = []
+    tables = set()
+    for row in plan.fillna("").to_dict("records"):
+        table = str(row.get("table", ""))
+        access = str(row.get("type", ""))
+        extra = str(row.get("Extra", ""))
+        # Derived tables and CTEs (`<derived2>`) are always scanned, an index on a base table cannot help that
+        if table.startswith("<"):
+            continue
+        row_problems = []
+        if access == "ALL":
+            row_problems.append(f"full table scan of {table} (~{row.get('rows')} rows)")
+        elif access == "index":
+            row_problems.append(f"full index scan of {table} (~{row.get('rows')} rows)")
+        if "Using filesort" in extra:
+            row_problems.append(f"filesort on {table}")
+        if "Using temporary" in extra:
+            row_problems.append(f"temporary table for {table}")
+        if row_problems:
+            problems.extend(row_problems)
+            tables.add(table)
+    return problems, tables
+
+
+def load_indexes(db: DBConnector, tables) -> dict[str, list[list[str]]]:
+    """
+    Return the columns of the existing indexes of each table, in index order.
+    """
+    indexes = {}
+    for table in tables:
+        try:
+            rows = db.query_data(f"SHOW INDEX FROM `{table}`")
+        except Exception as e:
+            print(f"Could not read the indexes of {table}: {e}")
+            continue
+        rows = rows.sort_values(["Key_name", "Seq_in_index"])
+        indexes[table] = [list(group["Column_name"]) for _, group in rows.groupby("Key_name", sort=False)]
+    return indexes
+
+
+def explain(db: DBConnector, template: QueryTemplate, overrides: dict) -> pd.DataFrame:
+    query, params = template.render(overrides)
+    return db.query_data(f"EXPLAIN {query}", params=params or None)
+
+
+def analyze(
+    db: DBConnector, templates: list[QueryTemplate], overrides: dict, indexes: dict[str, list[list[str]]]
+) -> list[QueryReport]:
+    reports = []
+    for template in templates:
+        report = QueryReport(template)
+        try:
+            report.plan = explain(db, template, overrides)
+        except Exception as e:
+            report.error = f"{type(e).__name__}: {e}"
+            reports.append(report)
+            continue
+        report.problems, flagged_tables = plan_problems(report.plan)
+        report.suggestions = [
+            suggestion
+            for suggestion in suggest_indexes(template.sql)
+            if suggestion.table in flagged_tables and not suggestion.is_covered_by(indexes.get(suggestion.table, []))
+        ]
+        reports.append(report)
+    return reports
+
+
+def print_report(report: QueryReport):
+    template = report.template
+    print(f"\n{template.label} (line {template.line})")
+    if report.error:
+        print(f"  EXPLAIN failed: {report.error}")
+        return
+    if report.plan is not None:
+        for row in report.plan.fillna("").to_dict("records"):
+            print(
+                f"  {str(row.get('table', '')):<24} type={str(row.get('type', '')) or '-':<7} "
+                f"key={str(row.get('key', '')) or '-':<32} rows={str(row.get('rows', '')):<9} {row.get('Extra', '')}"
+            )
+    for problem in report.problems:
+        print(f"  ! {problem}")
+    for suggestion in report.suggestions:
+        print(f"  suggested index: {suggestion}")
+
+
+def ddl_script(suggestions: list[IndexSuggestion]) -> str:
+    lines = ["-- Suggested by tools/index_advisor.py"]
+    lines += [f"{suggestion.create_ddl()};" for suggestion in suggestions]
+    lines += ["", "-- Rollback"]
+    lines += [f"-- {suggestion.drop_ddl()};" for suggestion in suggestions]
+    return "\n".join(lines) + "\n"
+
+
+def time_query(db: DBConnector, template: QueryTemplate, overrides: dict, repeat: int) -> float:
+    """
+    Return the median seconds of `repeat` runs, after one warm-up run.
+    """
+    query, params = template.render(overrides)
+    db.query_data(query, params=params or None)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.query_data(query, params=params or None)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def benchmark(db: DBConnector, templates: list[QueryTemplate], overrides: dict, repeat: int) -> dict[str, float]:
+    timings = {}
+    for template in templates:
+        try:
+            timings[template.label] = time_query(db, template, overrides, repeat)
+        except Exception as e:
+            print(f"Could not time {template.label}: {e}")
+    return timings
+
+
+def seed(db: DBConnector, rows: int, products: int = 500, data_sources: int = 5, users: int = 50):
+    """
+    Create minimal versions of the queried tables, with primary keys only, and load `rows` synthetic quotations
+    with a price change and a forecast each.
+    """
+    for statement in SCHEMA_STATEMENTS:
+        db.execute_query(statement)
+
+    rng = np.random.default_rng(42)
+    ids = np.arange(1, rows + 1)
+    series_ids = 1 + rng.integers(0, products * data_sources, rows)
+    dates = pd.Timestamp(SAMPLE_PERIOD[0]) - pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    db.insert_dataframe_in_batch(
+        pd.DataFrame({"id": np.arange(1, products + 1), "name": [f"product-{i}" for i in range(products)]}),
+        "products",
+        upsert=True,
+    )
+    db.insert_dataframe_in_batch(
+        pd.DataFrame(
+            {
+                "id": ids,
+                "product_id": (series_ids - 1) // data_sources + 1,
+                "data_source_id": (series_ids - 1) % data_sources + 1,
+                "data_series_id": series_ids,
+                "date": dates.date,
+                "price": rng.uniform(1000, 9000, rows).round(2),
+                "currency": "EUR",
+            }
+        ),
+        "vesper_quotations",
+        batch_size=5000,
+        upsert=True,
+    )
+    db.insert_dataframe_in_batch(
+        pd.DataFrame(
+            {
+                "id": ids,
+                "origin_data_series_id": series_ids,
+                "value": rng.uniform(1000, 9000, rows).round(2),
+                "last_value_date": dates.date,
+                "display_date": (dates + pd.Timedelta(days=30)).date,
+                "duration": rng.integers(1, 4, rows),
+            }
+        ),
+        "forecasts_quotations",
+        batch_size=5000,
+        upsert=True,
+    )
+    db.insert_dataframe_in_batch(
+        pd.DataFrame(
+            {
+                "price_id": ids,
+                "data_series_id": series_ids,
+                "change_percentage": rng.normal(0, 2, rows).round(3),
+                "created_at": pd.Timestamp(SAMPLE_PERIOD[0])
+                + pd.to_timedelta(rng.integers(-60 * 24 * 3600, 30 * 24 * 3600, rows), unit="s"),
+            }
+        ),
+        "price_changes",
+        batch_size=5000,
+    )
+    db.insert_dataframe_in_batch(
+        pd.DataFrame(
+            {
+                "user_id": np.repeat(np.arange(1, users + 1), 20),
+                "data_series_id": 1 + rng.integers(0, products * data_sources, users * 20),
+            }
+        ),
+        "user_top_data_series",
+        batch_size=5000,
+    )
+    for table in ("market_analyses", "news"):
+        db.insert_dataframe_in_batch(
+            pd.DataFrame({"id": np.arange(1, 101), "title": "title", "content": "content"}), table, upsert=True
+        )
+
+
+def parse_overrides(values: list[str]) -> dict:
+    overrides = {}
+    for value in values:
+        column, _, sample = value.partition("=")
+        overrides[column.strip()] = int(sample) if sample.strip().lstrip("-").isdigit() else sample
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connection-name", default="env")
+    parser.add_argument("--modules", nargs="+", default=list(PROCESSOR_MODULES), help="Source files under src/.")
+    parser.add_argument("--offline", action="store_true", help="Only derive index suggestions from the SQL.")
+    parser.add_argument("--param", action="append", default=[], help="Sample value for a column, e.g. product_id=52.")
+    parser.add_argument("--output", type=Path, help="Write the suggested DDL to this file.")
+    parser.add_argument("--apply", action="store_true", help="Create the suggested indexes and benchmark the queries.")
+    parser.add_argument("--keep-indexes", action="store_true", help="Keep the indexes created by --apply.")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per query for --apply.")
+    parser.add_argument("--seed-rows", type=int, default=0, help="Create and fill stand-in tables first.")
+    parser.add_argument("--allow-writes", action="store_true", help="Required for --apply and --seed-rows.")
+    args = parser.parse_args()
+
+    if (args.apply or args.seed_rows) and not args.allow_writes:
+        parser.error("--apply and --seed-rows write to the database, pass --allow-writes to confirm.")
+    overrides = parse_overrides(args.param)
+    templates = collect_query_templates(parent_dir[1], args.modules)
+    print(f"{len(templates)} query templates in {', '.join(args.modules)}")
+
+    if args.offline:
+        suggestions = []
+        for template in templates:
+            template_suggestions = [
+                suggestion
+                for suggestion in suggest_indexes(template.sql)
+                if not suggestion.is_covered_by([ASSUMED_PRIMARY_KEY])
+            ]
+            print(f"\n{template.label} (line {template.line})")
+            for suggestion in template_suggestions:
+                print(f"  candidate index: {suggestion}")
+                if suggestion not in suggestions:
+                    suggestions.append(suggestion)
+        script = ddl_script(suggestions)
+        print(f"\n{script}")
+        if args.output:
+            args.output.write_text(script)
+        return
+
+    db = DBConnector(connection_name=args.connection_name, lazy=True)
+    try:
+        if args.seed_rows:
+            seed(db, args.seed_rows)
+
+        tables = {suggestion.table for template in templates for suggestion in suggest_indexes(template.sql)}
+        indexes = load_indexes(db, sorted(tables))
+        reports = analyze(db, templates, overrides, indexes)
+        for report in reports:
+            print_report(report)
+
+        suggestions = list(dict.fromkeys(suggestion for report in reports for suggestion in report.suggestions))
+        if not suggestions:
+            print("\nNo missing indexes: no flagged query reads a table without a matching index.")
+            return
+        script = ddl_script(suggestions)
+        print(f"\n{script}")
+        if args.output:
+            args.output.write_text(script)
+        if not args.apply:
+            return
+
+        before = benchmark(db, templates, overrides, args.repeat)
+        created = []
+        try:
+            for suggestion in suggestions:
+                print(f"Creating {suggestion.name} on {suggestion}")
+                db.execute_query(suggestion.create_ddl())
+                created.append(suggestion)
+            after_reports = analyze(db, templates, overrides, load_indexes(db, sorted(tables)))
+            after = benchmark(db, templates, overrides, args.repeat)
+        finally:
+            if not args.keep_indexes:
+                for suggestion in created:
+                    db.execute_query(suggestion.drop_ddl())
+
+        print(f"\n{'query':<52} {'before ms':>10} {'after ms':>10} {'speed-up':>9}  problems")
+        for report, after_report in zip(reports, after_reports):
+            label = report.template.label
+            if label not in before or label not in after:
+                continue
+            speed_up = before[label] / after[label] if after[label] else float("inf")
+            print(
+                f"{label:<52} {before[label] * 1000:10.2f} {after[label] * 1000:10.2f} {speed_up:8.1f}x  "
+                f"{len(report.problems)} -> {len(after_report.problems)}"
+            )
+        if not args.keep_indexes:
+            print("\nDropped the created indexes again, pass --keep-indexes to keep them.")
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
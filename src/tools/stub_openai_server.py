@@ -0,0 +1,128 @@
+"""
+Local stand-in for the OpenAI chat completions API, for testing and benchmarking the summary without an API key.
+
+It answers every request with a canned summary of each "Article ID: N" in the prompt, after a fixed delay plus a
+delay per article, to mimic a completion whose latency grows with its length. Streaming requests get the same
+answer in small chunks.
+
+    python tools/stub_openai_server.py --port 8089 --delay 0.3 --delay-per-article 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python api_endpoints.py
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+from aiohttp import web
+
+ARTICLE_PATTERN = re.compile(r"^Article ID: (\d+)\nTitle: (.*)$", re.MULTILINE)
+MARKET_EFFECTS = ("📈", "📉", "🟢")
+
+
+def canned_summary(prompt: str) -> str:
+    """
+    Build a JSON array answer for the articles in a prompt.
+    """
+    items = [
+        {
+            "article_id": int(article_id),
+            "title": title,
+            "content": f"Summary of article {article_id}.",
+            "market_effect": MARKET_EFFECTS[int(article_id) % len(MARKET_EFFECTS)],
+        }
+        for article_id, title in ARTICLE_PATTERN.findall(prompt)
+    ]
+    return json.dumps(items, ensure_ascii=False, indent=2)
+
+
+def completion_chunk(body: dict, completion_id: str, delta: dict, finish_reason=None, usage=None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+        "usage": usage,
+    }
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+def make_app(delay: float, delay_per_article: float, chunk_chars: int) -> web.Application:
+    stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        answer = canned_summary(prompt)
+        n_articles = len(ARTICLE_PATTERN.findall(prompt))
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(answer) // 4,
+            "total_tokens": (len(prompt) + len(answer)) // 4,
+        }
+        completion_id = f"chatcmpl-stub-{stats['requests']}"
+
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            if not body.get("stream"):
+                await asyncio.sleep(delay + delay_per_article * n_articles)
+                return web.json_response(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": answer},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": usage,
+                    }
+                )
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            await asyncio.sleep(delay)
+            pieces = [answer[start : start + chunk_chars] for start in range(0, len(answer), chunk_chars)]
+            piece_delay = delay_per_article * n_articles / max(len(pieces), 1)
+            await response.write(completion_chunk(body, completion_id, {"role": "assistant", "content": ""}).encode())
+            for piece in pieces:
+                await asyncio.sleep(piece_delay)
+                await response.write(completion_chunk(body, completion_id, {"content": piece}).encode())
+            await response.write(completion_chunk(body, completion_id, {}, finish_reason="stop").encode())
+            if (body.get("stream_options") or {}).get("include_usage"):
+                await response.write(completion_chunk(body, completion_id, {}, usage=usage).encode())
+            await response.write(b"data: [DONE]\n\n")
+            return response
+        finally:
+            stats["in_flight"] -= 1
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.3, help="Seconds before the first token.")
+    parser.add_argument("--delay-per-article", type=float, default=0.2, help="Extra seconds per summarized article.")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="Characters per streamed chunk.")
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.delay, args.delay_per_article, args.chunk_chars), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Render the spans of a request trace as a waterfall, or aggregate where the critical path of many traces goes.
+
+Spans are read from the span log written by helper_files/tracing.py. Every API response carries its trace id in
+the X-Trace-Id header:
+
+    python tools/trace_waterfall.py --trace-id 3f2a...      # waterfall of one trace
+    python tools/trace_waterfall.py --last                  # waterfall of the most recent trace
+    python tools/trace_waterfall.py --aggregate --route /generate-summary
+
+The critical path of a span is the chain of children that determined when it finished: walking back from its end,
+the child that ended last, then the child that ended last before that one started, and so on. Time on the path not
+covered by a child is the span's own. Aggregated per span name, it shows which stage the requests waited on, which
+differs from the total time per stage when stages run concurrently.
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.file_paths import ProjectPaths
+from helper_files.tracing import SPAN_LOG_FILE
+
+SHOWN_ATTRIBUTES = ("route", "status_code", "operation", "rows", "cached", "ids", "articles", "total_tokens", "chunks")
+
+
+def load_traces(path: Path) -> dict[str, list[dict]]:
+    """
+    Read the span log, grouped by trace id in the order the traces were written.
+    """
+    traces = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            traces[span["trace_id"]].append(span)
+    return traces
+
+
+def build_tree(spans: list[dict]) -> tuple[list[dict], dict[str, list[dict]]]:
+    """
+    Return the root spans and the children of every span, both sorted by start time. Spans whose parent is
+    missing (e.g. dropped) are treated as roots.
+    """
+    span_ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in sorted(spans, key=lambda span: span["start"]):
+        if span["parent_id"] in span_ids:
+            children[span["parent_id"]].append(span)
+        else:
+            roots.append(span)
+    return roots, children
+
+
+def critical_path(span: dict, children: dict[str, list[dict]], totals: dict[str, float]):
+    """
+    Add the time each span spends on the critical path of `span` to `totals`, by span name.
+    """
+    cursor = span["start"] + span["duration"]
+    by_end = sorted(children.get(span["span_id"], []), key=lambda child: child["start"] + child["duration"])
+    for child in reversed(by_end):
+        child_end = child["start"] + child["duration"]
+        if child_end > cursor:
+            # Overlaps with a later child that is already on the path
+            continue
+        totals[span["name"]] += cursor - child_end
+        critical_path(child, children, totals)
+        cursor = child["start"]
+    totals[span["name"]] += max(cursor - span["start"], 0.0)
+
+
+def render_waterfall(spans: list[dict], width: int):
+    roots, children = build_tree(spans)
+    trace_start = min(span["start"] for span in spans)
+    trace_end = max(span["start"] + span["duration"] for span in spans)
+    scale = width / max(trace_end - trace_start, 1e-9)
+
+    print(f"Trace {spans[0]['trace_id']}: {len(spans)} spans, {(trace_end - trace_start) * 1000:.1f} ms")
+    print(f"{'start ms':>9} {'dur ms':>9}  {'':{width}}  span")
+
+    def render(span: dict, depth: int):
+        offset = span["start"] - trace_start
+        left = int(offset * scale)
+        bar_width = max(1, int(span["duration"] * scale))
+        bar = (" " * left + "#" * bar_width)[:width].ljust(width)
+        attributes = " ".join(
+            f"{key}={span['attributes'][key]}" for key in SHOWN_ATTRIBUTES if key in span.get("attributes", {})
+        )
+        error = f" ERROR {span['error']}" if span.get("status") == "error" else ""
+        print(
+            f"{offset * 1000:9.1f} {span['duration'] * 1000:9.1f}  {bar}  "
+            f"{'  ' * depth}{span['name']} {attributes}{error}"
+        )
+        for child in children.get(span["span_id"], []):
+            render(child, depth + 1)
+
+    for root in roots:
+        render(root, 0)
+
+    totals = defaultdict(float)
+    for root in roots:
+        critical_path(root, children, totals)
+    print_stage_table("Critical path", totals, 1)
+
+
+def print_stage_table(title: str, totals: dict[str, float], traces: int):
+    total = sum(totals.values())
+    print(f"\n{title} ({traces} trace{'s' if traces != 1 else ''}, {total * 1000 / traces:.1f} ms per trace)")
+    print(f"{'ms/trace':>9} {'share':>7}  stage")
+    for name, seconds in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+        print(f"{seconds * 1000 / traces:9.1f} {seconds / total if total else 0:7.1%}  {name}")
+
+
+def root_route(spans: list[dict]) -> str:
+    roots, _ = build_tree(spans)
+    if not roots:
+        return ""
+    attributes = roots[0].get("attributes", {})
+    return attributes.get("route") or attributes.get("path") or roots[0]["name"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", type=Path, default=ProjectPaths.LOGS_DIR.joinpath(SPAN_LOG_FILE))
+    parser.add_argument("--trace-id")
+    parser.add_argument("--last", action="store_true", help="Show the most recent trace.")
+    parser.add_argument("--aggregate", action="store_true", help="Aggregate the critical path over many traces.")
+    parser.add_argument("--route", help="Only traces of this route, e.g. /generate-summary.")
+    parser.add_argument("--limit", type=int, default=1000, help="Aggregate at most this many recent traces.")
+    parser.add_argument("--width", type=int, default=50)
+    args = parser.parse_args()
+
+    traces = load_traces(args.file)
+    if args.route:
+        traces = {trace_id: spans for trace_id, spans in traces.items() if root_route(spans) == args.route}
+    if not traces:
+        sys.exit(f"No traces found in {args.file}")
+
+    if args.aggregate:
+        totals = defaultdict(float)
+        selected = list(traces.values())[-args.limit:]
+        for spans in selected:
+            roots, children = build_tree(spans)
+            for root in roots:
+                critical_path(root, children, totals)
+        print_stage_table("Critical path by stage", totals, len(selected))
+    elif args.trace_id:
+        if args.trace_id not in traces:
+            sys.exit(f"Trace {args.trace_id} not found in {args.file}")
+        render_waterfall(traces[args.trace_id], args.width)
+    elif args.last:
+        render_waterfall(list(traces.values())[-1], args.width)
+    else:
+        for trace_id, spans in list(traces.items())[-20:]:
+            duration = max(span["duration"] for span in spans)
+            print(f"{trace_id}  {duration * 1000:9.1f} ms  {len(spans):4} spans  {root_route(spans)}")
+
+
+if __name__ == "__main__":
+    main()
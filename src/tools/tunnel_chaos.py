@@ -0,0 +1,141 @@
+"""
+Exercise the SSH tunnel manager without an SSH server: drop the tunnel repeatedly and report the reconnects.
+
+A plain TCP forwarder stands in for SSH, in front of local echo servers that stand in for the databases. Clients
+keep sending requests through the shared tunnel while it is dropped every `--drop-every` seconds:
+
+    python tools/tunnel_chaos.py --databases 2 --clients 4 --drops 5 --drop-every 2
+
+Reports the tunnel events, the reconnect latencies and how many client requests failed while the tunnel was down.
+"""
+import argparse
+import socket
+import socketserver
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    parent_dir = Path(__file__).parents
+    sys.path.append(str(parent_dir[1]))
+except Exception as e:
+    raise (e)
+
+from helper_files.ssh_tunnel_manager import SSHTunnelManager, TunnelTarget, tcp_forwarder_factory
+
+
+class EchoHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while data := self.request.recv(4096):
+            self.request.sendall(data)
+
+
+class EchoServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_echo_server() -> EchoServer:
+    server = EchoServer(("127.0.0.1", 0), EchoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def client(manager, target, remote, stop_event, counts, lock):
+    """
+    Send requests through the tunnel, reconnecting (like a pooled connection would) after a failure.
+    """
+    sock = None
+    while not stop_event.is_set():
+        try:
+            if sock is None:
+                port = manager.local_port(target, *remote)
+                sock = socket.create_connection(("127.0.0.1", port), timeout=2)
+            sock.sendall(b"ping")
+            if sock.recv(4) != b"ping":
+                raise ConnectionError("Connection closed")
+            outcome = "ok"
+        except OSError:
+            outcome = "failed"
+            if sock is not None:
+                sock.close()
+            sock = None
+        with lock:
+            counts[outcome] += 1
+        stop_event.wait(0.01 if outcome == "ok" else 0.05)
+    if sock is not None:
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--databases", type=int, default=2, help="Remote addresses multiplexed over the tunnel.")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--drops", type=int, default=5)
+    parser.add_argument("--drop-every", type=float, default=2.0)
+    parser.add_argument("--health-check-interval", type=float, default=0.2)
+    args = parser.parse_args()
+
+    forwarders = []
+
+    def factory(*factory_args):
+        forwarder = tcp_forwarder_factory(*factory_args)
+        forwarders.append(forwarder)
+        return forwarder
+
+    manager = SSHTunnelManager(
+        forwarder_factory=factory, health_check_interval=args.health_check_interval, backoff_base=0.05
+    )
+    target = TunnelTarget("ssh.example.invalid", 22, "chaos")
+    servers = [start_echo_server() for _ in range(args.databases)]
+    remotes = [server.server_address for server in servers]
+    for remote in remotes:
+        manager.local_port(target, *remote)
+
+    stop_event = threading.Event()
+    lock = threading.Lock()
+    counts = {"ok": 0, "failed": 0}
+    threads = [
+        threading.Thread(
+            target=client, args=(manager, target, remotes[index % len(remotes)], stop_event, counts, lock), daemon=True
+        )
+        for index in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+
+    for drop in range(args.drops):
+        time.sleep(args.drop_every)
+        print(f"Dropping the tunnel ({drop + 1}/{args.drops})")
+        forwarders[-1].stop()
+    time.sleep(args.drop_every)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    print("\nEvents:")
+    for event in manager.events():
+        latency = f" ({event['reconnect_seconds'] * 1000:.0f} ms)" if event["reconnect_seconds"] is not None else ""
+        print(f"  {time.strftime('%H:%M:%S', time.localtime(event['at']))} {event['event']}{latency} {event['detail']}")
+
+    stats = manager.stats()[str(target)]
+    latencies = [event["reconnect_seconds"] for event in manager.events() if event["reconnect_seconds"] is not None]
+    print(f"\nState: {stats['state']}, binds: {stats['binds']}")
+    print(f"Connects: {stats['connects']}, reconnects: {stats['reconnects']}, failures: {stats['failures']}")
+    if latencies:
+        print(
+            f"Reconnect latency: median {statistics.median(latencies) * 1000:.0f} ms, "
+            f"max {max(latencies) * 1000:.0f} ms"
+        )
+    total = counts["ok"] + counts["failed"]
+    print(f"Client requests: {total}, failed: {counts['failed']} ({counts['failed'] / max(total, 1):.2%})")
+
+    manager.close()
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 import asyncio
 import aiohttp
 
+from helper_files.python_helper import get_project_logger
+
+logger = get_project_logger(logger_name=__name__)
+
 MARKET_DATA = [
     {
         "Market Date": "Nov 27, 2024",
@@ -99,12 +103,12 @@ class TradingBot:
         """
         step_count = 0
 
-        print(f"Bot's offer: {self.bot_offer} (Step {step_count + 1})")
+        logger.debug("Bot's offer: %s (Step %s)", self.bot_offer, step_count + 1)
 
         # Simulate receiving a counter offer (this will come from the buyer)
         counter_offer = self.counter_offer
         # counter_offer = 7430  # Simulating a counter offer
-        print(f"Counter offer: {counter_offer}")
+        logger.debug("Counter offer: %s", counter_offer)
 
         # Adjust the bot's offer based on the counter offer (lower it slightly)
         # If the current offer is higher than the counter offer, lower it
@@ -116,20 +120,20 @@ class TradingBot:
         # Prevent the offer from going lower than the minimum price
         if self.bot_offer < self.min_price:
             self.bot_offer = self.min_price  # Cap the offer at the minimum price
-            print(f"Bot's offer adjusted to minimum price: {self.bot_offer}")
+            logger.debug("Bot's offer adjusted to minimum price: %s", self.bot_offer)
 
         # Prevent the offer from going over the suggested price
         if self.bot_offer > self.suggested_price:
             self.bot_offer = (
                 self.suggested_price
             )  # Cap the offer at the suggested price
-            print(f"Bot's offer adjusted to suggested price: {self.bot_offer}")
+            logger.debug("Bot's offer adjusted to suggested price: %s", self.bot_offer)
 
         # Prevent price from going too high (stop if the price is too far above the suggested price)
         if (
             self.bot_offer > self.suggested_price * 1.2
         ):  # 20% higher than the original suggested price
-            print("Bot's offer is too high, stopping further offers.")
+            logger.info("Bot's offer is too high, stopping further offers.")
             return "Bot's offer is too high, stopping further offers."
 
         step_count += 1
@@ -1,37 +1,182 @@
+from typing import Optional
+
 import pandas as pd
+from helper_files.async_db_connector import AsyncDBConnector
 from helper_files.db_connector import DBConnector
+from helper_files.python_helper import get_project_logger
+from helper_files.single_flight import single_flight
+from latest_quote_index import LatestQuoteIndex
+
+logger = get_project_logger(logger_name=__name__)
+
+LATEST_VESPER_QUERY = """
+SELECT price, currency, data_series_id, date
+FROM vesper_quotations
+WHERE product_id = %s AND data_source_id = %s
+ORDER BY date DESC
+LIMIT 1
+"""
+
+FORECASTS_QUERY = """
+SELECT value, last_value_date, display_date
+FROM forecasts_quotations
+WHERE origin_data_series_id = %s
+  AND last_value_date = %s
+  AND duration = 1
+"""
+
+# Latest quote for many (product_id, data_source_id) pairs at once. Needs MySQL 8+ (window functions).
+LATEST_VESPER_BATCH_QUERY = """
+SELECT product_id, data_source_id, price, currency, data_series_id, date
+FROM (
+    SELECT product_id, data_source_id, price, currency, data_series_id, date,
+           ROW_NUMBER() OVER (PARTITION BY product_id, data_source_id ORDER BY date DESC) AS row_rank
+    FROM vesper_quotations
+    WHERE (product_id, data_source_id) IN ({placeholders})
+) ranked
+WHERE row_rank = 1
+"""
+
+FORECASTS_BATCH_QUERY = """
+SELECT origin_data_series_id, value, last_value_date, display_date
+FROM forecasts_quotations
+WHERE (origin_data_series_id, last_value_date) IN ({placeholders})
+  AND duration = 1
+"""
+
+FULL_INFORMATION_COLUMNS = ["price", "currency", "data_series_id", "date", "value", "display_date"]
+
+# Quotes are published a few times a day, so the latest quote per product/source can be reused for a minute.
+LATEST_VESPER_CACHE_TTL = 60
+
 
 class VesperDataProcessor:
-    def __init__(self, db_connection: DBConnector):
+    def __init__(self, db_connection: DBConnector, quote_index: Optional[LatestQuoteIndex] = None):
+        """
+        Initializes the VesperDataProcessor.
+
+        Args:
+            db_connection: The DB connection to query through.
+            quote_index: Optional in-memory index that serves latest quotes and forecasts without a DB round
+                trip. Index misses fall back to the database.
+        """
         self.db_connection = db_connection
+        self.quote_index = quote_index
+
+    @staticmethod
+    def _parse_latest_vesper_data(result: pd.DataFrame) -> dict:
+        if result.empty:
+            logger.info("No data found for the given product_id and data_source_id.")
+            return {}
+
+        latest_entry = result.iloc[0]
+        return {
+            "price": float(latest_entry["price"]),
+            "currency": str(latest_entry["currency"]),
+            "data_series_id": int(latest_entry["data_series_id"]),
+            "date": latest_entry["date"].strftime("%Y-%m-%d"),
+        }
+
+    @staticmethod
+    def _forecasts_params(vesper_data: dict):
+        data_series_id = vesper_data.get("data_series_id")
+        date = vesper_data.get("date")
+
+        if not data_series_id or not date:
+            logger.warning("Vesper data is missing required fields.")
+            return None
+        return data_series_id, date
+
+    @staticmethod
+    def _merge_full_information(vesper_data: dict, forecasts_data: pd.DataFrame) -> pd.DataFrame:
+        vesper_df = pd.DataFrame([vesper_data])
+        vesper_df["date"] = pd.to_datetime(vesper_df["date"]).dt.date
+        forecasts_data["last_value_date"] = pd.to_datetime(forecasts_data["last_value_date"]).dt.date
+
+        full_info = pd.merge(
+            vesper_df, forecasts_data, left_on="date", right_on="last_value_date", how="left"
+        )
+
+        return full_info[FULL_INFORMATION_COLUMNS]
+
+    def _indexed_latest_vesper_data(self, product_id: int, data_source_id: int) -> Optional[dict]:
+        if self.quote_index is None:
+            return None
+        return self.quote_index.get_latest_quote(product_id, data_source_id)
+
+    def _indexed_forecasts(self, vesper_data: dict) -> Optional[pd.DataFrame]:
+        if self.quote_index is None:
+            return None
+        return self.quote_index.get_forecasts(vesper_data.get("data_series_id"), vesper_data.get("date"))
+
+    def index_metrics(self) -> dict:
+        """
+        Return the staleness and refresh metrics of the latest quote index, if one is used.
+        """
+        return self.quote_index.metrics() if self.quote_index is not None else {}
+
+    @staticmethod
+    def _normalize_pairs(pairs) -> list[tuple[int, int]]:
+        return list(dict.fromkeys((int(product_id), int(data_source_id)) for product_id, data_source_id in pairs))
+
+    @staticmethod
+    def _latest_batch_query(pairs):
+        placeholders = ", ".join(["(%s, %s)"] * len(pairs))
+        params = tuple(value for pair in pairs for value in pair)
+        return LATEST_VESPER_BATCH_QUERY.format(placeholders=placeholders), params
+
+    @staticmethod
+    def _forecasts_batch_query(latest_quotes: pd.DataFrame):
+        keys = list(
+            dict.fromkeys(
+                zip(
+                    latest_quotes["data_series_id"].astype(int).tolist(),
+                    pd.to_datetime(latest_quotes["date"]).dt.strftime("%Y-%m-%d").tolist(),
+                )
+            )
+        )
+        placeholders = ", ".join(["(%s, %s)"] * len(keys))
+        params = tuple(value for key in keys for value in key)
+        return FORECASTS_BATCH_QUERY.format(placeholders=placeholders), params
+
+    @staticmethod
+    def _merge_batch_information(pairs, latest_quotes: pd.DataFrame, forecasts_data: pd.DataFrame) -> dict:
+        results = {pair: pd.DataFrame() for pair in pairs}
+        if latest_quotes.empty or forecasts_data.empty:
+            return results
+
+        latest_quotes = latest_quotes.copy()
+        latest_quotes["date"] = pd.to_datetime(latest_quotes["date"]).dt.date
+        forecasts_data = forecasts_data.copy()
+        forecasts_data["last_value_date"] = pd.to_datetime(forecasts_data["last_value_date"]).dt.date
+
+        full_info = latest_quotes.merge(
+            forecasts_data,
+            left_on=["data_series_id", "date"],
+            right_on=["origin_data_series_id", "last_value_date"],
+            how="inner",
+        )
+        for (product_id, data_source_id), group in full_info.groupby(["product_id", "data_source_id"]):
+            results[(int(product_id), int(data_source_id))] = group[FULL_INFORMATION_COLUMNS].reset_index(drop=True)
+        return results
 
     def get_latest_vesper_data(self, product_id: int, data_source_id: int):
         """
         Queries the vesper_quotations table for the latest entry based on product_id and data_source_id.
         """
+        indexed = self._indexed_latest_vesper_data(product_id, data_source_id)
+        if indexed is not None:
+            return indexed
+
         try:
-            query = f"""
-            SELECT price, currency, data_series_id, date
-            FROM vesper_quotations
-            WHERE product_id = {product_id} AND data_source_id = {data_source_id}
-            ORDER BY date DESC
-            LIMIT 1
-            """
-            result = self.db_connection.query_data(query=query)
-
-            if not result.empty:
-                latest_entry = result.iloc[0]
-                return {
-                    "price": float(latest_entry["price"]),
-                    "currency": str(latest_entry["currency"]),
-                    "data_series_id": int(latest_entry["data_series_id"]),
-                    "date": latest_entry["date"].strftime("%Y-%m-%d"),
-                }
-            else:
-                print("No data found for the given product_id and data_source_id.")
-                return {}
+            result = self.db_connection.query_data(
+                query=LATEST_VESPER_QUERY,
+                params=(product_id, data_source_id),
+                cache_ttl=LATEST_VESPER_CACHE_TTL,
+            )
+            return self._parse_latest_vesper_data(result)
         except Exception as e:
-            print(f"Unexpected error while querying vesper_quotations: {e}")
+            logger.error("Unexpected error while querying vesper_quotations: %s", e)
             return {}
 
     def connect_to_forecasts(self, vesper_data: dict):
@@ -39,28 +184,21 @@ class VesperDataProcessor:
         Connects vesper_quotations data to the forecasts_quotations table and retrieves
         value and display_date for matching entries.
         """
-        try:
-            data_series_id = vesper_data.get("data_series_id")
-            date = vesper_data.get("date")
+        indexed = self._indexed_forecasts(vesper_data)
+        if indexed is not None:
+            return indexed
 
-            if not data_series_id or not date:
-                print("Vesper data is missing required fields.")
+        try:
+            params = self._forecasts_params(vesper_data)
+            if params is None:
                 return pd.DataFrame(columns=["value", "display_date"])
 
-            query = f"""
-            SELECT value, last_value_date, display_date
-            FROM forecasts_quotations
-            WHERE origin_data_series_id = {data_series_id}
-              AND last_value_date = '{date}'
-              AND duration = 1
-            """
-            forecasts_data = self.db_connection.query_data(query=query)
-
-            return forecasts_data
+            return self.db_connection.query_data(query=FORECASTS_QUERY, params=params)
         except Exception as e:
-            print(f"Unexpected error while querying forecasts_quotations: {e}")
+            logger.error("Unexpected error while querying forecasts_quotations: %s", e)
             return pd.DataFrame(columns=["value", "display_date"])
 
+    @single_flight()
     def get_full_information(self, product_id: int, data_source_id: int):
         """
         Retrieves full information by querying vesper_quotations and joining it with forecasts_quotations
@@ -70,26 +208,106 @@ class VesperDataProcessor:
             vesper_data = self.get_latest_vesper_data(product_id, data_source_id)
 
             if not vesper_data:
-                print("No vesper data found.")
+                logger.info("No vesper data found.")
                 return pd.DataFrame()
 
             forecasts_data = self.connect_to_forecasts(vesper_data)
 
             if forecasts_data.empty:
-                print("No forecasts data found for the given vesper data.")
+                logger.info("No forecasts data found for the given vesper data.")
                 return pd.DataFrame()
 
-            vesper_df = pd.DataFrame([vesper_data])
-            vesper_df["date"] = pd.to_datetime(vesper_df["date"]).dt.date
-            forecasts_data["last_value_date"] = pd.to_datetime(forecasts_data["last_value_date"]).dt.date
+            return self._merge_full_information(vesper_data, forecasts_data)
+        except Exception as e:
+            logger.error("Unexpected error: %s", e)
+            return pd.DataFrame()
 
-            full_info = pd.merge(
-                vesper_df, forecasts_data, left_on="date", right_on="last_value_date", how="left"
-            )
+    def get_full_information_batch(self, pairs):
+        """
+        Retrieves the full information for many (product_id, data_source_id) pairs. Pairs the quote index can
+        answer are served from it; the rest take two set-based queries: one for all latest quotes the index misses
+        and one for all their duration 1 forecasts.
 
-            full_info = full_info[["price", "currency", "data_series_id", "date", "value", "display_date"]]
+        Returns:
+            A dict mapping each pair to the same DataFrame `get_full_information` returns for it (empty if no
+            quote or forecast was found).
+        """
+        pairs = self._normalize_pairs(pairs)
+        if not pairs:
+            return {}
+
+        results = {}
+        # Quotes found in the index whose forecasts are not, and pairs the index has no quote for
+        indexed_quotes = []
+        unindexed_pairs = []
+        for product_id, data_source_id in pairs:
+            vesper_data = self._indexed_latest_vesper_data(product_id, data_source_id)
+            if vesper_data is None:
+                unindexed_pairs.append((product_id, data_source_id))
+                continue
+            forecasts_data = self._indexed_forecasts(vesper_data)
+            if forecasts_data is None:
+                indexed_quotes.append({"product_id": product_id, "data_source_id": data_source_id, **vesper_data})
+                continue
+            results[(product_id, data_source_id)] = self._merge_full_information(vesper_data, forecasts_data)
+
+        missing_pairs = [pair for pair in pairs if pair not in results]
+        if not missing_pairs:
+            return results
 
-            return full_info
+        try:
+            quote_frames = [pd.DataFrame(indexed_quotes)] if indexed_quotes else []
+            if unindexed_pairs:
+                query, params = self._latest_batch_query(unindexed_pairs)
+                quote_frames.append(self.db_connection.query_data(query=query, params=params))
+            latest_quotes = pd.concat(quote_frames, ignore_index=True)
+            if latest_quotes.empty:
+                logger.info("No vesper data found for any of the given pairs.")
+                results.update({pair: pd.DataFrame() for pair in missing_pairs})
+            else:
+                query, params = self._forecasts_batch_query(latest_quotes)
+                forecasts_data = self.db_connection.query_data(query=query, params=params)
+                results.update(self._merge_batch_information(missing_pairs, latest_quotes, forecasts_data))
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            return pd.DataFrame()
+            logger.error("Unexpected error: %s", e)
+            results.update({pair: pd.DataFrame() for pair in missing_pairs})
+        return {pair: results[pair] for pair in pairs}
+
+
+class AsyncVesperDataProcessor:
+    """
+    Awaitable front of the VesperDataProcessor for async endpoints.
+
+    The processor runs on the AsyncDBConnector's executor, so its queries never block the event loop. Concurrent
+    calls for the same pair are coalesced before they take an executor thread.
+    """
+
+    def __init__(self, db_connection: AsyncDBConnector, quote_index: Optional[LatestQuoteIndex] = None):
+        """
+        Initializes the AsyncVesperDataProcessor.
+
+        Args:
+            db_connection: The awaitable DB connection. The processor queries its DBConnector.
+            quote_index: See VesperDataProcessor.
+        """
+        self.db_connection = db_connection
+        self.processor = VesperDataProcessor(db_connection.db_connection, quote_index=quote_index)
+
+    def index_metrics(self) -> dict:
+        """
+        Return the staleness and refresh metrics of the latest quote index, if one is used.
+        """
+        return self.processor.index_metrics()
+
+    @single_flight()
+    async def get_full_information(self, product_id: int, data_source_id: int):
+        """
+        Retrieves the latest quote joined with its forecasts without blocking the event loop.
+        """
+        return await self.db_connection.run(self.processor.get_full_information, product_id, data_source_id)
+
+    async def get_full_information_batch(self, pairs):
+        """
+        Retrieves the full information for many (product_id, data_source_id) pairs without blocking the event loop.
+        """
+        return await self.db_connection.run(self.processor.get_full_information_batch, pairs)